@@ -1,20 +1,41 @@
+"""Offline chat / RAG evaluations with LLM-as-judge scoring.
+
+Cases run concurrently (``--concurrency``) under an optional tokens-per-minute
+budget (``--tpm``). Each finished case is appended to a JSONL file as soon as
+it completes, so a crashed or interrupted run can be restarted with the same
+command and only the cases not yet in the file are evaluated. With
+``--answer-cache`` the generated answers are kept in SQLite keyed by model and
+prompt, so re-running with a different judge prompt only re-scores. Run from
+the project root:
+
+    python -m evals.run_evals --task chat --concurrency 16 --tpm 200000 \\
+        --output reports/chat_eval.jsonl --report reports/chat_eval.md
+"""
 from __future__ import annotations
 import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict
-from src.llm_client import LLMClient
+from typing import Any, Dict, List, Optional, Set
+
+from src.llm_client import AsyncLLMClient, count_message_tokens
 
 CHAT_DATA = "data/eval/chat_eval.jsonl"
 RAG_DATA = "data/eval/rag_eval.jsonl"
 
 JUDGE_PROMPT = (
-    "You are an evaluator. Score the ASSISTANT answer from 1 (bad) to 5 (excellent) on relevance and faithfulness
-"
-    "relative to the USER input and CONTEXT (if any). Respond as JSON: {\"relevance\":<1-5>,\"faithfulness\":<1-5>,\"comments\":"..."}."
+    "You are an evaluator. Score the ASSISTANT answer from 1 (bad) to 5 (excellent) on relevance and faithfulness\n"
+    "relative to the USER input and CONTEXT (if any). Respond as JSON: {\"relevance\":<1-5>,\"faithfulness\":<1-5>,\"comments\":\"...\"}."
 )
+RAG_SYSTEM = "Answer only using the context. If unknown, say 'I don't know.'"
+
 
 def read_jsonl(path: str) -> List[Dict]:
-    import json
     rows = []
     with open(path, 'r', encoding='utf-8') as f:
         for line in f:
@@ -22,106 +43,287 @@ def read_jsonl(path: str) -> List[Dict]:
                 rows.append(json.loads(line))
     return rows
 
-def llm_judge(client: LLMClient, user: str, answer: str, context: str = "") -> Dict:
-    messages = [
-        {"role": "system", "content": JUDGE_PROMPT},
-        {"role": "user", "content": f"USER: {user}
-CONTEXT: {context}
-ASSISTANT: {answer}"},
-    ]
-    out = client.chat(messages)
-    import json
-    try:
-        data = json.loads(out["content"])  # expect JSON
-    except Exception:
-        data = {"relevance": 0, "faithfulness": 0, "comments": "parse_error", "raw": out["content"]}
-    return data
-
-def run_chat(client: LLMClient, output_md: Path):
-    rows = read_jsonl(CHAT_DATA)
-    results = []
-    for r in rows:
-        user = r["input"]
-        out = client.chat([{"role": "user", "content": user}])
-        ans = out["content"]
-        score = llm_judge(client, user, ans)
-        results.append({
+
+def _hash(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def case_id(task: str, model: str, row: Dict) -> str:
+    return _hash({"task": task, "model": model, "row": row})[:24]
+
+
+def finished_cases(path: Path) -> Set[str]:
+    """Case ids already recorded in ``path`` without an error."""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if "error" not in rec:
+                done.add(rec["case_id"])
+    return done
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class TokenBucket:
+    """Tokens-per-minute limiter shared by every in-flight case.
+
+    Callers reserve an estimate before a call and ``adjust`` by the difference
+    once the real usage is known; the balance may go negative, which delays
+    the next callers.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, n: int):
+        n = min(n, self.capacity)
+        # the lock keeps waiters in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+    def adjust(self, n: int):
+        self._refill()
+        self.tokens -= n
+
+
+class AnswerCache:
+    """Generated answers in SQLite, keyed by model, messages and temperature."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        return _hash({"model": model, "messages": messages, "temperature": temperature})
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM answers WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO answers (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            self._db.commit()
+
+
+class EvalRunner:
+    def __init__(self, client: AsyncLLMClient, bucket: Optional[TokenBucket] = None,
+                 answers: Optional[AnswerCache] = None, max_answer_tokens: int = 256,
+                 temperature: float = 0.2):
+        self.client = client
+        self.bucket = bucket
+        self.answers = answers
+        self.max_answer_tokens = max_answer_tokens
+        self.temperature = temperature
+
+    async def _chat(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        estimate = 0
+        if self.bucket is not None:
+            estimate = count_message_tokens(messages, self.client.chat_model) + self.max_answer_tokens
+            await self.bucket.acquire(estimate)
+        out = await self.client.chat(messages, temperature=self.temperature)
+        if self.bucket is not None:
+            usage = out.get("usage", {})
+            used = usage.get("total_tokens") or usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+            self.bucket.adjust(used - estimate)
+        return out
+
+    async def answer(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        key = None
+        if self.answers is not None:
+            key = AnswerCache.key(self.client.chat_model, messages, self.temperature)
+            hit = await asyncio.to_thread(self.answers.get, key)
+            if hit is not None:
+                return {**hit, "cached": True}
+        out = await self._chat(messages)
+        value = {"content": out["content"], "usage": out.get("usage", {})}
+        if key is not None:
+            await asyncio.to_thread(self.answers.put, key, value)
+        return {**value, "cached": False}
+
+    async def llm_judge(self, user: str, answer: str, context: str = "") -> Dict:
+        messages = [
+            {"role": "system", "content": JUDGE_PROMPT},
+            {"role": "user", "content": f"USER: {user}\nCONTEXT: {context}\nASSISTANT: {answer}"},
+        ]
+        out = await self._chat(messages)
+        try:
+            data = json.loads(out["content"])  # expect JSON
+        except Exception:
+            data = {"relevance": 0, "faithfulness": 0, "comments": "parse_error", "raw": out["content"]}
+        return data
+
+    async def run_case(self, task: str, row: Dict) -> Dict[str, Any]:
+        if task == 'chat':
+            user, context = row["input"], ""
+            messages = [{"role": "user", "content": user}]
+        else:
+            user, context = row["question"], "\n".join(row.get("contexts", []))
+            messages = [
+                {"role": "system", "content": RAG_SYSTEM},
+                {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {user}"},
+            ]
+        ans = await self.answer(messages)
+        score = await self.llm_judge(user, ans["content"], context=context)
+        return {
             "input": user,
-            "answer": ans,
+            "answer": ans["content"],
+            "answer_cached": ans["cached"],
             "relevance": score.get("relevance", 0),
             "faithfulness": score.get("faithfulness", 0),
-        })
-    avg_rel = sum(x["relevance"] for x in results) / max(len(results), 1)
-    avg_fai = sum(x["faithfulness"] for x in results) / max(len(results), 1)
-    output_md.write_text(f"# Chat Eval
-
-Avg relevance: {avg_rel:.2f} | Avg faithfulness: {avg_fai:.2f}
-
-" +
-                         "
-
-".join([f"## Case
-**Input:** {r['input']}
-
-**Answer:** {r['answer']}
-
-Scores: R={r['relevance']} F={r['faithfulness']}
-" for r in results]), encoding='utf-8')
-
-def run_rag(client: LLMClient, output_md: Path):
-    rows = read_jsonl(RAG_DATA)
-    results = []
-    for r in rows:
-        user = r["question"]
-        context = "
-".join(r.get("contexts", []))
-        out = client.chat([
-            {"role": "system", "content": "Answer only using the context. If unknown, say 'I don't know.'"},
-            {"role": "user", "content": f"Context:
-{context}
-
-Question: {user}"},
-        ])
-        ans = out["content"]
-        score = llm_judge(client, user, ans, context=context)
-        results.append({
-            "question": user,
-            "answer": ans,
-            "relevance": score.get("relevance", 0),
-            "faithfulness": score.get("faithfulness", 0),
-        })
-    avg_rel = sum(x["relevance"] for x in results) / max(len(results), 1)
-    avg_fai = sum(x["faithfulness"] for x in results) / max(len(results), 1)
-    output_md.write_text(f"# RAG Eval
+            "comments": score.get("comments", ""),
+            "usage": ans["usage"],
+        }
+
 
-Avg relevance: {avg_rel:.2f} | Avg faithfulness: {avg_fai:.2f}
+async def run(task: str, rows: List[Dict], runner: EvalRunner, output: Path, concurrency: int) -> Dict[str, int]:
+    model = runner.client.chat_model
+    done = finished_cases(output)
+    todo = [(cid, r) for cid, r in ((case_id(task, model, r), r) for r in rows) if cid not in done]
+    print(f"{len(rows)} cases, {len(rows) - len(todo)} already done, {len(todo)} to run", flush=True)
 
-" +
-                         "
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in todo:
+        queue.put_nowait(item)
+    counts = {"ok": 0, "error": 0}
+    start = time.perf_counter()
 
-".join([f"## Case
-**Q:** {r['question']}
+    with open(output, 'a', encoding='utf-8') as out:
+        if out.tell() and not _ends_with_newline(output):
+            out.write("\n")  # end a line cut short by a crash, or the next record joins it
 
-**A:** {r['answer']}
+        def write(rec: Dict):
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+
+        async def worker():
+            while True:
+                try:
+                    cid, row = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    rec = await runner.run_case(task, row)
+                    counts["ok"] += 1
+                except Exception as e:
+                    # recorded but not counted as done, so a resumed run retries it
+                    rec = {"error": f"{type(e).__name__}: {e}"}
+                    counts["error"] += 1
+                write({"case_id": cid, "task": task, "model": model, **rec})
+                n = counts["ok"] + counts["error"]
+                if n % 50 == 0 or n == len(todo):
+                    rate = n / (time.perf_counter() - start)
+                    print(f"{n}/{len(todo)} ({counts['error']} errors, {rate:.1f} cases/s)", flush=True)
+
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return counts
+
+
+def summarize(output: Path, task: str) -> Dict[str, Any]:
+    results: Dict[str, Dict] = {}
+    with open(output, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in rec and rec.get("task") == task:
+                results[rec["case_id"]] = rec
+    rows = list(results.values())
+    n = max(len(rows), 1)
+    return {
+        "cases": len(rows),
+        "avg_relevance": sum(r["relevance"] or 0 for r in rows) / n,
+        "avg_faithfulness": sum(r["faithfulness"] or 0 for r in rows) / n,
+        "rows": rows,
+    }
+
+
+def write_report(summary: Dict[str, Any], task: str, report: Path):
+    label, q, a = ("Chat", "Input", "Answer") if task == 'chat' else ("RAG", "Q", "A")
+    header = (f"# {label} Eval\n\nCases: {summary['cases']} | Avg relevance: {summary['avg_relevance']:.2f}"
+              f" | Avg faithfulness: {summary['avg_faithfulness']:.2f}\n\n")
+    cases = "\n\n".join(
+        f"## Case\n**{q}:** {r['input']}\n\n**{a}:** {r['answer']}\n\nScores: R={r['relevance']} F={r['faithfulness']}\n"
+        for r in summary["rows"]
+    )
+    report.write_text(header + cases, encoding='utf-8')
+
+
+async def amain(args):
+    client = AsyncLLMClient()
+    if args.model:
+        client.chat_model = args.model
+    runner = EvalRunner(
+        client,
+        bucket=TokenBucket(args.tpm) if args.tpm > 0 else None,
+        answers=AnswerCache(args.answer_cache) if args.answer_cache else None,
+        max_answer_tokens=args.max_answer_tokens,
+    )
+    output = Path(args.output or f"reports/{args.task}_eval.jsonl")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if args.fresh and output.exists():
+        output.unlink()
+    rows = read_jsonl(args.data or (CHAT_DATA if args.task == 'chat' else RAG_DATA))
+    try:
+        counts = await run(args.task, rows, runner, output, args.concurrency)
+    finally:
+        await client.aclose()
+
+    summary = summarize(output, args.task)
+    print(f"ok={counts['ok']} errors={counts['error']} | cases={summary['cases']} "
+          f"avg relevance={summary['avg_relevance']:.2f} avg faithfulness={summary['avg_faithfulness']:.2f}")
+    if args.report:
+        report = Path(args.report)
+        report.parent.mkdir(parents=True, exist_ok=True)
+        write_report(summary, args.task, report)
 
-Scores: R={r['relevance']} F={r['faithfulness']}
-" for r in results]), encoding='utf-8')
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--task', choices=['chat', 'rag'], required=True)
-    parser.add_argument('--model', default='gpt-4o-mini')
-    parser.add_argument('--output', default='reports/eval.md')
+    parser.add_argument('--model', default=None, help='chat model / deployment (default: from config)')
+    parser.add_argument('--data', default=None, help='JSONL dataset (default: data/eval/<task>_eval.jsonl)')
+    parser.add_argument('--output', default=None, help='JSONL results, appended and resumed (default: reports/<task>_eval.jsonl)')
+    parser.add_argument('--report', default=None, help='also write a Markdown report')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--tpm', type=int, default=0, help='tokens-per-minute budget (0 = unlimited)')
+    parser.add_argument('--max-answer-tokens', type=int, default=256, help='completion size reserved per call for --tpm')
+    parser.add_argument('--answer-cache', default=None, help='SQLite file to cache generated answers in')
+    parser.add_argument('--fresh', action='store_true', help='discard previous results instead of resuming')
     args = parser.parse_args()
+    asyncio.run(amain(args))
 
-    client = LLMClient()
-    out = Path(args.output)
-    out.parent.mkdir(parents=True, exist_ok=True)
-
-    if args.task == 'chat':
-        run_chat(client, out)
-    else:
-        run_rag(client, out)
 
 if __name__ == '__main__':
     main()
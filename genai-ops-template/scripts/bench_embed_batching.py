@@ -0,0 +1,79 @@
+"""Embedding throughput with and without request coalescing.
+
+Simulates a provider whose calls cost a fixed round-trip plus a small
+per-text time, with a cap on concurrent calls (rate limit), and drives it
+from 1, 16 and 128 concurrent clients each embedding one question at a time.
+Run from the project root:
+
+    python -m scripts.bench_embed_batching --clients 1 16 128 --requests 2000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from typing import List
+
+import numpy as np
+
+from src.batching import EmbeddingBatcher
+
+
+class FakeProvider:
+    def __init__(self, rtt_ms: float, per_text_ms: float, max_concurrency: int):
+        self.rtt = rtt_ms / 1000.0
+        self.per_text = per_text_ms / 1000.0
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        async with self.slots:
+            self.calls += 1
+            await asyncio.sleep(self.rtt + self.per_text * len(texts))
+        return [[float(len(t))] for t in texts]
+
+
+async def _drive(embed, clients: int, total: int) -> List[float]:
+    latencies: List[float] = []
+    per_client = max(total // clients, 1)
+
+    async def worker(c: int):
+        for i in range(per_client):
+            start = time.perf_counter()
+            await embed([f"question {c}-{i}"])
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker(c) for c in range(clients)))
+    return latencies
+
+
+async def run(args):
+    print(f"{'clients':>7} | {'mode':<9} | {'req/s':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'calls':>6}")
+    for clients in args.clients:
+        for mode in ("direct", "batched"):
+            provider = FakeProvider(args.rtt_ms, args.per_text_ms, args.provider_concurrency)
+            embed = provider.embed
+            if mode == "batched":
+                embed = EmbeddingBatcher(provider.embed, args.max_batch, args.window_ms).embed
+            start = time.perf_counter()
+            lat = await _drive(embed, clients, args.requests)
+            elapsed = time.perf_counter() - start
+            lat_ms = np.array(lat) * 1e3
+            print(f"{clients:>7} | {mode:<9} | {len(lat) / elapsed:>8.0f} | {np.percentile(lat_ms, 50):>8.1f} | "
+                  f"{np.percentile(lat_ms, 99):>8.1f} | {provider.calls:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 16, 128])
+    parser.add_argument('--requests', type=int, default=2000, help='total requests per run')
+    parser.add_argument('--rtt-ms', type=float, default=30.0)
+    parser.add_argument('--per-text-ms', type=float, default=0.2)
+    parser.add_argument('--provider-concurrency', type=int, default=8)
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
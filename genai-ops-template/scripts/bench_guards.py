@@ -0,0 +1,92 @@
+"""Guard scan time as the rule set grows.
+
+Compares the per-message, per-rule ``re.search`` loop (what /chat used to
+do, without the early exit so every rule is evaluated) against the compiled
+single-pass ``GuardEngine`` on a multi-turn conversation near the input
+limit. Run from the project root:
+
+    python -m scripts.bench_guards --rules 3 30 300 1000 --messages 8
+"""
+from __future__ import annotations
+import argparse
+import random
+import re
+import string
+import time
+from typing import List
+
+from src.guards import GuardEngine, GuardRule
+
+
+def make_rules(n: int, seed: int = 0) -> List[GuardRule]:
+    rnd = random.Random(seed)
+    rules = [
+        GuardRule(id="password", pattern="password", literal=True, ignore_case=True),
+        GuardRule(id="credit_card_marker", pattern=r"credit\s*card", ignore_case=True),
+        GuardRule(id="email", pattern=r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", action="redact"),
+    ]
+    while len(rules) < n:
+        word = "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(6, 12)))
+        rules.append(GuardRule(id=f"term_{len(rules)}", pattern=word, literal=True, ignore_case=True))
+    return rules[:n]
+
+
+def make_conversation(messages: int, chars: int, seed: int = 1) -> List[str]:
+    rnd = random.Random(seed)
+    vocab = ["the", "model", "deploy", "latency", "budget", "request", "index", "token", "cluster", "review"]
+    out = []
+    for i in range(messages):
+        words, size = [], 0
+        while size < chars:
+            w = rnd.choice(vocab)
+            words.append(w)
+            size += len(w) + 1
+        if i == messages - 1:
+            words.append("contact me at jane.doe@example.com")
+        out.append(" ".join(words)[:chars])
+    return out
+
+
+def per_rule_loop(patterns: List["re.Pattern"], texts: List[str]) -> int:
+    hits = 0
+    for t in texts:
+        for p in patterns:
+            if p.search(t):
+                hits += 1
+    return hits
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rules', type=int, nargs='+', default=[3, 30, 300, 1000])
+    parser.add_argument('--messages', type=int, default=8)
+    parser.add_argument('--chars', type=int, default=1000, help='characters per message')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = make_conversation(args.messages, args.chars)
+    print(f"conversation: {args.messages} messages x {args.chars} chars")
+    print(f"{'rules':>6} | {'per-rule ms':>11} | {'compiled ms':>11} | {'speedup':>7} | {'compile ms':>10}")
+    for n in args.rules:
+        rules = make_rules(n)
+        start = time.perf_counter()
+        engine = GuardEngine(rules)
+        compile_ms = (time.perf_counter() - start) * 1e3
+        # the baseline gets precompiled patterns too, so only scanning is timed
+        patterns = [re.compile(r.regex()) for r in rules]
+        loop_s = bench(lambda: per_rule_loop(patterns, texts), args.repeat)
+        engine_s = bench(lambda: engine.scan(texts), args.repeat)
+        print(f"{n:>6} | {loop_s * 1e3:>11.2f} | {engine_s * 1e3:>11.2f} | {loop_s / engine_s:>6.1f}x | {compile_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Recall@k, QPS and memory of each ANN index type against the flat index.
+
+Uses clustered synthetic vectors by default (uniform noise is a worst case for
+ANN indexes), or real embeddings from an ``.npy`` file. Index knobs come from
+``config`` / the environment (IVF_NLIST, IVF_NPROBE, HNSW_M, ...). Run from the
+project root:
+
+    python -m scripts.bench_index_types --n 100000 --dim 384 --k 10
+    python -m scripts.bench_index_types --embeddings data/embs.npy
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from src import config
+from src import rag
+
+
+def _clustered(n: int, dim: int, rng: np.random.Generator, clusters: int = 256) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.3 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--embeddings', help='optional .npy matrix of real embeddings')
+    parser.add_argument('--types', nargs='+', default=list(rag.INDEX_TYPES), choices=rag.INDEX_TYPES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        data = np.load(args.embeddings).astype('float32')
+    else:
+        data = _clustered(args.n, args.dim, rng)
+    # hold out queries so they are not exact matches of indexed vectors
+    queries, data = data[:args.queries].copy(), data[args.queries:]
+    faiss.normalize_L2(queries)
+    texts = [""] * len(data)
+
+    truth = None
+    print(f"{len(data)} vectors x {data.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<9} | {'build s':>8} | {'recall@k':>8} | {'QPS':>9} | {'memory MB':>9}")
+    for kind in ["flat"] + [t for t in args.types if t != "flat"]:
+        start = time.perf_counter()
+        vs = rag.build_vector_store(data, texts, kind=kind)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = vs.index.search(queries, args.k)
+        qps = len(queries) / (time.perf_counter() - start)
+        if truth is None:
+            truth = found
+        mem = faiss.serialize_index(vs.index).nbytes / 2 ** 20
+        print(f"{kind:<9} | {build:>8.2f} | {_recall(truth, found):>8.3f} | {qps:>9.0f} | {mem:>9.1f}")
+    print(f"nlist<={config.IVF_NLIST} nprobe={config.IVF_NPROBE} "
+          f"hnsw M={config.HNSW_M} efSearch={config.HNSW_EF_SEARCH} pq={config.PQ_M}x{config.PQ_NBITS}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Search latency and throughput with the index split into N shards.
+
+Builds one random corpus, saves it with each shard count, reloads it
+memory-mapped (as API workers do with VECTOR_STORE_MMAP=true) and measures
+single-query latency and queries/sec from several concurrent callers. Results
+are checked against the unsharded index. Run from the project root:
+
+    python -m scripts.bench_shards --n 200000 --dim 384 --shards 1 2 4 8
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import faiss
+
+from src import config, rag, shards
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--kind', default='flat', choices=rag.INDEX_TYPES)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent callers for the throughput run')
+    parser.add_argument('--k', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((args.n, args.dim)).astype('float32')
+    Q = rng.standard_normal((args.queries, args.dim)).astype('float32')
+    texts = [str(i) for i in range(args.n)]
+    # one search thread per query, so the shard pool is what adds parallelism
+    faiss.omp_set_num_threads(1)
+
+    reference = None
+    print(f"{args.n} x {args.dim} {args.kind}, k={args.k}")
+    print(f"{'shards':>6} | {'p50 ms':>8} | {'p99 ms':>8} | {'qps':>8} | {'same top-k':>10}")
+    for n in args.shards:
+        config.VECTOR_STORE_SHARDS = n
+        config.VECTOR_STORE_SHARD_THREADS = n
+        shards._POOL = None
+        path = os.path.join(tempfile.mkdtemp(), 'faiss_index')
+        rag.save_vector_store(rag.build_vector_store(X, texts, kind=args.kind), path)
+        vs = rag.load_vector_store(path, mmap=True)
+
+        lat = []
+        found = []
+        for q in Q:
+            start = time.perf_counter()
+            found.append([h.id for h in rag.query(vs, q, args.k)])
+            lat.append(time.perf_counter() - start)
+        if reference is None:
+            reference = found
+        same = np.mean([a == b for a, b in zip(found, reference)])
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            list(pool.map(lambda q: rag.query(vs, q, args.k), Q))
+        qps = len(Q) / (time.perf_counter() - start)
+
+        lat_ms = np.array(lat) * 1e3
+        print(f"{n:>6} | {np.percentile(lat_ms, 50):>8.2f} | {np.percentile(lat_ms, 99):>8.2f} | {qps:>8.0f} | {same:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Per-request vector store loading vs. the resident VectorStoreManager.
+
+Builds synthetic indexes of several sizes and times one query path each way.
+No provider calls are made. Run from the project root:
+
+    python -m scripts.bench_vector_store --sizes 1000 10000 100000
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from src import rag
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    return float(np.percentile(np.array(samples), pct))
+
+
+def _time_queries(get_store, queries: np.ndarray, k: int) -> List[float]:
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        vs = get_store()
+        rag.query(vs, q.tolist(), k=k)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=4)
+    parser.add_argument('--mmap', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8} | {'mode':<10} | {'p50 ms':>9} | {'p99 ms':>9} | {'mean ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = str(Path(tmp) / f"bench_{n}")
+            embs = rng.standard_normal((n, args.dim), dtype=np.float32)
+            texts = [f"synthetic chunk {i} " + "lorem ipsum " * 40 for i in range(n)]
+            rag.save_vector_store(rag.build_vector_store(embs, texts), path)
+            queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+            manager = rag.VectorStoreManager(path, mmap=args.mmap)
+            manager.get()  # warm, as the API does after its first request
+            modes = {
+                "per-req": lambda: rag.load_vector_store(path, mmap=args.mmap),
+                "resident": manager.get,
+            }
+            for mode, get_store in modes.items():
+                samples = _time_queries(get_store, queries, args.top_k)
+                print(f"{n:>8} | {mode:<10} | {_percentile(samples, 50) * 1e3:>9.3f} | "
+                      f"{_percentile(samples, 99) * 1e3:>9.3f} | {statistics.mean(samples) * 1e3:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Dry run of ingestion's near-duplicate detection: no embedding, no index.
+
+Chunks every ``*.txt`` file like ``ingest_documents`` does and reports how
+many chunks and embedding tokens a threshold would save, plus the file pairs
+sharing the most near-duplicate chunks. Run from the project root:
+
+    python -m scripts.dedup_report --docs data/docs --threshold 0.9 0.8
+"""
+from __future__ import annotations
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+
+from src import config
+from src.dedup import NearDuplicates, minhasher
+from src.ingest import chunk_text
+from src.llm_client import count_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', default=config.DOCS_PATH)
+    parser.add_argument('--threshold', type=float, nargs='+', default=[config.INGEST_DEDUP_THRESHOLD])
+    parser.add_argument('--chunk-size', type=int, default=config.CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument('--num-perm', type=int, default=config.INGEST_DEDUP_NUM_PERM)
+    parser.add_argument('--shingle', type=int, default=config.INGEST_DEDUP_SHINGLE)
+    parser.add_argument('--model', default=config.OPENAI_EMBED_MODEL, help='tokenizer used for the tokens-saved count')
+    parser.add_argument('--top', type=int, default=10, help='file pairs to list')
+    args = parser.parse_args()
+
+    root = Path(args.docs)
+    hasher = minhasher(args.num_perm, args.shingle)
+    chunks = []
+    start = time.perf_counter()
+    for p in sorted(root.rglob("*.txt")):
+        rel = p.relative_to(root).as_posix()
+        for _, chunk in chunk_text(p.read_text(encoding="utf-8"), args.chunk_size, args.chunk_overlap):
+            chunks.append((rel, count_tokens(chunk, args.model), hasher.signature(chunk)))
+    signed = time.perf_counter() - start
+    total_tokens = sum(t for _, t, _ in chunks)
+    print(f"{len(chunks)} chunks, {total_tokens} tokens from {args.docs} (signed in {signed:.2f}s)")
+
+    for threshold in args.threshold:
+        near = NearDuplicates(threshold, args.num_perm)
+        owners = []
+        pairs = Counter()
+        dropped = saved = 0
+        start = time.perf_counter()
+        for rel, tokens, sig in chunks:
+            slot = near.find(sig)
+            if slot is None:
+                near.add(sig)
+                owners.append(rel)
+                continue
+            dropped += 1
+            saved += tokens
+            pairs[(owners[slot], rel)] += 1
+        elapsed = time.perf_counter() - start
+        print(f"\nthreshold {threshold} ({near.bands} bands x {near.rows} rows, {elapsed:.2f}s): "
+              f"{dropped} chunks ({dropped / max(len(chunks), 1):.1%}) and {saved} tokens "
+              f"({saved / max(total_tokens, 1):.1%}) saved")
+        for (kept, dup), n in pairs.most_common(args.top):
+            print(f"  {n:>5}  {dup}  ->  {kept}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""Build or incrementally update the FAISS vector store from local docs.
+
+    python -m scripts.ingest_docs --docs data/docs --index data/index/faiss_index
+"""
+from __future__ import annotations
+import argparse
+import json
+
+from src import config
+from src.ingest import ingest_documents
+from src.llm_client import LLMClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', default=config.DOCS_PATH)
+    parser.add_argument('--index', default=config.VECTOR_STORE_PATH)
+    parser.add_argument('--chunk-size', type=int, default=config.CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=config.CHUNK_OVERLAP)
+    parser.add_argument('--batch-size', type=int, default=config.EMBED_BATCH_SIZE)
+    parser.add_argument('--full', action='store_true', help='ignore the manifest and rebuild from scratch')
+    args = parser.parse_args()
+
+    report = ingest_documents(
+        args.docs, args.index, LLMClient(),
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size, full=args.full,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""Load test the API against the local OpenAI-compatible stub.
+
+Starts ``scripts.stub_provider`` and the API (``uvicorn src.app:app``) with
+``OPENAI_BASE_URL`` pointed at the stub and a throwaway index, then drives
+``/chat``, ``/rag/ingest`` and ``/rag/query`` at each concurrency level.
+For every run it reports throughput and p50/p95/p99 latency, splits the mean
+latency into provider time (measured inside the stub) and API overhead, and
+lists the mean time per stage from the API's ``genai_stage_seconds``.
+Results are written as JSON tagged with the git commit; pass ``--baseline``
+with an earlier file to print the change. Response and embedding caches are
+off unless ``--with-caches`` is given, so every request reaches the stub.
+Run from the project root:
+
+    python -m scripts.load_test --levels 1 8 32 --requests 200
+    python -m scripts.load_test --baseline reports/loadtest/<commit>.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+SCENARIOS = ("chat", "rag_ingest", "rag_query")
+# stub calls made by each scenario, used to attribute provider time
+PROVIDER_ENDPOINTS = {"chat": ("chat",), "rag_ingest": ("embeddings",), "rag_query": ("embeddings", "chat")}
+ROUTES = {"chat": "/chat", "rag_ingest": "/rag/ingest", "rag_query": "/rag/query"}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "."]) != 0
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def make_docs(path: Path, n: int, words: int = 600):
+    path.mkdir(parents=True, exist_ok=True)
+    vocab = "deployment latency index vector prompt budget token cluster monitor rollback cache model".split()
+    for i in range(n):
+        text = " ".join(vocab[(i * 7 + j * 3) % len(vocab)] + str(j % 50) for j in range(words))
+        (path / f"doc_{i:04d}.txt").write_text(text, encoding="utf-8")
+
+
+def request_for(scenario: str, i: int, worker: int, workdir: Path):
+    if scenario == "chat":
+        return "/chat", {"messages": [{"role": "user", "content": f"How do I roll back deployment {i}?"}]}
+    if scenario == "rag_query":
+        return "/rag/query", {"question": f"What is the latency budget for cluster {i}?", "top_k": 4}
+    # each worker rebuilds its own index, so concurrent ingests do not share files
+    return "/rag/ingest", {
+        "docs_path": str(workdir / "docs"),
+        "index_path": str(workdir / "ingest" / f"w{worker}" / "faiss_index"),
+        "full": True,
+        "wait": True,
+    }
+
+
+async def drive(app_url: str, scenario: str, concurrency: int, total: int, workdir: Path) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=300.0, limits=limits) as http:
+        async def worker(w: int):
+            for i in counter:
+                path, body = request_for(scenario, i, w, workdir)
+                start = time.perf_counter()
+                try:
+                    code = (await http.post(path, json=body)).status_code
+                except httpx.HTTPError:
+                    code = 0
+                if code == 200:
+                    latencies.append(time.perf_counter() - start)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    lat_ms = np.array(latencies or [0.0]) * 1e3
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": total - len(latencies),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": float(lat_ms.mean()),
+            "p50": float(np.percentile(lat_ms, 50)),
+            "p95": float(np.percentile(lat_ms, 95)),
+            "p99": float(np.percentile(lat_ms, 99)),
+        },
+    }
+
+
+def attribute_provider_time(result: Dict[str, Any], scenario: str, stub: Dict[str, Any]):
+    calls = {e: stub.get(e, {"count": 0, "errors": 0, "total_seconds": 0.0}) for e in PROVIDER_ENDPOINTS[scenario]}
+    provider_ms = sum(c["total_seconds"] for c in calls.values()) * 1e3 / max(result["ok"], 1)
+    result["provider_calls"] = calls
+    result["provider_ms_per_request"] = provider_ms
+    result["app_overhead_ms"] = result["latency_ms"]["mean"] - provider_ms
+
+
+def stage_totals(app_url: str, route: str) -> Dict[str, List[float]]:
+    """``{stage: [sum_seconds, count]}`` from the API's genai_stage_seconds histogram."""
+    totals: Dict[str, List[float]] = {}
+    for family in text_string_to_metric_families(httpx.get(f"{app_url}/metrics").text):
+        if family.name != "genai_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.labels.get("route") != route:
+                continue
+            t = totals.setdefault(sample.labels["stage"], [0.0, 0.0])
+            if sample.name.endswith("_sum"):
+                t[0] = sample.value
+            elif sample.name.endswith("_count"):
+                t[1] = sample.value
+    return totals
+
+
+def stage_breakdown(before: Dict[str, List[float]], after: Dict[str, List[float]], ok: int) -> Dict[str, float]:
+    """Mean milliseconds per request spent in each stage during the run."""
+    out = {}
+    for stage, (total, _) in sorted(after.items()):
+        delta = total - before.get(stage, [0.0, 0.0])[0]
+        out[stage] = delta * 1e3 / max(ok, 1)
+    return out
+
+
+def print_row(scenario: str, concurrency: int, r: Dict[str, Any]):
+    lat = r["latency_ms"]
+    print(f"{scenario:<10} | {concurrency:>4} | {r['throughput_rps']:>8.1f} | {lat['p50']:>8.1f} | {lat['p95']:>8.1f} | "
+          f"{lat['p99']:>8.1f} | {r['provider_ms_per_request']:>9.1f} | {r['app_overhead_ms']:>9.1f} | {r['errors']:>4}",
+          flush=True)
+    if r.get("stages_ms"):
+        print(" " * 13 + "stages (mean ms): " + ", ".join(f"{k}={v:.2f}" for k, v in r["stages_ms"].items()))
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    base = {(r["scenario"], r["concurrency"]): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':<10} | {'conc':>4} | {'req/s':>8} | {'p95':>8} | {'overhead':>9}")
+    for r in results:
+        b = base.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+
+        def pct(new, old):
+            return f"{(new - old) / old * 100:+7.1f}%" if old else "     n/a"
+
+        print(f"{r['scenario']:<10} | {r['concurrency']:>4} | {pct(r['throughput_rps'], b['throughput_rps'])} | "
+              f"{pct(r['latency_ms']['p95'], b['latency_ms']['p95'])} | "
+              f"{r['app_overhead_ms'] - b['app_overhead_ms']:>+7.1f}ms")
+
+
+def start_process(args: List[str], env: Dict[str, str], log: Path) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], env=env, stdout=open(log, "w"), stderr=subprocess.STDOUT)
+
+
+async def run(args, workdir: Path, app_url: str, stub_url: str) -> List[Dict[str, Any]]:
+    results = []
+    print(f"{'scenario':<10} | {'conc':>4} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | "
+          f"{'provider':>9} | {'overhead':>9} | {'err':>4}")
+    # the query scenario needs an index at VECTOR_STORE_PATH
+    async with httpx.AsyncClient(base_url=app_url, timeout=300.0) as http:
+        r = await http.post("/rag/ingest", json={"docs_path": str(workdir / "docs"), "full": True, "wait": True})
+        r.raise_for_status()
+    for scenario in args.scenarios:
+        for concurrency in args.levels:
+            total = args.ingest_requests if scenario == "rag_ingest" else args.requests
+            total = max(total, concurrency)
+            await drive(app_url, scenario, min(concurrency, 4), min(concurrency, 4), workdir)  # warm-up
+            httpx.post(f"{stub_url}/stats/reset").raise_for_status()
+            before = stage_totals(app_url, ROUTES[scenario])
+            result = await drive(app_url, scenario, concurrency, total, workdir)
+            attribute_provider_time(result, scenario, httpx.get(f"{stub_url}/stats").json())
+            result["stages_ms"] = stage_breakdown(before, stage_totals(app_url, ROUTES[scenario]), result["ok"])
+            results.append({"scenario": scenario, "concurrency": concurrency, **result})
+            print_row(scenario, concurrency, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 16, 64], help='concurrency levels')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='requests per chat/query run')
+    parser.add_argument('--ingest-requests', type=int, default=8, help='requests per ingest run')
+    parser.add_argument('--docs', type=int, default=50, help='documents generated for ingestion')
+    parser.add_argument('--app-url', default=None, help='use a running API instead of starting one')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers for the started API')
+    parser.add_argument('--with-caches', action='store_true', help='keep response and embedding caches on')
+    parser.add_argument('--output', default=None, help='default: reports/loadtest/<commit>.json')
+    parser.add_argument('--baseline', default=None, help='earlier results file to compare against')
+    # passed through to the stub
+    parser.add_argument('--chat-latency-ms', type=float, default=200.0)
+    parser.add_argument('--embed-latency-ms', type=float, default=50.0)
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0)
+    parser.add_argument('--completion-tokens', type=int, default=64)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="genai-loadtest-"))
+    make_docs(workdir / "docs", args.docs)
+    stub_port = free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    procs: List[subprocess.Popen] = []
+    try:
+        procs.append(start_process([
+            "scripts.stub_provider", "--port", str(stub_port),
+            "--chat-latency-ms", str(args.chat_latency_ms), "--embed-latency-ms", str(args.embed_latency_ms),
+            "--tokens-per-sec", str(args.tokens_per_sec), "--completion-tokens", str(args.completion_tokens),
+            "--error-rate", str(args.error_rate),
+        ], dict(os.environ), workdir / "stub.log"))
+        wait_ready(f"{stub_url}/stats")
+
+        app_url: Optional[str] = args.app_url
+        if app_url is None:
+            app_port = free_port()
+            app_url = f"http://127.0.0.1:{app_port}"
+            env = dict(
+                os.environ,
+                LLM_PROVIDER="openai",
+                OPENAI_API_KEY="stub",
+                OPENAI_BASE_URL=f"{stub_url}/v1",
+                VECTOR_STORE_PATH=str(workdir / "index" / "faiss_index"),
+                DOCS_PATH=str(workdir / "docs"),
+                EMBED_CACHE_PATH=str(workdir / "cache" / "embeddings.sqlite"),
+            )
+            if not args.with_caches:
+                env.update(RESPONSE_CACHE_ENABLED="false", EMBED_CACHE_ENABLED="false")
+            procs.append(start_process([
+                "uvicorn", "src.app:app", "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning",
+            ], env, workdir / "app.log"))
+            wait_ready(f"{app_url}/metrics")
+
+        results = asyncio.run(run(args, workdir, app_url, stub_url))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+
+    commit = git_commit()
+    out = Path(args.output or f"reports/loadtest/{commit}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    settings = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+    out.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": settings,
+        "results": results,
+    }, indent=2))
+    print(f"\nresults written to {out} (logs in {workdir})")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
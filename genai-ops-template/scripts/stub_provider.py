@@ -0,0 +1,166 @@
+"""Local OpenAI-compatible stub for load tests.
+
+Serves ``/v1/chat/completions`` (plain and streamed) and ``/v1/embeddings``
+with configurable latency, generation speed and error rate, and records how
+long it spent on each call so a load test can separate provider time from
+the API's own overhead (``GET /stats``, ``POST /stats/reset``). Point the API
+at it with ``OPENAI_BASE_URL=http://127.0.0.1:8900/v1``. Run from the project
+root:
+
+    python -m scripts.stub_provider --port 8900 --chat-latency-ms 300 --tokens-per-sec 80
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="OpenAI stub")
+settings = argparse.Namespace(
+    chat_latency_ms=200.0, embed_latency_ms=50.0, per_input_ms=0.2, jitter=0.1,
+    tokens_per_sec=100.0, completion_tokens=64, error_rate=0.0, dim=256,
+)
+stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"count": 0, "errors": 0, "seconds": []})
+
+_WORDS = "the model answers from the retrieved context with short accurate sentences".split()
+
+
+def _delay(ms: float) -> float:
+    return max(ms * (1 + random.uniform(-settings.jitter, settings.jitter)), 0.0) / 1000.0
+
+
+def _error(endpoint: str, start: float):
+    stats[endpoint]["errors"] += 1
+    stats[endpoint]["seconds"].append(time.perf_counter() - start)
+    code = random.choice([429, 500, 503])
+    return JSONResponse({"error": {"message": "stub error", "type": "stub", "code": code}}, status_code=code)
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    start = time.perf_counter()
+    body = await request.json()
+    model = body.get("model", "stub")
+    await asyncio.sleep(_delay(settings.chat_latency_ms))
+    if random.random() < settings.error_rate:
+        return _error("chat", start)
+
+    n = settings.completion_tokens
+    words = [_WORDS[i % len(_WORDS)] for i in range(n)]
+    usage = {"prompt_tokens": _prompt_tokens(body.get("messages", [])), "completion_tokens": n}
+    usage["total_tokens"] = usage["prompt_tokens"] + n
+    base = {"id": f"chatcmpl-stub-{random.getrandbits(32):x}", "created": int(time.time()), "model": model}
+
+    if not body.get("stream"):
+        await asyncio.sleep(n / settings.tokens_per_sec)
+        stats["chat"]["count"] += 1
+        stats["chat"]["seconds"].append(time.perf_counter() - start)
+        return {**base, "object": "chat.completion", "usage": usage, "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"},
+        ]}
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    async def events():
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for i, w in enumerate(words):
+            await asyncio.sleep(1 / settings.tokens_per_sec)
+            delta = {"content": (" " if i else "") + w}
+            if i == 0:
+                delta["role"] = "assistant"
+            yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+        yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+        if include_usage:
+            yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+        stats["chat"]["count"] += 1
+        stats["chat"]["seconds"].append(time.perf_counter() - start)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _vector(text: str) -> np.ndarray:
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    v = rng.standard_normal(settings.dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    start = time.perf_counter()
+    body = await request.json()
+    inputs = body["input"]
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    await asyncio.sleep(_delay(settings.embed_latency_ms) + settings.per_input_ms * len(inputs) / 1000.0)
+    if random.random() < settings.error_rate:
+        return _error("embeddings", start)
+
+    as_base64 = body.get("encoding_format") == "base64"
+    data = []
+    for i, text in enumerate(inputs):
+        v = _vector(str(text))
+        emb = base64.b64encode(v.tobytes()).decode("ascii") if as_base64 else v.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": emb})
+    tokens = sum(len(str(t)) // 4 + 1 for t in inputs)
+    stats["embeddings"]["count"] += 1
+    stats["embeddings"]["seconds"].append(time.perf_counter() - start)
+    return {"object": "list", "data": data, "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+@app.get("/stats")
+def get_stats():
+    out = {}
+    for endpoint, s in stats.items():
+        secs = np.array(s["seconds"]) if s["seconds"] else np.zeros(1)
+        out[endpoint] = {
+            "count": s["count"],
+            "errors": s["errors"],
+            "total_seconds": float(np.sum(secs)),
+            "p50": float(np.percentile(secs, 50)),
+            "p95": float(np.percentile(secs, 95)),
+            "p99": float(np.percentile(secs, 99)),
+        }
+    return out
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.clear()
+    return {"status": "ok"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--chat-latency-ms', type=float, default=settings.chat_latency_ms, help='time to first token')
+    parser.add_argument('--embed-latency-ms', type=float, default=settings.embed_latency_ms)
+    parser.add_argument('--per-input-ms', type=float, default=settings.per_input_ms, help='extra embedding time per input')
+    parser.add_argument('--jitter', type=float, default=settings.jitter, help='+/- fraction applied to latencies')
+    parser.add_argument('--tokens-per-sec', type=float, default=settings.tokens_per_sec)
+    parser.add_argument('--completion-tokens', type=int, default=settings.completion_tokens)
+    parser.add_argument('--error-rate', type=float, default=settings.error_rate, help='fraction of calls answered 429/500/503')
+    parser.add_argument('--dim', type=int, default=settings.dim, help='embedding dimension')
+    args = parser.parse_args()
+    for k in vars(settings):
+        setattr(settings, k, getattr(args, k))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
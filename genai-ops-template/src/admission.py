@@ -0,0 +1,197 @@
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .llm_client import count_tokens
+from .metrics import ADMISSION, ADMISSION_REJECTED, ADMISSION_TRUNCATED
+
+
+class AdmissionRejected(Exception):
+    """``retry_after`` is None when the request can never be admitted as sent."""
+
+    def __init__(self, reason: str, retry_after: Optional[float], detail: str):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Non-blocking token bucket: ``rate`` units per second, ``capacity`` burst.
+
+    ``delay(n)`` says how long until ``n`` units are available without taking
+    them, so several buckets can be checked before any is charged. ``put``
+    may return units (a refund) or, with a negative amount, overdraw.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        # ``now`` may predate the last update (it is read before the lock)
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, n: float, now: float) -> float:
+        self._refill(now)
+        if n > self.capacity:
+            return math.inf
+        return max(n - self.tokens, 0.0) / self.rate
+
+    def put(self, n: float):
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + n)
+
+
+@dataclass
+class Ticket:
+    client: str
+    tokens: int
+
+
+@dataclass
+class _Limits:
+    rps: Optional[TokenBucket]
+    tpm: Optional[TokenBucket]
+
+
+def _limits(rps: float, burst: float, tpm: float) -> _Limits:
+    # 0 disables a limit
+    return _Limits(
+        rps=TokenBucket(rps, burst or max(rps, 1.0)) if rps > 0 else None,
+        tpm=TokenBucket(tpm / 60.0, tpm) if tpm > 0 else None,
+    )
+
+
+class AdmissionController:
+    """Per-client and global request-rate and token-rate limits.
+
+    ``admit`` charges one request and an estimate of the tokens the call will
+    use against the client's buckets and the global ones, or raises
+    ``AdmissionRejected`` (mapped to 429 with ``Retry-After``) without
+    charging anything when any bucket is short. ``settle`` corrects the token
+    charge once the real usage is known. Buckets live in this process, so
+    limits apply per API worker. The least recently seen clients are evicted
+    beyond ``max_clients``.
+    """
+
+    def __init__(
+        self,
+        client_rps: float = 0,
+        client_burst: float = 0,
+        client_tpm: float = 0,
+        global_rps: float = 0,
+        global_burst: float = 0,
+        global_tpm: float = 0,
+        max_clients: int = 10000,
+    ):
+        self._client_args = (client_rps, client_burst, client_tpm)
+        self._global = _limits(global_rps, global_burst, global_tpm)
+        self._clients: "OrderedDict[str, _Limits]" = OrderedDict()
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+
+    def _client(self, client: str) -> _Limits:
+        limits = self._clients.get(client)
+        if limits is None:
+            limits = self._clients[client] = _limits(*self._client_args)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return limits
+
+    def admit(self, route: str, client: str, tokens: int) -> Ticket:
+        now = time.monotonic()
+        with self._lock:
+            limits = self._client(client)
+            checks = (
+                ("client_rps", limits.rps, 1), ("client_tpm", limits.tpm, tokens),
+                ("global_rps", self._global.rps, 1), ("global_tpm", self._global.tpm, tokens),
+            )
+            for reason, bucket, n in checks:
+                if bucket is None:
+                    continue
+                wait = bucket.delay(n, now)
+                if wait > 0:
+                    ADMISSION.labels(route=route, result="rejected").inc()
+                    ADMISSION_REJECTED.labels(route=route, reason=reason).inc()
+                    if math.isinf(wait):
+                        raise AdmissionRejected(reason, None, f"request needs {n} tokens, above the {reason} limit")
+                    raise AdmissionRejected(reason, wait, f"{reason} limit exceeded; retry in {wait:.1f}s")
+            for _, bucket, n in checks:
+                if bucket is not None:
+                    bucket.put(-n)
+        ADMISSION.labels(route=route, result="admitted").inc()
+        return Ticket(client=client, tokens=tokens)
+
+    def settle(self, ticket: Optional[Ticket], used: int):
+        """Refund (or charge) the difference between reserved and used tokens."""
+        if ticket is None:
+            return
+        refund = ticket.tokens - used
+        ticket.tokens = used
+        with self._lock:
+            limits = self._clients.get(ticket.client)
+            for bucket in (limits.tpm if limits else None, self._global.tpm):
+                if bucket is not None:
+                    bucket.put(refund)
+
+    @contextmanager
+    def settle_on_error(self, ticket: Optional[Ticket]):
+        """Refund the whole reservation if the block raises (e.g. the provider call failed)."""
+        try:
+            yield
+        except BaseException:
+            self.settle(ticket, 0)
+            raise
+
+
+def used_tokens(usage: Dict) -> int:
+    return usage.get("total_tokens") or (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+
+
+@lru_cache(maxsize=8192)
+def message_tokens(content: str, model: str) -> int:
+    # conversations are re-sent every turn: count each message once
+    return count_tokens(content, model) + 4
+
+
+def prompt_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    return sum(message_tokens(m.get("content") or "", model) for m in messages) + 3
+
+
+def fit_messages(route: str, messages: List[Dict[str, str]], budget: int, model: str) -> Tuple[List[Dict[str, str]], int]:
+    """Drop the oldest turns until ``messages`` fit in ``budget`` prompt tokens.
+
+    Leading system messages and the last message are always kept. Returns
+    the messages and their token count; raises ``AdmissionRejected`` if even
+    those do not fit.
+    """
+    counts = [message_tokens(m.get("content") or "", model) for m in messages]
+    total = sum(counts) + 3
+    if budget <= 0 or total <= budget:
+        return messages, total
+    head = 0
+    while head < len(messages) - 1 and messages[head]["role"] == "system":
+        head += 1
+    drop = head
+    while total > budget and drop < len(messages) - 1:
+        total -= counts[drop]
+        drop += 1
+    if total > budget:
+        ADMISSION.labels(route=route, result="rejected").inc()
+        ADMISSION_REJECTED.labels(route=route, reason="too_large").inc()
+        raise AdmissionRejected("too_large", None, f"prompt needs {total} tokens, above the {budget} token limit")
+    ADMISSION_TRUNCATED.labels(route=route).inc(drop - head)
+    return messages[:head] + messages[drop:], total
+
@@ -1,22 +1,81 @@
 from __future__ import annotations
+import asyncio
+import json
+import math
+import os
 import time
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from . import config
-from .llm_client import LLMClient
+from .admission import (
+    AdmissionController, AdmissionRejected, Ticket, fit_messages, prompt_tokens, used_tokens,
+)
+from .llm_client import (
+    AsyncLLMClient, LLMClient, LLMOverloadedError, count_message_tokens, count_tokens,
+)
 from .prompt_registry import PromptRegistry
-from .guards import basic_input_guard
+from .guards import GuardEngine
 from . import rag
-from .metrics import REQUESTS, LATENCY, observe_usage
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from .context_pack import token_budget
+from .jobs import IngestJob, IngestJobManager, JobConflict
+from .metrics import REQUESTS, LATENCY, TTFT, TOKENS_PER_SECOND, observe_cache, observe_usage
+from .response_cache import ResponseCache, cache_key, normalize_messages, normalize_text
+from .tracing import TraceMiddleware, span
+from prometheus_client import REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.openmetrics import exposition as openmetrics
 
-app = FastAPI(title="GenAI Ops API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    ingest_jobs.shutdown()
+    await aclient.aclose()
 
+app = FastAPI(title="GenAI Ops API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(TraceMiddleware)
+
+# blocking client for ingestion, pooled async client for the request path
 client = LLMClient()
-registry = PromptRegistry()
+aclient = AsyncLLMClient()
+registry = PromptRegistry(check_interval=config.PROMPT_REGISTRY_RELOAD_INTERVAL)
+guard = GuardEngine.from_yaml(config.GUARD_RULES_PATH, redact=config.GUARD_REDACT)
+admission = AdmissionController(
+    client_rps=config.ADMISSION_CLIENT_RPS,
+    client_burst=config.ADMISSION_CLIENT_BURST,
+    client_tpm=config.ADMISSION_CLIENT_TPM,
+    global_rps=config.ADMISSION_GLOBAL_RPS,
+    global_burst=config.ADMISSION_GLOBAL_BURST,
+    global_tpm=config.ADMISSION_GLOBAL_TPM,
+    max_clients=config.ADMISSION_MAX_CLIENTS,
+)
+store = rag.VectorStoreManager(
+    config.VECTOR_STORE_PATH,
+    mmap=config.VECTOR_STORE_MMAP,
+    check_interval=config.VECTOR_STORE_RELOAD_INTERVAL,
+)
+response_cache = ResponseCache(
+    max_items=config.RESPONSE_CACHE_MAX_ITEMS,
+    ttl=config.RESPONSE_CACHE_TTL,
+    semantic_threshold=config.RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+) if config.RESPONSE_CACHE_ENABLED else None
+
+
+def _ingest_published(job: IngestJob):
+    # serve the new version right away instead of at the next reload check
+    if os.path.abspath(job.index_path) == os.path.abspath(store.path):
+        vs = store.reload()
+        if response_cache is not None:
+            response_cache.sync_generation("rag", vs.version)
+
+
+ingest_jobs = IngestJobManager(
+    client, max_jobs=config.INGEST_MAX_JOBS, on_success=_ingest_published,
+)
 
 # ---- Schemas ----
 class ChatMessage(BaseModel):
@@ -27,7 +86,9 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     prompt_name: str = "assistant_default"
     prompt_version: Optional[str] = None
+    prompt_variables: Optional[Dict[str, str]] = None
     temperature: float = 0.2
+    stream: bool = False
 
 class ChatResponse(BaseModel):
     content: str
@@ -37,81 +98,461 @@ class ChatResponse(BaseModel):
 class RAGIngestRequest(BaseModel):
     docs_path: str = config.DOCS_PATH
     index_path: str = config.VECTOR_STORE_PATH
+    full: bool = False
+    # block until the job finishes and return its report
+    wait: bool = False
 
 class RAGQuery(BaseModel):
     question: str
     top_k: int = 4
+    stream: bool = False
+
+class RAGSource(BaseModel):
+    id: int
+    score: float
+    text: str
+    metadata: dict
 
 class RAGResponse(BaseModel):
     answer: str
-    sources: List[str]
+    sources: List[RAGSource]
     usage: dict
     model: str
 
+class RAGBatchQuery(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=config.RAG_BATCH_MAX_QUESTIONS)
+    top_k: int = 4
+
+class RAGBatchItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    sources: List[RAGSource] = []
+    usage: dict = {}
+    error: Optional[str] = None
+
+class RAGBatchResponse(BaseModel):
+    results: List[RAGBatchItem]
+    usage: dict
+    model: str
+
+@app.exception_handler(LLMOverloadedError)
+async def overloaded(request: Request, exc: LLMOverloadedError):
+    # shed load fast instead of letting requests pile up behind the provider
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(AdmissionRejected)
+async def rejected(request: Request, exc: AdmissionRejected):
+    if exc.retry_after is None:
+        # retrying the same request cannot succeed
+        return JSONResponse(status_code=413, content={"detail": str(exc), "reason": exc.reason})
+    return JSONResponse(
+        status_code=429, content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+def client_id(request: Request) -> str:
+    header = request.headers.get(config.ADMISSION_CLIENT_HEADER)
+    return header or (request.client.host if request.client else "unknown")
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+def stream_chat(
+    route: str, messages: List[dict], start: float, temperature: float = 0.2,
+    extra: Optional[dict] = None, ticket: Optional[Ticket] = None,
+):
+    """Relay provider tokens as server-sent events.
+
+    Each token chunk is a ``data: {"content": ...}`` event; the stream ends
+    with an ``event: done`` carrying usage, model and ``extra``, or an
+    ``event: error`` if the provider fails. Latency and usage metrics, and the
+    admission ``ticket``, are settled however the stream ends, including
+    client disconnects (usage is then counted from what was streamed).
+    """
+    async def events():
+        first = None
+        parts: List[str] = []
+        usage, model = None, aclient.chat_model
+        try:
+            async for ev in aclient.chat_stream(messages, temperature=temperature):
+                if "content" in ev:
+                    if first is None:
+                        first = time.perf_counter()
+                        TTFT.labels(route=route).observe(first - start)
+                    parts.append(ev["content"])
+                    yield _sse(ev)
+                    continue
+                end = time.perf_counter()
+                usage, model = ev.get("usage", {}), ev.get("model", model)
+                if first is not None and end > first and usage.get("completion_tokens"):
+                    rate = usage["completion_tokens"] / (end - first)
+                    TOKENS_PER_SECOND.labels(route=route).observe(rate)
+                yield _sse({**ev, **(extra or {})}, event="done")
+        except LLMOverloadedError as e:
+            yield _sse({"detail": str(e)}, event="error")
+        except Exception as e:
+            # the 200 and headers are already sent: report the failure in-band
+            yield _sse({"detail": f"{type(e).__name__}: {e}"}, event="error")
+        finally:
+            LATENCY.labels(route=route).observe(time.perf_counter() - start)
+            if usage is None and first is not None:
+                # cut short after tokens were generated: count what the provider did
+                prompt = count_message_tokens(messages, model)
+                completion = count_tokens("".join(parts), model)
+                usage = {
+                    "prompt_tokens": prompt, "completion_tokens": completion,
+                    "total_tokens": prompt + completion,
+                }
+            if usage is not None:
+                observe_usage(route, usage, model)
+            admission.settle(ticket, used_tokens(usage) if usage is not None else 0)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"},
+    )
+
+def cached_usage(result: str) -> dict:
+    # a cache hit costs no provider tokens; tokens saved are exported instead
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached": result}
+
+def _guard_match(m, n_messages: int, variables: List[str]) -> dict:
+    # scanned texts are the messages followed by the prompt variable values
+    out = asdict(m)
+    if m.message >= n_messages:
+        del out["message"]
+        out["variable"] = variables[m.message - n_messages]
+    return out
+
 # ---- Routes ----
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
 
 @app.get("/metrics")
-def metrics():
+def metrics(request: Request):
+    # trace-id exemplars are only part of the OpenMetrics format
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return PlainTextResponse(
+            openmetrics.generate_latest(REGISTRY), media_type=openmetrics.CONTENT_TYPE_LATEST,
+        )
     return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request):
     route = "/chat"
     REQUESTS.labels(route=route).inc()
     start = time.perf_counter()
 
-    # Guardrails
-    for m in req.messages:
-        issues = basic_input_guard(m.content)
-        if issues:
-            raise HTTPException(status_code=400, detail={"issues": issues})
+    # Guardrails: one pass over the whole conversation and the prompt variables,
+    # which are rendered into the system prompt
+    contents = [m.content for m in req.messages]
+    variables = dict(req.prompt_variables or {})
+    names = list(variables)
+    with span("guard"):
+        checked = guard.scan(contents + [str(variables[k]) for k in names])
+    if checked.blocked:
+        raise HTTPException(status_code=400, detail={
+            "issues": checked.issues,
+            "matches": [
+                _guard_match(m, len(contents), names)
+                for m in checked.matches if m.action == "block"
+            ],
+        })
+    user_messages = [m.model_dump() for m in req.messages]
+    if checked.redacted is not None:
+        for m, text in zip(user_messages, checked.redacted):
+            m["content"] = text
+        variables = dict(zip(names, checked.redacted[len(contents):]))
 
     # Inject system from registry
-    sys = registry.get(req.prompt_name, req.prompt_version)["system"]
-    messages = [{"role": "system", "content": sys}] + [m.model_dump() for m in req.messages]
+    try:
+        with span("registry"):
+            sys = registry.system(req.prompt_name, req.prompt_version, variables or None)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    messages = [{"role": "system", "content": sys}] + user_messages
+
+    # count prompt tokens up front and reject before any provider work
+    with span("admission"):
+        messages, tokens = fit_messages(
+            route, messages, config.ADMISSION_MAX_PROMPT_TOKENS, aclient.chat_model,
+        )
+        ticket = admission.admit(
+            route, client_id(request), tokens + config.ADMISSION_COMPLETION_TOKENS,
+        )
+    if req.stream:
+        return stream_chat(route, messages, start, temperature=req.temperature, ticket=ticket)
 
-    out = client.chat(messages, temperature=req.temperature)
+    # a failed provider call refunds the reservation
+    with admission.settle_on_error(ticket):
+        key = scope = vec = None
+        if response_cache is not None:
+            response_cache.sync_generation("chat", registry.version)
+            # semantic matches only compare the last turn within the same context
+            scope = "chat:" + cache_key(
+                prompt=[req.prompt_name, req.prompt_version, variables],
+                history=normalize_messages(messages[:-1]),
+                temperature=req.temperature, model=aclient.chat_model,
+            )
+            key = cache_key(scope=scope, last=normalize_messages(messages[-1:]))
+            hit, result = response_cache.get(key), "exact"
+            if hit is None and response_cache.semantic:
+                vec = (await aclient.embed([messages[-1]["content"]]))[0]
+                hit, result = response_cache.get_similar(scope, vec), "semantic"
+            if hit is not None:
+                observe_cache(route, result, hit["usage"])
+                admission.settle(ticket, 0)
+                LATENCY.labels(route=route).observe(time.perf_counter() - start)
+                return ChatResponse(
+                    content=hit["content"], usage=cached_usage(result), model=hit["model"],
+                )
+            observe_cache(route, "miss")
+
+        out = await aclient.chat(messages, temperature=req.temperature)
     LATENCY.labels(route=route).observe(time.perf_counter() - start)
     observe_usage(route, out.get("usage", {}), out.get("model", ""))
-    return ChatResponse(content=out["content"], usage=out.get("usage", {}), model=out.get("model", ""))
-
+    admission.settle(ticket, used_tokens(out.get("usage", {})))
+    response = ChatResponse(
+        content=out["content"], usage=out.get("usage", {}), model=out.get("model", ""),
+    )
+    if key is not None:
+        response_cache.put(key, response.model_dump(), scope, vec)
+    return response
 
-@app.post("/rag/ingest")
-def rag_ingest(req: RAGIngestRequest):
-    from pathlib import Path
-    import os
 
-    path = Path(req.docs_path)
-    if not path.exists():
+@app.post("/rag/ingest", status_code=202)
+async def rag_ingest(req: RAGIngestRequest):
+    if not os.path.exists(req.docs_path):
         raise HTTPException(status_code=404, detail="docs_path not found")
+    try:
+        job = ingest_jobs.submit(req.docs_path, req.index_path, full=req.full)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not req.wait:
+        return job.to_dict()
+    await asyncio.wrap_future(job.future)
+    if job.state == "failed":
+        if isinstance(job.exception, (FileNotFoundError, ValueError)):
+            raise HTTPException(status_code=400, detail=str(job.exception))
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.state == "cancelled":
+        raise HTTPException(status_code=409, detail=f"job {job.id} was cancelled")
+    body = {"status": "ok", **job.report, "index": req.index_path, "job_id": job.id}
+    if job.reload_error is not None:
+        body["reload_error"] = job.reload_error
+    return JSONResponse(body)
+
+
+@app.get("/rag/ingest/jobs")
+def rag_ingest_jobs():
+    return {"jobs": [job.to_dict() for job in ingest_jobs.list()]}
+
 
-    texts = []
-    for p in path.rglob("*.txt"):
-        texts.append(p.read_text(encoding='utf-8'))
-    if not texts:
-        raise HTTPException(status_code=400, detail="No .txt files found")
+@app.get("/rag/ingest/jobs/{job_id}")
+def rag_ingest_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
 
-    embs = client.embed(texts)
-    vs = rag.build_vector_store(embs, texts)
-    rag.save_vector_store(vs, req.index_path)
-    return {"status": "ok", "docs": len(texts), "index": req.index_path}
+
+@app.post("/rag/ingest/jobs/{job_id}/cancel")
+def rag_ingest_cancel(job_id: str):
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
+
+
+def _rag_estimate(question: str, top_k: int) -> int:
+    # at most top_k chunks of CHUNK_SIZE characters (~4 per token) within the
+    # packing budget; corrected by _reserve_packed once the context is packed
+    model = aclient.chat_model
+    context = min(top_k * (config.CHUNK_SIZE // 4 + 4), token_budget(model))
+    question_tokens = prompt_tokens(rag.rag_messages(question, []), model)
+    return question_tokens + context + config.ADMISSION_COMPLETION_TOKENS
+
+
+def _settle_part(ticket: Optional[Ticket], reserved: int, used: int) -> int:
+    """Replace one question's ``reserved`` tokens in ``ticket`` by ``used``."""
+    if ticket is not None:
+        admission.settle(ticket, ticket.tokens - reserved + used)
+    return used
+
+
+def _reserve_packed(ticket: Optional[Ticket], estimate: int, packing: dict) -> int:
+    """Swap a question's ``estimate`` in ``ticket`` for its packed prompt and completion."""
+    needed = packing["packed_prompt_tokens"] + config.ADMISSION_COMPLETION_TOKENS
+    return _settle_part(ticket, estimate, needed)
 
 
 @app.post("/rag/query", response_model=RAGResponse)
-def rag_query(payload: RAGQuery):
+async def rag_query(payload: RAGQuery, request: Request):
     route = "/rag/query"
     REQUESTS.labels(route=route).inc()
     start = time.perf_counter()
 
-    vs = rag.load_vector_store(config.VECTOR_STORE_PATH)
-    q_emb = client.embed([payload.question])[0]
-    hits = rag.query(vs, q_emb, k=payload.top_k)
-    contexts = [t for _, t in hits]
+    try:
+        # a reload reads the index from disk: keep it off the event loop
+        with span("store"):
+            vs = await run_in_threadpool(store.get)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="vector store not found; run /rag/ingest first")
+    with span("admission"):
+        estimate = _rag_estimate(payload.question, payload.top_k)
+        ticket = admission.admit(route, client_id(request), estimate)
 
-    answer, usage, model = rag.compose_rag_answer(payload.question, contexts, client)
+    with admission.settle_on_error(ticket):
+        key = scope = None
+        use_cache = response_cache is not None and not payload.stream
+        if use_cache:
+            # answers depend on the index: a new version drops them all
+            response_cache.sync_generation("rag", vs.version)
+            scope = "rag:" + cache_key(top_k=payload.top_k, model=aclient.chat_model)
+            key = cache_key(scope=scope, question=normalize_text(payload.question))
+            hit = response_cache.get(key)
+            if hit is not None:
+                admission.settle(ticket, 0)
+                return _rag_cache_hit(route, start, hit, "exact")
+
+        q_emb = (await aclient.embed([payload.question]))[0]
+        if use_cache:
+            hit = response_cache.get_similar(scope, q_emb)
+            if hit is not None:
+                admission.settle(ticket, 0)
+                return _rag_cache_hit(route, start, hit, "semantic")
+            observe_cache(route, "miss")
+        hits = await run_in_threadpool(rag.query, vs, q_emb, payload.top_k)
+        sources, messages, packing = _pack(payload.question, hits)
+        _reserve_packed(ticket, estimate, packing)
+        if payload.stream:
+            return stream_chat(
+                route, messages, start, ticket=ticket,
+                extra={"sources": [s.model_dump() for s in sources], "packing": packing},
+            )
+
+        answer, usage, model = await rag.answer_rag_prompt(messages, aclient)
+    usage = {**usage, **packing}
     LATENCY.labels(route=route).observe(time.perf_counter() - start)
     observe_usage(route, usage, model)
-    return RAGResponse(answer=answer, sources=contexts, usage=usage, model=model)
+    admission.settle(ticket, used_tokens(usage))
+    response = RAGResponse(answer=answer, sources=sources, usage=usage, model=model)
+    if key is not None:
+        response_cache.put(key, response.model_dump(), scope, q_emb)
+    return response
+
+
+def _pack(question: str, hits: List[rag.Hit]):
+    packed, messages = rag.pack_rag_prompt(question, hits, aclient.chat_model)
+    sources = [
+        RAGSource(id=h.id, score=h.score, text=h.text, metadata=h.metadata) for h in packed.hits
+    ]
+    packing = {
+        "context_tokens": packed.tokens,
+        "packed_prompt_tokens": count_message_tokens(messages, aclient.chat_model),
+    }
+    return sources, messages, packing
+
+
+def _rag_cache_hit(route: str, start: float, hit: dict, result: str) -> RAGResponse:
+    observe_cache(route, result, hit["usage"])
+    LATENCY.labels(route=route).observe(time.perf_counter() - start)
+    return RAGResponse(**{**hit, "usage": cached_usage(result)})
+
+
+@app.post("/rag/query/batch", response_model=RAGBatchResponse)
+async def rag_query_batch(payload: RAGBatchQuery, request: Request):
+    """Answer many questions with one embedding call and one index search."""
+    route = "/rag/query/batch"
+    REQUESTS.labels(route=route).inc()
+    start = time.perf_counter()
+    questions = payload.questions
+
+    try:
+        with span("store"):
+            vs = await run_in_threadpool(store.get)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="vector store not found; run /rag/ingest first")
+    with span("admission"):
+        estimates = [_rag_estimate(q, payload.top_k) for q in questions]
+        ticket = admission.admit(route, client_id(request), sum(estimates))
+
+    with admission.settle_on_error(ticket):
+        items: List[Optional[RAGBatchItem]] = [None] * len(questions)
+        keys: List[Optional[str]] = [None] * len(questions)
+        scope = None
+        if response_cache is not None:
+            # same keys as /rag/query, so the two routes share entries
+            response_cache.sync_generation("rag", vs.version)
+            scope = "rag:" + cache_key(top_k=payload.top_k, model=aclient.chat_model)
+            for i, q in enumerate(questions):
+                keys[i] = cache_key(scope=scope, question=normalize_text(q))
+                hit = response_cache.get(keys[i])
+                if hit is not None:
+                    items[i] = _batch_cache_hit(route, q, hit, "exact")
+
+        todo = [i for i, item in enumerate(items) if item is None]
+        vecs = {}
+        if todo:
+            vecs = dict(zip(todo, await aclient.embed([questions[i] for i in todo])))
+            if response_cache is not None:
+                for i in todo:
+                    hit = response_cache.get_similar(scope, vecs[i])
+                    if hit is not None:
+                        items[i] = _batch_cache_hit(route, questions[i], hit, "semantic")
+                    else:
+                        observe_cache(route, "miss")
+                todo = [i for i in todo if items[i] is None]
+
+        if todo:
+            all_hits = await run_in_threadpool(
+                rag.query_batch, vs, [vecs[i] for i in todo], payload.top_k,
+            )
+            slots = asyncio.Semaphore(config.RAG_BATCH_CONCURRENCY)
+
+            async def answer(i: int, hits: List[rag.Hit]):
+                reserved, sources = estimates[i], []
+                try:
+                    sources, messages, packing = _pack(questions[i], hits)
+                    reserved = _reserve_packed(ticket, reserved, packing)
+                    async with slots:
+                        text, usage, model = await rag.answer_rag_prompt(messages, aclient)
+                except Exception as e:
+                    # one failed answer does not fail the batch, and is not charged
+                    _settle_part(ticket, reserved, 0)
+                    items[i] = RAGBatchItem(
+                        question=questions[i], sources=sources, error=f"{type(e).__name__}: {e}",
+                    )
+                    return
+                _settle_part(ticket, reserved, used_tokens(usage))
+                usage = {**usage, **packing}
+                items[i] = RAGBatchItem(
+                    question=questions[i], answer=text, sources=sources, usage=usage,
+                )
+                if keys[i] is not None:
+                    response = RAGResponse(answer=text, sources=sources, usage=usage, model=model)
+                    response_cache.put(keys[i], response.model_dump(), scope, vecs[i])
+
+            await asyncio.gather(*(answer(i, hits) for i, hits in zip(todo, all_hits)))
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "context_tokens": 0}
+    for item in items:
+        for k in usage:
+            usage[k] += item.usage.get(k) or 0
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    usage["questions"] = len(items)
+    usage["cached"] = sum(1 for item in items if item.usage.get("cached"))
+    usage["errors"] = sum(1 for item in items if item.error)
+    LATENCY.labels(route=route).observe(time.perf_counter() - start)
+    observe_usage(route, usage, aclient.chat_model)
+    admission.settle(ticket, usage["total_tokens"])
+    return RAGBatchResponse(results=items, usage=usage, model=aclient.chat_model)
+
+
+def _batch_cache_hit(route: str, question: str, hit: dict, result: str) -> RAGBatchItem:
+    observe_cache(route, result, hit["usage"])
+    return RAGBatchItem(
+        question=question, answer=hit["answer"], sources=hit["sources"], usage=cached_usage(result),
+    )
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .metrics import EMBED_BATCH_SIZE, EMBED_QUEUE_DELAY
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding requests into shared provider calls.
+
+    Texts submitted within ``max_wait_ms`` of the first queued text are sent
+    together, up to ``max_batch_size`` per call; a full batch is flushed
+    immediately. Each caller gets back exactly its own vectors (or the
+    exception of the call its texts were part of).
+    """
+
+    def __init__(self, embed_fn: EmbedFn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        futures = []
+        for t in texts:
+            fut = loop.create_future()
+            self._queue.append((t, fut, now))
+            futures.append(fut)
+            if len(self._queue) >= self.max_batch_size:
+                self._flush()
+        if self._queue and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            task = asyncio.ensure_future(self._run(batch))
+            # keep a reference so the task is not garbage-collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        sent = time.perf_counter()
+        EMBED_BATCH_SIZE.observe(len(batch))
+        for _, _, queued in batch:
+            EMBED_QUEUE_DELAY.observe(sent - queued)
+        try:
+            vectors = await self.embed_fn([t for t, _, _ in batch])
+        except BaseException as e:
+            # a cancelled flush cancels its callers rather than leaving them waiting
+            for _, fut, _ in batch:
+                if not fut.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        fut.cancel()
+                    else:
+                        fut.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for (_, fut, _), vec in zip(batch, vectors):
+            if not fut.done():
+                fut.set_result(vec)
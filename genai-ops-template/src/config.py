@@ -11,6 +11,8 @@ PROMETHEUS_ENABLED = os.getenv("PROMETHEUS_ENABLED", "true").lower() == "true"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+# any OpenAI-compatible endpoint, e.g. the local stub in scripts/stub_provider.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # Azure OpenAI
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -21,3 +23,94 @@ AZURE_OPENAI_EMBED_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBED_DEPLOYMENT")
 # RAG
 VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "data/index/faiss_index")
 DOCS_PATH = os.getenv("DOCS_PATH", "data/docs")
+# load the .faiss file with IO_FLAG_MMAP instead of reading it into RAM
+# (sharded stores are always memory-mapped)
+VECTOR_STORE_MMAP = os.getenv("VECTOR_STORE_MMAP", "false").lower() == "true"
+# seconds between checks for a newly published index version
+VECTOR_STORE_RELOAD_INTERVAL = float(os.getenv("VECTOR_STORE_RELOAD_INTERVAL", 1.0))
+# split the index into N shard files searched in parallel (1 = single index);
+# threads per worker for shard searches (0 = one per shard)
+VECTOR_STORE_SHARDS = int(os.getenv("VECTOR_STORE_SHARDS", 1))
+VECTOR_STORE_SHARD_THREADS = int(os.getenv("VECTOR_STORE_SHARD_THREADS", 0))
+# /rag/query/batch: max questions per request, answers composed concurrently
+RAG_BATCH_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", 256))
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", 8))
+# ingestion: max characters per chunk, overlap between chunks; max texts per embed call
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 100))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+# ingestion: processes reading and chunking files, started once per API worker
+# and shared by its ingest jobs (0 = one per CPU); published index versions
+# kept on disk; ingest jobs run at once per API worker
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", 2))
+INGEST_KEEP_VERSIONS = int(os.getenv("INGEST_KEEP_VERSIONS", 2))
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", 1))
+# ingestion: drop chunks whose MinHash-estimated Jaccard similarity (word
+# shingles) to an indexed chunk reaches the threshold (0 disables)
+INGEST_DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", 0.9))
+INGEST_DEDUP_NUM_PERM = int(os.getenv("INGEST_DEDUP_NUM_PERM", 128))
+INGEST_DEDUP_SHINGLE = int(os.getenv("INGEST_DEDUP_SHINGLE", 5))
+# API: coalesce concurrent embed calls arriving within this window (0 disables)
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 5))
+# ANN index: flat | ivf_flat | hnsw | ivf_pq
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+INDEX_TRAIN_SIZE = int(os.getenv("INDEX_TRAIN_SIZE", 50000))
+IVF_NLIST = int(os.getenv("IVF_NLIST", 1024))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+PQ_M = int(os.getenv("PQ_M", 64))
+PQ_NBITS = int(os.getenv("PQ_NBITS", 8))
+# embedding cache: in-memory LRU + SQLite file shared by the API workers and ingestion
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/cache/embeddings.sqlite")
+EMBED_CACHE_MAX_ITEMS = int(os.getenv("EMBED_CACHE_MAX_ITEMS", 10000))
+# async provider client: connection pool, timeouts, concurrency and retries
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", 20))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 256))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 10))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+# response cache: exact match always, semantic match when the threshold is > 0
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ITEMS = int(os.getenv("RESPONSE_CACHE_MAX_ITEMS", 2048))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", 0))
+# admission control (0 disables a limit): requests/sec with burst and tokens/min,
+# per client (ADMISSION_CLIENT_HEADER, else the remote address) and per worker
+# overall; prompts above ADMISSION_MAX_PROMPT_TOKENS lose their oldest turns;
+# ADMISSION_COMPLETION_TOKENS is reserved per call until real usage is known
+ADMISSION_CLIENT_RPS = float(os.getenv("ADMISSION_CLIENT_RPS", 0))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", 0))
+ADMISSION_CLIENT_TPM = float(os.getenv("ADMISSION_CLIENT_TPM", 0))
+ADMISSION_GLOBAL_RPS = float(os.getenv("ADMISSION_GLOBAL_RPS", 0))
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", 0))
+ADMISSION_GLOBAL_TPM = float(os.getenv("ADMISSION_GLOBAL_TPM", 0))
+ADMISSION_MAX_PROMPT_TOKENS = int(os.getenv("ADMISSION_MAX_PROMPT_TOKENS", 16000))
+ADMISSION_COMPLETION_TOKENS = int(os.getenv("ADMISSION_COMPLETION_TOKENS", 512))
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "x-client-id").lower()
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))
+# prompt registry: seconds between registry.yaml mtime checks (-1 disables reloads)
+PROMPT_REGISTRY_RELOAD_INTERVAL = float(os.getenv("PROMPT_REGISTRY_RELOAD_INTERVAL", 1.0))
+# tracing: per-stage spans are always measured; set a path to also export them as JSONL
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+# input guards: rule file compiled once at startup; redact-action matches are
+# masked before the provider call when GUARD_REDACT is on
+GUARD_RULES_PATH = os.getenv("GUARD_RULES_PATH", os.path.join(os.path.dirname(__file__), "guard_rules.yaml"))
+GUARD_REDACT = os.getenv("GUARD_REDACT", "false").lower() == "true"
+# RAG context packing: prompt tokens allowed for retrieved passages
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# per-model overrides of CONTEXT_TOKEN_BUDGET (update for your models)
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o-mini": 6000,
+}
+CONTEXT_MIN_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", 64))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))
+CONTEXT_MMR_ENABLED = os.getenv("CONTEXT_MMR_ENABLED", "false").lower() == "true"
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7))
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import FrozenSet, List, Optional
+
+from . import config
+from .llm_client import count_tokens, encoding_for
+from .rag import Hit
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class PackedContext:
+    hits: List[Hit]
+    tokens: int
+    dropped_duplicates: int
+    dropped_budget: int
+
+    @property
+    def texts(self) -> List[str]:
+        return [h.text for h in self.hits]
+
+
+def token_budget(model: str) -> int:
+    return config.CONTEXT_TOKEN_BUDGETS.get(model, config.CONTEXT_TOKEN_BUDGET)
+
+
+@lru_cache(maxsize=8192)
+def passage_tokens(text: str, model: str) -> int:
+    # the same chunks come back for many questions: count each once
+    return count_tokens(text, model)
+
+
+@lru_cache(maxsize=8192)
+def _shingles(text: str, n: int = 3) -> FrozenSet[str]:
+    words = _WORD.findall(text.casefold())
+    if len(words) < n:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard similarity of word 3-shingles."""
+    sa, sb = _shingles(a), _shingles(b)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+
+def dedupe(hits: List[Hit], threshold: float) -> List[Hit]:
+    kept: List[Hit] = []
+    for h in hits:
+        # hits arrive best-first, so the higher-scored copy is the one kept
+        if all(similarity(h.text, k.text) < threshold for k in kept):
+            kept.append(h)
+    return kept
+
+
+def mmr(hits: List[Hit], lam: float) -> List[Hit]:
+    """Re-order by maximal marginal relevance: ``lam * score - (1 - lam) * max overlap``."""
+    remaining, ordered = list(hits), []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda h: lam * h.score - (1 - lam) * max((similarity(h.text, o.text) for o in ordered), default=0.0),
+        )
+        ordered.append(best)
+        remaining.remove(best)
+    return ordered
+
+
+def _truncate(text: str, tokens: int, model: str) -> str:
+    enc = encoding_for(model)
+    if enc is None:
+        return text[:tokens * 4]
+    return enc.decode(enc.encode(text, disallowed_special=())[:tokens])
+
+
+def pack_contexts(
+    hits: List[Hit],
+    model: str,
+    budget: Optional[int] = None,
+    dedup_threshold: float = config.CONTEXT_DEDUP_THRESHOLD,
+    mmr_lambda: Optional[float] = None,
+) -> PackedContext:
+    """Select the passages to put in the prompt.
+
+    Drops duplicate and near-duplicate passages, optionally re-orders the rest
+    by MMR, then fills ``budget`` tokens in order. The first passage that does
+    not fit is truncated if at least ``CONTEXT_MIN_PASSAGE_TOKENS`` remain.
+    """
+    budget = token_budget(model) if budget is None else budget
+    if mmr_lambda is None and config.CONTEXT_MMR_ENABLED:
+        mmr_lambda = config.CONTEXT_MMR_LAMBDA
+    unique = dedupe(hits, dedup_threshold)
+    ordered = mmr(unique, mmr_lambda) if mmr_lambda is not None else unique
+
+    packed, used = [], 0
+    for h in ordered:
+        n = passage_tokens(h.text, model)
+        if used + n <= budget:
+            packed.append(h)
+            used += n
+            continue
+        left = budget - used
+        if left >= config.CONTEXT_MIN_PASSAGE_TOKENS:
+            text = _truncate(h.text, left, model)
+            packed.append(replace(h, text=text))
+            used += count_tokens(text, model)
+        break
+    return PackedContext(
+        hits=packed,
+        tokens=used,
+        dropped_duplicates=len(hits) - len(unique),
+        dropped_budget=len(ordered) - len(packed),
+    )
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# universal hashing modulo a Mersenne prime, as in the usual MinHash construction
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX = np.uint64((1 << 32) - 1)
+
+
+def shingle_hashes(text: str, n: int) -> np.ndarray:
+    """Distinct CRC32 hashes of the word ``n``-grams of ``text`` (case-folded).
+
+    CRC32 rather than ``hash()``: signatures must match across processes and runs.
+    """
+    words = _WORD.findall(text.casefold())
+    if len(words) <= n:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.a = rng.randint(1, 1 << 61, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 61, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hv = shingle_hashes(text, self.shingle)
+        # uint64 products wrap around; still a fixed hash family per seed
+        with np.errstate(over="ignore"):
+            phv = ((np.outer(hv, self.a) + self.b) % _PRIME) & _MAX
+        return phv.min(axis=0).astype(np.uint32)
+
+
+@lru_cache(maxsize=4)
+def minhasher(num_perm: int, shingle: int) -> MinHasher:
+    # one per process (ingest workers build their own)
+    return MinHasher(num_perm, shingle)
+
+
+def lsh_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """``(bands, rows)`` whose S-curve midpoint ``(1/b)^(1/r)`` is the highest at or below ``threshold``.
+
+    Erring low keeps recall; candidates are verified against the threshold.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicates:
+    """LSH index of MinHash signatures.
+
+    ``find`` returns the slot of a stored signature whose estimated Jaccard
+    similarity (share of equal MinHash values) is at least ``threshold``;
+    ``add`` stores a signature and returns its slot. ``ids[slot]`` is filled
+    in by the caller once the chunk has a docstore id.
+    """
+
+    def __init__(self, threshold: float, num_perm: int):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self.sigs: List[np.ndarray] = []
+        self.ids: List[Optional[int]] = []
+
+    def _keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def find(self, sig: np.ndarray) -> Optional[int]:
+        seen = set()
+        for buckets, key in zip(self._buckets, self._keys(sig)):
+            for slot in buckets.get(key, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                if np.mean(self.sigs[slot] == sig) >= self.threshold:
+                    return slot
+        return None
+
+    def add(self, sig: np.ndarray, id: Optional[int] = None) -> int:
+        slot = len(self.sigs)
+        self.sigs.append(sig)
+        self.ids.append(id)
+        for buckets, key in zip(self._buckets, self._keys(sig)):
+            buckets.setdefault(key, []).append(slot)
+        return slot
+
+    def save(self, path: str, keep: Optional[set] = None):
+        """Write ``(ids, signatures)`` of the stored chunks, optionally only ids in ``keep``."""
+        rows = [(i, s) for i, s in zip(self.ids, self.sigs) if i is not None and (keep is None or i in keep)]
+        ids = np.array([i for i, _ in rows], dtype=np.int64)
+        sigs = np.array([s for _, s in rows], dtype=np.uint32).reshape(len(rows), -1)
+        with open(path, "wb") as f:
+            np.savez(f, ids=ids, sigs=sigs)
+
+    def load(self, path: str, keep: set):
+        """Add the saved signatures of the ids in ``keep``; a missing file adds nothing."""
+        try:
+            data = np.load(path)
+        except FileNotFoundError:
+            return
+        for i, sig in zip(data["ids"].tolist(), data["sigs"]):
+            if i in keep:
+                self.add(sig, i)
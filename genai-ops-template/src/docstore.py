@@ -0,0 +1,130 @@
+from __future__ import annotations
+import json
+import mmap
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# one row per chunk id; a row with both lengths 0 is a deleted chunk
+TABLE_DTYPE = np.dtype([("offset", "<u8"), ("text_len", "<u4"), ("meta_len", "<u4")])
+
+
+@dataclass
+class Doc:
+    id: int
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class DocStore:
+    """Chunk texts and metadata addressed by chunk id.
+
+    On disk a store is two files: ``<path>.docs`` holds the UTF-8 text of each
+    chunk followed by its JSON metadata, and ``<path>.docidx`` is a ``.npy``
+    offset table (``TABLE_DTYPE``). Both are memory-mapped on load, so reading
+    a hit touches only that chunk's bytes. New chunks are buffered in memory
+    until ``save``; payload bytes are append-only, so saving back to the same
+    path appends to ``.docs`` and replaces only the offset table. Saving to a
+    new path (a new published version) hard-links the existing ``.docs`` and
+    appends to it, so no payload is copied; the source version's table never
+    points past its old end, so its readers are unaffected.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._open(path)
+
+    def _open(self, path: Optional[str]):
+        self.path = path
+        self._table = np.zeros(0, dtype=TABLE_DTYPE)
+        self._payload = None
+        self._end = self._size = 0
+        self._pending: List[bytes] = []
+        self._pending_rows: List[tuple] = []
+        self._deleted: set = set()
+        if path is not None:
+            self._table = np.load(path + ".docidx", mmap_mode="r")
+            with open(path + ".docs", "rb") as f:
+                self._end = self._size = os.fstat(f.fileno()).st_size
+                if self._size:
+                    self._payload = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path + ".docidx")
+
+    def __len__(self) -> int:
+        return len(self._table) + len(self._pending_rows)
+
+    def add(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        data = text.encode("utf-8")
+        meta = json.dumps(metadata or {}, separators=(",", ":")).encode("utf-8")
+        self._pending.append(data + meta)
+        self._pending_rows.append((self._end, len(data), len(meta)))
+        self._end += len(data) + len(meta)
+        return len(self) - 1
+
+    def extend(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[int]:
+        metadatas = metadatas or [None] * len(texts)
+        return [self.add(t, m) for t, m in zip(texts, metadatas)]
+
+    def remove(self, ids: Iterable[int]):
+        self._deleted.update(int(i) for i in ids)
+
+    def get(self, i: int) -> Optional[Doc]:
+        if i < 0 or i >= len(self) or i in self._deleted:
+            return None
+        if i < len(self._table):
+            offset, text_len, meta_len = (int(x) for x in self._table[i])
+            raw = self._payload[offset:offset + text_len + meta_len] if text_len + meta_len else b""
+        else:
+            _, text_len, meta_len = self._pending_rows[i - len(self._table)]
+            raw = self._pending[i - len(self._table)]
+        if text_len == 0 and meta_len == 0:
+            return None
+        meta = json.loads(raw[text_len:]) if meta_len else {}
+        return Doc(id=i, text=raw[:text_len].decode("utf-8"), metadata=meta)
+
+    def text(self, i: int) -> str:
+        doc = self.get(i)
+        return doc.text if doc is not None else ""
+
+    def save(self, path: str):
+        payload, table = path + ".docs", path + ".docidx"
+        tmp = f"{payload}.tmp{os.getpid()}"
+        same_file = self.path is not None and os.path.abspath(self.path) == os.path.abspath(path)
+        if same_file:
+            if os.path.getsize(payload) != self._size:
+                raise RuntimeError(f"{payload} was modified by another writer")
+            # payload is append-only: existing readers keep valid offsets
+            with open(payload, "ab") as f:
+                f.writelines(self._pending)
+        else:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if self.path is not None:
+                try:
+                    os.link(self.path + ".docs", tmp)
+                except OSError:
+                    # e.g. another filesystem, or one without hard links
+                    shutil.copyfile(self.path + ".docs", tmp)
+                if os.path.getsize(tmp) != self._size:
+                    os.remove(tmp)
+                    raise RuntimeError(f"{self.path}.docs was modified by another writer")
+            with open(tmp, "ab") as f:
+                f.writelines(self._pending)
+            os.replace(tmp, payload)
+
+        rows = np.empty(len(self), dtype=TABLE_DTYPE)
+        rows[:len(self._table)] = self._table
+        if self._pending_rows:
+            rows[len(self._table):] = np.array(self._pending_rows, dtype=TABLE_DTYPE)
+        for i in self._deleted:
+            if i < len(rows):
+                rows[i] = (0, 0, 0)
+        tmp = f"{table}.tmp{os.getpid()}.npy"
+        np.save(tmp, rows)
+        os.replace(tmp, table)
+        self._open(path)
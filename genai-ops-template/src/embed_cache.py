@@ -0,0 +1,86 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by ``(embed model, sha256(text))``.
+
+    Lookups hit an in-process LRU first, then a SQLite file that is shared by
+    every process pointing at the same ``path`` (API workers, eval runs).
+    Vectors are stored as float32 blobs.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_items: int = 10000):
+        self.max_items = max_items
+        self._lru: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            # WAL lets several workers read while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, hash TEXT NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (model, hash))"
+            )
+            self._db.commit()
+
+    def _remember(self, key: tuple, vec: List[float]):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [(model, content_hash(t)) for t in texts]
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    out[i] = vec
+                else:
+                    missing.append(i)
+            if missing and self._db is not None:
+                hashes = list({keys[i][1] for i in missing})
+                found = {}
+                # stay well below SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                        [model, *part],
+                    ).fetchall()
+                    found.update({h: np.frombuffer(v, dtype=np.float32).tolist() for h, v in rows})
+                for i in missing:
+                    vec = found.get(keys[i][1])
+                    if vec is not None:
+                        out[i] = vec
+                        self._remember(keys[i], vec)
+        return out
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        rows = []
+        with self._lock:
+            for t, vec in zip(texts, vectors):
+                key = (model, content_hash(t))
+                self._remember(key, vec)
+                rows.append((model, key[1], np.asarray(vec, dtype=np.float32).tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vec) VALUES (?, ?, ?)", rows)
+                self._db.commit()
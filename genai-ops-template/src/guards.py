@@ -1,15 +1,186 @@
 import re
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import yaml
 
 BANNED = [r"(?i)password", r"(?i)credit\s*card", r"(?i)ssn"]
+MAX_INPUT_CHARS = 8000
+
+_GLOBAL_FLAGS = re.compile(r"^\(\?([aiLmsux]+)\)")
 
 
 def basic_input_guard(text: str) -> List[str]:
     issues = []
-    if len(text) > 8000:
+    if len(text) > MAX_INPUT_CHARS:
         issues.append("input_too_long")
     for pat in BANNED:
         if re.search(pat, text):
             issues.append("contains_sensitive_marker")
             break
     return issues
+
+
+@dataclass
+class GuardRule:
+    id: str
+    pattern: str
+    literal: bool = False
+    ignore_case: bool = False
+    action: str = "block"  # block | redact
+    issue: str = "contains_sensitive_marker"
+
+    def regex(self) -> str:
+        body = re.escape(self.pattern) if self.literal else self.pattern
+        flags = "i" if self.ignore_case else ""
+        # a leading global flag group, e.g. "(?i)...", becomes a scoped one
+        m = _GLOBAL_FLAGS.match(body)
+        if m:
+            flags += m.group(1)
+            body = body[m.end():]
+        return f"(?{flags}:{body})" if flags else f"(?:{body})"
+
+
+@dataclass
+class GuardMatch:
+    rule: str
+    action: str
+    message: int
+    start: int
+    end: int
+
+
+@dataclass
+class GuardResult:
+    issues: List[str] = field(default_factory=list)
+    matches: List[GuardMatch] = field(default_factory=list)
+    # message contents with redact-action spans masked (only when redacting)
+    redacted: Optional[List[str]] = None
+
+    @property
+    def blocked(self) -> bool:
+        return bool(self.issues)
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Regex for a set of literals with shared prefixes merged, longest first."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and "" not in node else "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body
+
+    return emit(trie)
+
+
+class _Matcher:
+    """One regex for a set of rules: literals merged into prefix tries, patterns as named alternatives."""
+
+    def __init__(self, rules: List[GuardRule]):
+        self._literals: Dict[str, Dict[str, GuardRule]] = {"lit_i": {}, "lit": {}}
+        self._by_group: Dict[str, GuardRule] = {}
+        for i, r in enumerate(rules):
+            if r.literal:
+                group = "lit_i" if r.ignore_case else "lit"
+                key = r.pattern.lower() if r.ignore_case else r.pattern
+                self._literals[group].setdefault(key, r)
+            else:
+                self._by_group[f"r{i}"] = r
+        parts = []
+        if self._literals["lit_i"]:
+            parts.append(f"(?P<lit_i>(?i:{_trie_regex(list(self._literals['lit_i']))}))")
+        if self._literals["lit"]:
+            parts.append(f"(?P<lit>{_trie_regex(list(self._literals['lit']))})")
+        parts += [f"(?P<{g}>{r.regex()})" for g, r in self._by_group.items()]
+        self.regex = re.compile("|".join(parts))
+
+    def rule_for(self, m: "re.Match") -> GuardRule:
+        group = m.lastgroup
+        if group == "lit_i":
+            return self._literals[group][m.group().lower()]
+        if group == "lit":
+            return self._literals[group][m.group()]
+        return self._by_group[group]
+
+
+class GuardEngine:
+    """Guard rules compiled into one regex per action.
+
+    Literal rules are merged into a prefix trie (one branch per distinct next
+    character, so cost does not grow with the number of literals); pattern
+    rules become named alternatives. ``scan`` checks a whole conversation in
+    one pass per action and reports every matched span with the id of the
+    rule that matched it. Block and redact rules are scanned independently,
+    so a redact span (an e-mail address) never hides a block match inside
+    it. Within an action, at a given position literal rules win, then pattern
+    rules in file order. Block-action matches (and over-long messages)
+    produce issues; redact-action matches are masked as
+    ``[REDACTED:<rule id>]`` when ``redact`` is on.
+    """
+
+    SEPARATOR = "\x00"
+
+    def __init__(self, rules: List[GuardRule], redact: bool = False, max_chars: int = MAX_INPUT_CHARS):
+        self.rules = rules
+        self.redact = redact
+        self.max_chars = max_chars
+        self._matchers: List[_Matcher] = []
+        for action in dict.fromkeys(r.action for r in rules):
+            self._matchers.append(_Matcher([r for r in rules if r.action == action]))
+
+    @classmethod
+    def from_yaml(cls, path: str, **kwargs) -> "GuardEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return cls([GuardRule(**r) for r in data.get("rules", [])], **kwargs)
+
+    def scan(self, texts: List[str]) -> GuardResult:
+        result = GuardResult()
+        for t in texts:
+            if len(t) > self.max_chars and "input_too_long" not in result.issues:
+                result.issues.append("input_too_long")
+        if not self._matchers:
+            return result
+
+        joined = self.SEPARATOR.join(texts)
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + len(self.SEPARATOR)
+
+        for matcher in self._matchers:
+            msg = 0
+            for m in matcher.regex.finditer(joined):
+                while msg + 1 < len(starts) and m.start() >= starts[msg + 1]:
+                    msg += 1
+                end_of_msg = starts[msg] + len(texts[msg])
+                if m.end() > end_of_msg:
+                    continue  # spans a message boundary
+                rule = matcher.rule_for(m)
+                result.matches.append(GuardMatch(
+                    rule=rule.id, action=rule.action, message=msg,
+                    start=m.start() - starts[msg], end=m.end() - starts[msg],
+                ))
+                if rule.action == "block" and rule.issue not in result.issues:
+                    result.issues.append(rule.issue)
+
+        if self.redact and any(m.action == "redact" for m in result.matches):
+            result.redacted = self._apply_redactions(texts, result.matches)
+        return result
+
+    @staticmethod
+    def _apply_redactions(texts: List[str], matches: List[GuardMatch]) -> List[str]:
+        out = list(texts)
+        # right to left so earlier offsets stay valid
+        for m in sorted((m for m in matches if m.action == "redact"), key=lambda m: (m.message, m.start), reverse=True):
+            t = out[m.message]
+            out[m.message] = t[:m.start] + f"[REDACTED:{m.rule}]" + t[m.end:]
+        return out
@@ -0,0 +1,410 @@
+from __future__ import annotations
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import config
+from . import rag
+from .dedup import NearDuplicates, minhasher
+from .docstore import DocStore
+from .llm_client import LLMClient, count_tokens
+from .metrics import INGEST_CHUNKS, INGEST_DUPLICATES, INGEST_FILES, INGEST_TOKENS_SAVED
+
+MANIFEST_VERSION = 1
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool_size() -> int:
+    return config.INGEST_PROCESSES or os.cpu_count() or 1
+
+
+def ingest_pool() -> ProcessPoolExecutor:
+    """The process pool chunking files, started on first use and shared by every ingest job."""
+    global _POOL
+    with _POOL_LOCK:
+        # a worker that died breaks the pool for good: start a new one
+        if _POOL is None or getattr(_POOL, "_broken", False):
+            # jobs run on a thread of the (multi-threaded) API process: forking it is unsafe
+            _POOL = ProcessPoolExecutor(
+                max_workers=_pool_size(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def chunk_text(text: str, size: int, overlap: int = 0) -> Iterator[Tuple[int, str]]:
+    """Yield ``(char_offset, chunk)`` windows of at most ``size`` characters.
+
+    Windows end on the last paragraph break or whitespace inside the window
+    when there is one, so words are not cut in half.
+    """
+    start, n = 0, len(text)
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            cut = text.rfind("\n\n", start + 1, end)
+            if cut == -1:
+                cut = max(text.rfind(" ", start + 1, end), text.rfind("\n", start + 1, end))
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            yield start, chunk
+        if end >= n:
+            break
+        nxt = end - overlap
+        if overlap and nxt > start:
+            # start the overlap on a word boundary too
+            ws = text.find(" ", nxt, end)
+            nxt = ws + 1 if ws != -1 else nxt
+        start = max(nxt, start + 1)
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+@dataclass
+class IngestProgress:
+    """Counters updated by ``ingest_documents`` as it runs (read by job status)."""
+
+    stage: str = "queued"  # queued | hashing | embedding | publishing | done
+    files_total: int = 0
+    files_hashed: int = 0
+    files_to_embed: int = 0
+    files_chunked: int = 0
+    chunks_embedded: int = 0
+    chunks_duplicate: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def manifest_path(index_path: str) -> str:
+    return index_path + ".manifest.json"
+
+
+def load_manifest(index_path: str) -> Dict:
+    try:
+        with open(manifest_path(index_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest: Dict, index_path: str):
+    rag.replace_file(manifest_path(index_path), lambda p: _write_json(manifest, p))
+
+
+def _write_json(data: Dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def chunk_file(
+    path: str, size: int, overlap: int, minhash: Optional[Tuple[int, int]] = None,
+) -> List[Tuple[int, str, str, Optional[np.ndarray]]]:
+    """``(offset, chunk, sha256, signature)`` for every chunk of one file; runs in the ingest process pool.
+
+    ``minhash`` is ``(num_perm, shingle)`` when chunks need a MinHash signature.
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    hasher = minhasher(*minhash) if minhash else None
+    return [
+        (offset, chunk, hashlib.sha256(chunk.encode("utf-8")).hexdigest(), hasher.signature(chunk) if hasher else None)
+        for offset, chunk in chunk_text(text, size, overlap)
+    ]
+
+
+def minhash_path(index_path: str) -> str:
+    return index_path + ".minhash.npz"
+
+
+def _in_order(pool: Executor, fn: Callable, calls: Iterable[Tuple], window: int) -> Iterator:
+    # like pool.map, but with at most ``window`` calls in flight so results
+    # waiting for a slower consumer (the embedder) do not pile up in memory
+    pending = deque()
+    try:
+        for args in calls:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # the pool is shared: a failed or cancelled run drops its queued calls
+        for fut in pending:
+            fut.cancel()
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _settings(client: LLMClient, chunk_size: int, chunk_overlap: int, dedup_threshold: float) -> Dict:
+    # any change here invalidates every stored vector
+    return {
+        "embed_model": client.embed_model,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "index_type": config.VECTOR_INDEX_TYPE,
+        "shards": config.VECTOR_STORE_SHARDS,
+        "dedup": {
+            "threshold": dedup_threshold,
+            "num_perm": config.INGEST_DEDUP_NUM_PERM,
+            "shingle": config.INGEST_DEDUP_SHINGLE,
+        } if dedup_threshold > 0 else None,
+    }
+
+
+def _open_existing(files_path: str, manifest: Dict, settings: Dict):
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        return None
+    try:
+        vs = rag.load_vector_store(files_path)
+    except (FileNotFoundError, RuntimeError):
+        return None
+    # indexes built before explicit ids cannot be updated in place
+    if not rag.has_ids(vs.index):
+        return None
+    return vs
+
+
+def ingest_documents(
+    docs_path: str,
+    index_path: str,
+    client: LLMClient,
+    chunk_size: int = config.CHUNK_SIZE,
+    chunk_overlap: int = config.CHUNK_OVERLAP,
+    batch_size: int = config.EMBED_BATCH_SIZE,
+    full: bool = False,
+    processes: Optional[int] = None,
+    dedup_threshold: float = config.INGEST_DEDUP_THRESHOLD,
+    progress: Optional[IngestProgress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict:
+    """Stream ``*.txt`` files under ``docs_path`` into the index at ``index_path``.
+
+    Files are hashed on a thread pool, and changed files are read and chunked
+    in the shared ``ingest_pool`` (or a pool of ``processes`` processes for
+    this run only) and embedded in batches of ``batch_size`` chunks, each
+    batch being added to the index as soon as it returns. A manifest of
+    per-file content hashes stored with the index lets later runs skip
+    unchanged files and drop the chunks of removed ones; ``full`` forces a
+    rebuild. A run with no changed files never touches the process pool.
+
+    With ``dedup_threshold`` > 0, chunks whose MinHash-estimated Jaccard
+    similarity to an indexed chunk (from this run or an earlier one) reaches
+    the threshold are dropped before embedding. The manifest records which
+    kept chunks stand in for a file's dropped ones, so the file is chunked
+    again if those go away.
+
+    The result is published as a new index version (``rag.publish_vector_store``),
+    so concurrent queries never read a partially written store. ``progress`` is
+    updated as files and chunks are processed, and setting ``cancel`` stops the
+    run with ``IngestCancelled`` before anything is published.
+    """
+    root = Path(docs_path)
+    if not root.exists():
+        raise FileNotFoundError(f"docs_path not found: {docs_path}")
+    files = sorted(root.rglob("*.txt"))
+    if not files:
+        raise ValueError("No .txt files found")
+    progress = progress or IngestProgress()
+    progress.files_total = len(files)
+
+    def check_cancel():
+        if cancel is not None and cancel.is_set():
+            raise IngestCancelled(f"ingest of {docs_path} cancelled")
+
+    settings = _settings(client, chunk_size, chunk_overlap, dedup_threshold)
+    # manifest and store are read from the same published version
+    files_path = rag.published(index_path)[0]
+    manifest = {} if full else load_manifest(files_path)
+    vs = None if full else _open_existing(files_path, manifest, settings)
+    old_files = manifest.get("files", {}) if vs is not None else {}
+
+    pool = own_pool = None
+    window = 0
+    try:
+        progress.stage = "hashing"
+        current = {}
+        # hashlib and file reads release the GIL: threads are enough here
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="ingest-hash") as hasher:
+            for p, digest in zip(files, _in_order(hasher, file_sha256, [(p,) for p in files], 16)):
+                current[p.relative_to(root).as_posix()] = (p, digest)
+                progress.files_hashed += 1
+                INGEST_FILES.labels(stage="hashed").inc()
+                check_cancel()
+        changed = {rel: p for rel, (p, digest) in current.items() if old_files.get(rel, {}).get("sha256") != digest}
+        stale = [rel for rel in old_files if rel not in current or rel in changed]
+        # a file whose near-duplicate chunks were served by removed chunks is redone
+        removed = {i for rel in stale for i in old_files[rel].get("ids", [])}
+        while removed:
+            orphaned = [
+                rel for rel in current
+                if rel in old_files and rel not in changed and removed.intersection(old_files[rel].get("duplicates", []))
+            ]
+            for rel in orphaned:
+                changed[rel] = current[rel][0]
+                stale.append(rel)
+            removed = {i for rel in orphaned for i in old_files[rel].get("ids", [])}
+        if vs is not None and stale and not rag.supports_remove(vs.index):
+            # e.g. HNSW graphs cannot drop vectors: rebuild everything instead
+            vs, old_files, stale = None, {}, []
+            changed = {rel: p for rel, (p, _) in current.items()}
+        progress.files_to_embed = len(changed)
+        if changed:
+            if processes:
+                own_pool = ProcessPoolExecutor(
+                    max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                )
+            pool = own_pool or ingest_pool()
+            window = 2 * (processes or _pool_size())
+
+        removed_chunks = 0
+        if vs is not None:
+            for rel in stale:
+                ids = old_files[rel].get("ids", [])
+                rag.remove_ids(vs, ids)
+                removed_chunks += len(ids)
+
+        new_files = {rel: old_files[rel] for rel in current if rel in old_files and rel not in changed}
+
+        near = None
+        minhash = None
+        if dedup_threshold > 0:
+            minhash = (config.INGEST_DEDUP_NUM_PERM, config.INGEST_DEDUP_SHINGLE)
+            near = NearDuplicates(dedup_threshold, config.INGEST_DEDUP_NUM_PERM)
+            if vs is not None:
+                near.load(minhash_path(files_path), {i for f in new_files.values() for i in f["ids"]})
+        # near-duplicate slots per file, turned into docstore ids once every chunk is added
+        dup_slots: Dict[str, List[int]] = {}
+        duplicate_chunks = 0
+        tokens_saved = 0
+
+        def pending_chunks() -> Iterator[Tuple[str, str, Dict, Optional[int]]]:
+            nonlocal duplicate_chunks, tokens_saved
+            calls = [(str(p), chunk_size, chunk_overlap, minhash) for p in changed.values()]
+            for rel, chunks in zip(changed, _in_order(pool, chunk_file, calls, window)):
+                new_files[rel] = {"sha256": current[rel][1], "ids": []}
+                dup_slots[rel] = []
+                progress.files_chunked += 1
+                INGEST_FILES.labels(stage="chunked").inc()
+                for offset, chunk, digest, sig in chunks:
+                    slot = None
+                    if near is not None:
+                        dup = near.find(sig)
+                        if dup is not None:
+                            dup_slots[rel].append(dup)
+                            tokens = count_tokens(chunk, client.embed_model)
+                            duplicate_chunks += 1
+                            tokens_saved += tokens
+                            progress.chunks_duplicate += 1
+                            INGEST_DUPLICATES.inc()
+                            INGEST_TOKENS_SAVED.inc(tokens)
+                            continue
+                        slot = near.add(sig)
+                    yield rel, chunk, {"source": rel, "offset": offset, "sha256": digest}, slot
+
+        added_chunks = 0
+        # trained index types (IVF) need a sample before the first add: hold back
+        # up to INDEX_TRAIN_SIZE chunks, train on them, then stream the rest
+        held: List[Tuple[List, List]] = []
+
+        def add(batch, embs):
+            nonlocal added_chunks
+            ids = rag.add_embeddings(vs, embs, [c for _, c, _, _ in batch], [m for _, _, m, _ in batch])
+            for (rel, _, _, slot), i in zip(batch, ids):
+                new_files[rel]["ids"].append(i)
+                if slot is not None:
+                    near.ids[slot] = i
+            added_chunks += len(batch)
+            progress.chunks_embedded += len(batch)
+            INGEST_CHUNKS.inc(len(batch))
+
+        def open_store(sample: List[List[float]]):
+            index = rag.new_index(len(sample[0]), train_size=len(sample))
+            if not index.is_trained:
+                rag.train_index(index, sample)
+            return rag.VectorStore(index=index, embeddings=None, docs=DocStore())
+
+        def held_embeddings() -> List[List[float]]:
+            return [e for _, embs in held for e in embs]
+
+        progress.stage = "embedding"
+        for batch in _batched(pending_chunks(), batch_size):
+            check_cancel()
+            embs = client.embed([c for _, c, _, _ in batch])
+            if vs is None:
+                held.append((batch, embs))
+                if not rag.requires_training() or sum(len(b) for b, _ in held) >= config.INDEX_TRAIN_SIZE:
+                    vs = open_store(held_embeddings())
+                    for b, e in held:
+                        add(b, e)
+                    held = []
+                continue
+            add(batch, embs)
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown(cancel_futures=True)
+    if held:
+        vs = open_store(held_embeddings())
+        for b, e in held:
+            add(b, e)
+
+    if vs is None:
+        # every file is empty: nothing to index
+        raise ValueError("No text found in .txt files")
+    check_cancel()
+    progress.stage = "publishing"
+    for rel, slots in dup_slots.items():
+        if slots:
+            new_files[rel]["duplicates"] = sorted({near.ids[s] for s in slots})
+    manifest = {"version": MANIFEST_VERSION, "settings": settings, "files": new_files}
+
+    def before_publish(path: str):
+        save_manifest(manifest, path)
+        if near is not None:
+            near.save(minhash_path(path), keep={i for f in new_files.values() for i in f["ids"]})
+
+    if added_chunks or removed_chunks or not rag.store_exists(index_path) or manifest != load_manifest(files_path):
+        rag.publish_vector_store(vs, index_path, before_publish=before_publish)
+    progress.stage = "done"
+    return {
+        "docs": len(files),
+        "docs_embedded": len(changed),
+        "docs_unchanged": len(files) - len(changed),
+        "docs_removed": len([rel for rel in old_files if rel not in current]),
+        "chunks_added": added_chunks,
+        "chunks_removed": removed_chunks,
+        "chunks_duplicate": duplicate_chunks,
+        "tokens_saved": tokens_saved,
+        "chunks_total": int(vs.index.ntotal),
+    }
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .ingest import IngestCancelled, IngestProgress, ingest_documents
+from .llm_client import LLMClient
+from .metrics import INGEST_DURATION, INGEST_JOBS, INGEST_JOBS_RUNNING
+
+ACTIVE = ("queued", "running")
+
+logger = logging.getLogger(__name__)
+
+
+class JobConflict(Exception):
+    pass
+
+
+@dataclass
+class IngestJob:
+    id: str
+    docs_path: str
+    index_path: str
+    full: bool = False
+    state: str = "queued"  # queued | running | succeeded | failed | cancelled
+    progress: IngestProgress = field(default_factory=IngestProgress)
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    report: Optional[Dict] = None
+    error: Optional[str] = None
+    # the index was published, but the on_success callback (e.g. the API reload) failed
+    reload_error: Optional[str] = None
+    exception: Optional[BaseException] = field(default=None, repr=False)
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict:
+        progress = self.progress.to_dict()
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            progress["elapsed_s"] = round(elapsed, 3)
+            progress["chunks_per_sec"] = round(self.progress.chunks_embedded / elapsed, 1) if elapsed > 0 else 0.0
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "docs_path": self.docs_path,
+            "index_path": self.index_path,
+            "full": self.full,
+            "progress": progress,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "report": self.report,
+            "error": self.error,
+            "reload_error": self.reload_error,
+        }
+
+
+class IngestJobManager:
+    """Runs ``ingest_documents`` as background jobs.
+
+    Up to ``max_jobs`` jobs run at once in a thread pool (chunking files in
+    the shared ``ingest_pool``); the rest wait queued. Only
+    one job may be queued or running per index path. ``on_success(job)`` is
+    called once a job has published its index and is marked ``succeeded``; if
+    it raises, the job stays ``succeeded`` and the error is kept in
+    ``reload_error``. The last ``history`` finished jobs are kept for status
+    queries.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        max_jobs: int = 1,
+        on_success: Optional[Callable[[IngestJob], None]] = None,
+        history: int = 100,
+    ):
+        self.client = client
+        self.on_success = on_success
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max(max_jobs, 1), thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, docs_path: str, index_path: str, full: bool = False) -> IngestJob:
+        key = os.path.abspath(index_path)
+        with self._lock:
+            for other in self._jobs.values():
+                if other.state in ACTIVE and os.path.abspath(other.index_path) == key:
+                    raise JobConflict(f"job {other.id} is already {other.state} for {index_path}")
+            job = IngestJob(id=uuid.uuid4().hex, docs_path=docs_path, index_path=index_path, full=full)
+            self._jobs[job.id] = job
+            self._trim()
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Ask a job to stop; it finishes as ``cancelled`` at its next checkpoint."""
+        job = self._jobs.get(job_id)
+        if job is not None and job.state in ACTIVE:
+            job.cancel_event.set()
+        return job
+
+    def shutdown(self):
+        for job in self.list():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _trim(self):
+        finished = [j.id for j in self._jobs.values() if j.state not in ACTIVE]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestJob):
+        if job.cancel_event.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.state = "running"
+        job.started_at = time.time()
+        INGEST_JOBS_RUNNING.inc()
+        try:
+            job.report = ingest_documents(
+                job.docs_path, job.index_path, self.client, full=job.full,
+                progress=job.progress, cancel=job.cancel_event,
+            )
+            state = "succeeded"
+        except IngestCancelled:
+            state = "cancelled"
+        except Exception as e:
+            job.exception = e
+            job.error = f"{type(e).__name__}: {e}"
+            state = "failed"
+        finally:
+            INGEST_JOBS_RUNNING.dec()
+        INGEST_DURATION.observe(time.time() - job.started_at)
+        self._finish(job, state)
+        if state == "succeeded" and self.on_success is not None:
+            try:
+                self.on_success(job)
+            except Exception as e:
+                # the index is published: retrying the job would redo finished work
+                job.reload_error = f"{type(e).__name__}: {e}"
+                logger.exception(
+                    "ingest job %s published %s, but on_success failed", job.id, job.index_path,
+                )
+
+    def _finish(self, job: IngestJob, state: str):
+        job.finished_at = time.time()
+        job.state = state
+        INGEST_JOBS.labels(state=state).inc()
@@ -1,13 +1,96 @@
 from __future__ import annotations
+import asyncio
 import os
-from typing import List, Dict, Any
+import random
+import time
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
+import httpx
+import openai
 import tiktoken
-from openai import OpenAI, AzureOpenAI
+from openai import OpenAI, AzureOpenAI, AsyncOpenAI, AsyncAzureOpenAI
 
 from . import config
+from .batching import EmbeddingBatcher
+from .embed_cache import EmbeddingCache
+from .metrics import EMBED_CACHE, PROVIDER_QUEUE_WAIT, PROVIDER_RETRIES
+from .tracing import span
 
-class LLMClient:
+_EMBED_CACHE = None
+
+
+def shared_embed_cache() -> EmbeddingCache:
+    # one cache per process, shared by every client instance
+    global _EMBED_CACHE
+    if _EMBED_CACHE is None:
+        _EMBED_CACHE = EmbeddingCache(config.EMBED_CACHE_PATH or None, config.EMBED_CACHE_MAX_ITEMS)
+    return _EMBED_CACHE
+
+
+@lru_cache(maxsize=None)
+def encoding_for(model: str):
+    # building an encoder is expensive: one per model per process
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # BPE files could not be fetched (e.g. offline host): estimate instead
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    enc = encoding_for(model)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    # chat format overhead: ~4 tokens per message plus 3 to prime the reply
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages) + 3
+
+
+def _models() -> Tuple[str, str]:
+    if config.LLM_PROVIDER == "azure":
+        return config.AZURE_OPENAI_CHAT_DEPLOYMENT, config.AZURE_OPENAI_EMBED_DEPLOYMENT
+    return config.OPENAI_MODEL, config.OPENAI_EMBED_MODEL
+
+
+def _chat_result(resp, model: str) -> Dict[str, Any]:
+    choice = resp.choices[0]
+    return {
+        "content": choice.message.content,
+        "finish_reason": choice.finish_reason,
+        "usage": resp.usage.model_dump() if getattr(resp, "usage", None) else {},
+        "model": model,
+    }
+
+
+class _CachedEmbeddings:
+    """Cache bookkeeping shared by the sync and async clients."""
+
+    embed_model: str
+    embed_cache: Optional[EmbeddingCache]
+
+    def _cache_lookup(self, texts: List[str]) -> Tuple[str, List, List[str]]:
+        cache_model = f"{config.LLM_PROVIDER}:{self.embed_model}"
+        out = self.embed_cache.get_many(cache_model, texts)
+        # only misses go upstream, deduplicated, as one batch
+        misses = list(dict.fromkeys(t for t, v in zip(texts, out) if v is None))
+        EMBED_CACHE.labels(result="hit").inc(len(texts) - sum(v is None for v in out))
+        EMBED_CACHE.labels(result="miss").inc(len(misses))
+        return cache_model, out, misses
+
+    def _cache_fill(self, cache_model: str, texts: List[str], out: List, misses: List[str], vectors: List[List[float]]):
+        fetched = dict(zip(misses, vectors))
+        self.embed_cache.put_many(cache_model, misses, vectors)
+        return [v if v is not None else fetched[t] for t, v in zip(texts, out)]
+
+
+class LLMClient(_CachedEmbeddings):
     def __init__(self):
         if config.LLM_PROVIDER == "azure":
             self.client = AzureOpenAI(
@@ -15,35 +98,241 @@ class LLMClient:
                 api_version="2024-05-01-preview",
                 azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
             )
-            self.chat_model = config.AZURE_OPENAI_CHAT_DEPLOYMENT
-            self.embed_model = config.AZURE_OPENAI_EMBED_DEPLOYMENT
         else:
-            self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-            self.chat_model = config.OPENAI_MODEL
-            self.embed_model = config.OPENAI_EMBED_MODEL
+            self.client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+        self.chat_model, self.embed_model = _models()
+        self.embed_cache = shared_embed_cache() if config.EMBED_CACHE_ENABLED else None
 
     def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> Dict[str, Any]:
-        resp = self.client.chat.completions.create(
-            model=self.chat_model,
-            messages=messages,
-            temperature=temperature,
+        with span("llm"):
+            resp = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=temperature,
+            )
+        return _chat_result(resp, self.chat_model)
+
+    def _embed_upstream(self, texts: List[str]) -> List[List[float]]:
+        resp = self.client.embeddings.create(
+            model=self.embed_model, input=texts
         )
-        choice = resp.choices[0]
-        out = {
-            "content": choice.message.content,
-            "finish_reason": choice.finish_reason,
-            "usage": resp.usage.model_dump() if hasattr(resp, "usage") else {},
-            "model": self.chat_model,
-        }
-        return out
+        return [d.embedding for d in resp.data]
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        if config.LLM_PROVIDER == "azure":
-            resp = self.client.embeddings.create(
-                model=self.embed_model, input=texts
+        with span("embed"):
+            if self.embed_cache is None:
+                return self._embed_upstream(texts)
+            cache_model, out, misses = self._cache_lookup(texts)
+            if misses:
+                out = self._cache_fill(cache_model, texts, out, misses, self._embed_upstream(misses))
+            return out
+
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when a provider's concurrency slots and wait queue are full."""
+
+
+class _ProviderLimiter:
+    """Bounded concurrency with a bounded, time-limited wait queue."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def acquire(self):
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            raise LLMOverloadedError("provider queue is full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMOverloadedError(f"no provider slot within {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._sem.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+_LIMITERS: Dict[str, _ProviderLimiter] = {}
+
+
+def provider_limiter(provider: str) -> _ProviderLimiter:
+    # one limiter per provider, shared by every async client in the process
+    if provider not in _LIMITERS:
+        _LIMITERS[provider] = _ProviderLimiter(
+            config.LLM_MAX_CONCURRENCY, config.LLM_MAX_QUEUE, config.LLM_QUEUE_TIMEOUT
+        )
+    return _LIMITERS[provider]
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _retry_reason(e: Exception) -> str:
+    if isinstance(e, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(e, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(e, openai.APIConnectionError):
+        return "connection"
+    return "server_error"
+
+
+def _backoff(attempt: int, e: Exception) -> float:
+    retry_after = None
+    response = getattr(e, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            pass
+    # full jitter keeps retrying workers from synchronising
+    delay = random.uniform(0, min(config.LLM_BACKOFF_MAX, config.LLM_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, min(retry_after or 0.0, config.LLM_BACKOFF_MAX))
+
+
+class AsyncLLMClient(_CachedEmbeddings):
+    """Non-blocking client for the async API routes.
+
+    Shares one pooled ``httpx.AsyncClient`` across all calls, caps in-flight
+    provider calls per provider (rejecting with ``LLMOverloadedError`` once the
+    wait queue is full or the wait times out) and retries 429/5xx/timeouts
+    with jittered exponential backoff.
+    """
+
+    def __init__(self):
+        self.provider = config.LLM_PROVIDER
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT),
+        )
+        # retries are handled here, outside the concurrency slot
+        if self.provider == "azure":
+            self.client = AsyncAzureOpenAI(
+                api_key=config.AZURE_OPENAI_API_KEY,
+                api_version="2024-05-01-preview",
+                azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+                http_client=self.http_client,
+                max_retries=0,
             )
         else:
-            resp = self.client.embeddings.create(
-                model=self.embed_model, input=texts
+            self.client = AsyncOpenAI(
+                api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL,
+                http_client=self.http_client, max_retries=0,
             )
+        self.chat_model, self.embed_model = _models()
+        self.embed_cache = shared_embed_cache() if config.EMBED_CACHE_ENABLED else None
+        # cache misses from concurrent requests share provider calls
+        self.batcher = EmbeddingBatcher(
+            self._embed_call, max_batch_size=config.EMBED_BATCH_SIZE, max_wait_ms=config.EMBED_BATCH_WINDOW_MS,
+        ) if config.EMBED_BATCH_WINDOW_MS > 0 else None
+
+    async def _call(self, fn, hold: bool = False, **kwargs):
+        # hold=True returns with the provider slot still acquired (for streams);
+        # the caller must release it
+        limiter = provider_limiter(self.provider)
+        for attempt in range(config.LLM_MAX_RETRIES + 1):
+            queued = time.perf_counter()
+            await limiter.acquire()
+            PROVIDER_QUEUE_WAIT.labels(provider=self.provider).observe(time.perf_counter() - queued)
+            keep = False
+            try:
+                result = await fn(**kwargs)
+                keep = hold
+                return result
+            except Exception as e:
+                if attempt >= config.LLM_MAX_RETRIES or not _retryable(e):
+                    raise
+                error = e
+            finally:
+                # also on cancellation (client disconnects, timeouts)
+                if not keep:
+                    limiter.release()
+            PROVIDER_RETRIES.labels(provider=self.provider, reason=_retry_reason(error)).inc()
+            await asyncio.sleep(_backoff(attempt, error))
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> Dict[str, Any]:
+        with span("llm"):
+            resp = await self._call(
+                self.client.chat.completions.create,
+                model=self.chat_model,
+                messages=messages,
+                temperature=temperature,
+            )
+        return _chat_result(resp, self.chat_model)
+
+    async def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.2) -> AsyncIterator[Dict[str, Any]]:
+        """Yield ``{"content": delta}`` per token chunk, then one final
+        ``{"usage", "model", "finish_reason"}`` event.
+
+        Only opening the stream is retried; the provider slot is held until
+        the stream ends or the consumer stops iterating.
+        """
+        kwargs = dict(model=self.chat_model, messages=messages, temperature=temperature, stream=True)
+        if self.provider != "azure":
+            kwargs["stream_options"] = {"include_usage": True}
+        parts, usage, finish_reason = [], None, None
+        # the span covers the whole stream, including time the consumer holds it
+        with span("llm", stream=True):
+            stream = await self._call(self.client.chat.completions.create, hold=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage.model_dump()
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    finish_reason = choice.finish_reason or finish_reason
+                    if choice.delta and choice.delta.content:
+                        parts.append(choice.delta.content)
+                        yield {"content": choice.delta.content}
+            finally:
+                try:
+                    await stream.close()
+                finally:
+                    provider_limiter(self.provider).release()
+        if usage is None:
+            # provider did not report usage for the stream: count it ourselves
+            prompt = count_message_tokens(messages, self.chat_model)
+            completion = count_tokens("".join(parts), self.chat_model)
+            usage = {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+        yield {"usage": usage, "model": self.chat_model, "finish_reason": finish_reason}
+
+    async def _embed_call(self, texts: List[str]) -> List[List[float]]:
+        resp = await self._call(self.client.embeddings.create, model=self.embed_model, input=texts)
         return [d.embedding for d in resp.data]
+
+    async def _embed_upstream(self, texts: List[str]) -> List[List[float]]:
+        if self.batcher is None:
+            return await self._embed_call(texts)
+        return await self.batcher.embed(texts)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        with span("embed"):
+            if self.embed_cache is None:
+                return await self._embed_upstream(texts)
+            # SQLite lookups block: keep them off the event loop
+            cache_model, out, misses = await asyncio.to_thread(self._cache_lookup, texts)
+            if misses:
+                vectors = await self._embed_upstream(misses)
+                out = await asyncio.to_thread(self._cache_fill, cache_model, texts, out, misses, vectors)
+            return out
+
+    async def aclose(self):
+        await self.http_client.aclose()
@@ -1,9 +1,81 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 REQUESTS = Counter("genai_requests_total", "Total number of requests", ["route"]) 
 TOKENS = Counter("genai_tokens_total", "Total tokens used", ["route", "kind"])  # kind: prompt|completion
 COST_USD = Counter("genai_cost_usd_total", "Total estimated cost in USD", ["route"]) 
 LATENCY = Histogram("genai_latency_seconds", "Latency per route in seconds", ["route"]) 
+TTFT = Histogram(
+    "genai_time_to_first_token_seconds", "Time from request start to first streamed token",
+    ["route"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0),
+)
+TOKENS_PER_SECOND = Histogram(
+    "genai_stream_tokens_per_second", "Completion tokens per second after the first token",
+    ["route"],
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+)
+RESPONSE_CACHE = Counter(
+    "genai_response_cache_total", "Response cache lookups", ["route", "result"],
+)  # result: exact|semantic|miss
+TOKENS_SAVED = Counter(
+    "genai_cache_tokens_saved_total",
+    "Tokens not sent to the provider thanks to the response cache",
+    ["route", "kind"],
+)
+EMBED_QUEUE_DELAY = Histogram(
+    "genai_embed_queue_delay_seconds",
+    "Time a text waits in the embedding batcher before its provider call",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25),
+)
+EMBED_BATCH_SIZE = Histogram(
+    "genai_embed_batch_size", "Texts per coalesced embedding call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMBED_CACHE = Counter(
+    "genai_embed_cache_total", "Embedding cache lookups per text", ["result"],
+)  # result: hit|miss
+STAGE_LATENCY = Histogram(
+    "genai_stage_seconds", "Time spent per request stage", ["route", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PROVIDER_RETRIES = Counter(
+    "genai_provider_retries_total", "Provider calls retried", ["provider", "reason"],
+)  # reason: rate_limit|server_error|timeout|connection
+PROVIDER_QUEUE_WAIT = Histogram(
+    "genai_provider_queue_wait_seconds", "Time waiting for a provider concurrency slot",
+    ["provider"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION = Counter(
+    "genai_admission_total", "Admission decisions", ["route", "result"],
+)  # result: admitted|rejected
+ADMISSION_REJECTED = Counter(
+    "genai_admission_rejected_total", "Requests rejected by admission control", ["route", "reason"],
+)  # reason: client_rps|client_tpm|global_rps|global_tpm|too_large
+ADMISSION_TRUNCATED = Counter(
+    "genai_admission_truncated_messages_total", "Older turns dropped to fit the prompt token limit",
+    ["route"],
+)
+INGEST_JOBS = Counter(
+    "genai_ingest_jobs_total", "Ingest jobs finished", ["state"],
+)  # state: succeeded|failed|cancelled
+INGEST_JOBS_RUNNING = Gauge("genai_ingest_jobs_running", "Ingest jobs currently running")
+INGEST_FILES = Counter(
+    "genai_ingest_files_total", "Files processed by ingestion", ["stage"],
+)  # stage: hashed|chunked
+INGEST_CHUNKS = Counter(
+    "genai_ingest_chunks_total", "Chunks embedded and added to the index by ingestion",
+)
+INGEST_DUPLICATES = Counter(
+    "genai_ingest_duplicate_chunks_total", "Near-duplicate chunks dropped before embedding",
+)
+INGEST_TOKENS_SAVED = Counter(
+    "genai_ingest_tokens_saved_total", "Embedding tokens not spent on near-duplicate chunks",
+)
+INGEST_DURATION = Histogram(
+    "genai_ingest_job_seconds", "Wall time of ingest jobs",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
 
 # naive price map (update for your models)
 PRICE_PER_1K = {
@@ -21,3 +93,10 @@ def observe_usage(route: str, usage: dict, model: str):
     if price:
         cost = (prompt / 1000.0) * price["input"] + (comp / 1000.0) * price["output"]
         COST_USD.labels(route=route).inc(cost)
+
+
+def observe_cache(route: str, result: str, usage: dict = None):
+    RESPONSE_CACHE.labels(route=route, result=result).inc()
+    if usage:
+        TOKENS_SAVED.labels(route=route, kind="prompt").inc(usage.get("prompt_tokens") or 0)
+        TOKENS_SAVED.labels(route=route, kind="completion").inc(usage.get("completion_tokens") or 0)
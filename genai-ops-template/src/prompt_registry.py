@@ -1,18 +1,162 @@
+import hashlib
+import os
+import re
+import threading
+import time
 import yaml
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Dict, Any
+from string import Template
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Tuple
+
+_NUM = re.compile(r'(\d+)')
+_RENDER_CACHE_SIZE = 1024
+
+
+def version_key(version: str) -> Tuple:
+    """Natural ordering, so v2 < v10 and 1.2 < 1.10."""
+    return tuple((0, int(p)) if p.isdigit() else (1, p) for p in _NUM.split(version) if p)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    version: str
+    entry: Mapping[str, Any]
+    template: Template
+    defaults: Mapping[str, str]
+    # system message rendered with the defaults, built once at load
+    system: str
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    prompts: Mapping[Tuple[str, str], Prompt]
+    latest: Mapping[str, str]
+    version: str
+    mtime_ns: int
+    _rendered: Dict[Tuple, str] = field(default_factory=dict, compare=False)
+
+
+def _compile(raw: str, mtime_ns: int) -> Snapshot:
+    data = yaml.safe_load(raw) or {}
+    prompts, latest = {}, {}
+    for name, node in data.items():
+        versions: List[str] = []
+        for version, entry in node.items():
+            if version == 'latest':
+                continue
+            version = str(version)
+            defaults = {k: str(v) for k, v in (entry.get('variables') or {}).items()}
+            template = Template(entry['system'])
+            prompts[(name, version)] = Prompt(
+                name=name,
+                version=version,
+                entry=MappingProxyType(dict(entry)),
+                template=template,
+                defaults=MappingProxyType(defaults),
+                system=template.safe_substitute(defaults),
+            )
+            versions.append(version)
+        if not versions:
+            raise ValueError(f"Prompt has no versions: {name}")
+        # an explicit `latest: <version>` pins it; otherwise the highest version wins
+        pinned = node.get('latest')
+        latest[name] = str(pinned) if pinned is not None else max(versions, key=version_key)
+        if (name, latest[name]) not in prompts:
+            raise ValueError(f"Prompt {name}: latest points to unknown version {latest[name]}")
+    return Snapshot(
+        prompts=MappingProxyType(prompts),
+        latest=MappingProxyType(latest),
+        # changes whenever the registry file content does (cache invalidation)
+        version=hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16],
+        mtime_ns=mtime_ns,
+    )
+
 
 class PromptRegistry:
-    def __init__(self, path: str = str(Path(__file__).with_name('prompts') / 'registry.yaml')):
+    """Versioned prompts from a YAML file, reloaded when the file changes.
+
+    The file is parsed into an immutable ``Snapshot`` with every version's
+    ``$variable`` template compiled and its default system message rendered.
+    The file's mtime is checked at most every ``check_interval`` seconds; a
+    changed file is compiled off to the side and swapped in with one reference
+    assignment, and a file that fails to parse leaves the current snapshot in
+    place (see ``last_error``).
+    """
+
+    def __init__(self, path: str = str(Path(__file__).with_name('prompts') / 'registry.yaml'),
+                 check_interval: float = 1.0):
         self.path = Path(path)
-        with open(self.path, 'r', encoding='utf-8') as f:
-            self._data = yaml.safe_load(f)
+        self.check_interval = check_interval
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._snapshot = self._load()
+        self._next_check = time.monotonic() + check_interval
+
+    @property
+    def version(self) -> str:
+        return self.snapshot().version
+
+    def _load(self) -> Snapshot:
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        raw = self.path.read_text(encoding='utf-8')
+        return _compile(raw, mtime_ns)
+
+    def snapshot(self) -> Snapshot:
+        snap = self._snapshot
+        if self.check_interval < 0 or time.monotonic() < self._next_check:
+            return snap
+        if self._lock.acquire(blocking=False):
+            try:
+                self._next_check = time.monotonic() + self.check_interval
+                if os.stat(self.path).st_mtime_ns != snap.mtime_ns:
+                    self._snapshot = self._load()
+                    self.last_error = None
+            except (OSError, yaml.YAMLError, KeyError, ValueError, AttributeError, TypeError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self._lock.release()
+        return self._snapshot
 
-    def get(self, name: str, version: Optional[str] = None) -> Dict[str, Any]:
-        node = self._data.get(name)
-        if not node:
-            raise KeyError(f"Prompt not found: {name}")
+    def reload(self) -> Snapshot:
+        with self._lock:
+            self._snapshot = self._load()
+            self.last_error = None
+            self._next_check = time.monotonic() + self.check_interval
+        return self._snapshot
+
+    def resolve(self, name: str, version: Optional[str] = None) -> Prompt:
+        return self._resolve(self.snapshot(), name, version)
+
+    @staticmethod
+    def _resolve(snap: Snapshot, name: str, version: Optional[str]) -> Prompt:
         if version is None:
-            # pick the last key as latest by convention
-            version = list(node.keys())[-1]
-        return node[version]
+            version = snap.latest.get(name)
+            if version is None:
+                raise KeyError(f"Prompt not found: {name}")
+        prompt = snap.prompts.get((name, version))
+        if prompt is None:
+            if name not in snap.latest:
+                raise KeyError(f"Prompt not found: {name}")
+            raise KeyError(f"Prompt version not found: {name}@{version}")
+        return prompt
+
+    def get(self, name: str, version: Optional[str] = None) -> Mapping[str, Any]:
+        return self.resolve(name, version).entry
+
+    def system(self, name: str, version: Optional[str] = None,
+               variables: Optional[Dict[str, Any]] = None) -> str:
+        """Rendered system message; repeated variable sets are served from a cache."""
+        snap = self.snapshot()
+        prompt = self._resolve(snap, name, version)
+        if not variables:
+            return prompt.system
+        key = (prompt.name, prompt.version, tuple(sorted((k, str(v)) for k, v in variables.items())))
+        text = snap._rendered.get(key)
+        if text is None:
+            text = prompt.template.safe_substitute({**prompt.defaults, **dict(key[2])})
+            if len(snap._rendered) < _RENDER_CACHE_SIZE:
+                snap._rendered[key] = text
+        return text
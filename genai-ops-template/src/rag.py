@@ -1,77 +1,431 @@
 from __future__ import annotations
+import json
 import os
+import shutil
+import threading
+import time
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, Union
 
 import numpy as np
 import faiss
 
-from .llm_client import LLMClient
+from . import config
+from .docstore import DocStore
+from .shards import ShardedIndex
+from .llm_client import AsyncLLMClient, LLMClient
+from .tracing import span
+
+if TYPE_CHECKING:
+    from .context_pack import PackedContext
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
 
 @dataclass
 class VectorStore:
-    index: faiss.IndexFlatIP
+    index: faiss.Index
     embeddings: np.ndarray
-    texts: List[str]
+    docs: DocStore
+    version: Optional[str] = None
+
+
+@dataclass
+class Hit:
+    id: int
+    score: float
+    text: str
+    metadata: dict
+
+
+PQ_MIN_SUBVECTOR_DIMS = 4
+
+
+def _pq_subquantizers(dim: int) -> int:
+    # PQ needs dim % m == 0: the largest divisor of dim not above the configured
+    # m that leaves each sub-quantizer at least PQ_MIN_SUBVECTOR_DIMS dimensions
+    m = max(min(config.PQ_M, dim // PQ_MIN_SUBVECTOR_DIMS), 1)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def index_factory_string(dim: int, kind: str, train_size: Optional[int] = None) -> str:
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind} (expected one of {INDEX_TYPES})")
+    if kind in ("ivf_flat", "ivf_pq"):
+        # k-means wants ~39 training points per centroid; shrink nlist for small corpora
+        nlist = config.IVF_NLIST
+        if train_size is not None:
+            nlist = max(1, min(nlist, train_size // 39))
+        # each PQ sub-quantizer is a k-means with 2**nbits centroids: same ~39 points each
+        if kind == "ivf_pq" and (train_size is None or train_size >= 39 * 2 ** config.PQ_NBITS):
+            return f"IVF{nlist},PQ{_pq_subquantizers(dim)}x{config.PQ_NBITS}"
+        # too few vectors to train the PQ codebooks well: keep full vectors
+        return f"IVF{nlist},Flat"
+    if kind == "hnsw":
+        return f"HNSW{config.HNSW_M}"
+    return "Flat"
+
+
+def new_index(
+    dim: int,
+    kind: Optional[str] = None,
+    train_size: Optional[int] = None,
+    shards: Optional[int] = None,
+) -> faiss.Index:
+    kind = kind or config.VECTOR_INDEX_TYPE
+    shards = shards or config.VECTOR_STORE_SHARDS
+    if shards > 1:
+        # each shard holds ~1/N of the vectors, so it needs fewer IVF lists
+        per_shard = None if train_size is None else max(train_size // shards, 1)
+        return ShardedIndex([new_index(dim, kind, per_shard, shards=1) for _ in range(shards)])
+    # explicit ids (== docstore ids) so chunks can be added and removed in place
+    spec = "IDMap2," + index_factory_string(dim, kind, train_size)
+    index = faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+    set_search_params(index)
+    return index
+
+
+def requires_training(kind: Optional[str] = None) -> bool:
+    return (kind or config.VECTOR_INDEX_TYPE) in ("ivf_flat", "ivf_pq")
+
+
+def has_ids(index: faiss.Index) -> bool:
+    if isinstance(index, ShardedIndex):
+        return all(has_ids(s) for s in index.shards)
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    if isinstance(index, ShardedIndex):
+        return all(supports_remove(s) for s in index.shards)
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return not isinstance(base, faiss.IndexHNSW)
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    if isinstance(index, ShardedIndex):
+        for s in index.shards:
+            set_search_params(s, nprobe, ef_search)
+        return
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = nprobe or config.IVF_NPROBE
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search or config.HNSW_EF_SEARCH
 
 
-def build_vector_store(embeddings: List[List[float]], texts: List[str]) -> VectorStore:
+def train_index(index: faiss.Index, embeddings: List[List[float]]):
+    embs = np.array(embeddings).astype('float32')
+    faiss.normalize_L2(embs)
+    if len(embs) > config.INDEX_TRAIN_SIZE:
+        rng = np.random.default_rng(0)
+        embs = embs[rng.choice(len(embs), config.INDEX_TRAIN_SIZE, replace=False)]
+    index.train(embs)
+
+
+def add_embeddings(
+    vs: VectorStore,
+    embeddings: List[List[float]],
+    texts: List[str],
+    metadatas: Optional[List[dict]] = None,
+) -> List[int]:
     embs = np.array(embeddings).astype('float32')
     # normalize for cosine similarity via inner product
     faiss.normalize_L2(embs)
-    index = faiss.IndexFlatIP(embs.shape[1])
-    index.add(embs)
-    return VectorStore(index=index, embeddings=embs, texts=texts)
+    ids = vs.docs.extend(texts, metadatas)
+    vs.index.add_with_ids(embs, np.array(ids, dtype='int64'))
+    return ids
+
+
+def remove_ids(vs: VectorStore, ids: List[int]):
+    if not ids:
+        return
+    vs.index.remove_ids(np.array(ids, dtype='int64'))
+    # ids are never reused: removed chunks become tombstones in the docstore
+    vs.docs.remove(ids)
+
+
+def build_vector_store(
+    embeddings: List[List[float]],
+    texts: List[str],
+    kind: Optional[str] = None,
+    metadatas: Optional[List[dict]] = None,
+) -> VectorStore:
+    embs = np.array(embeddings).astype('float32')
+    faiss.normalize_L2(embs)
+    index = new_index(embs.shape[1], kind, train_size=min(len(embs), config.INDEX_TRAIN_SIZE))
+    if not index.is_trained:
+        train_index(index, embs)
+    vs = VectorStore(index=index, embeddings=embs, docs=DocStore())
+    add_embeddings(vs, embs, texts, metadatas)
+    return vs
+
+
+def replace_file(path: str, write):
+    # write next to the target and rename so readers never see a partial file
+    tmp = f"{path}.tmp{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_version(version: str, path: str):
+    with open(path, "w") as f:
+        f.write(version)
+
+
+def _write_json(data, path: str):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def shard_path(path: str, i: int) -> str:
+    return f"{path}.shard{i}.faiss"
+
+
+def store_exists(path: str) -> bool:
+    return os.path.exists(path + ".current") or os.path.exists(path + ".faiss") or os.path.exists(path + ".shards")
 
 
-def save_vector_store(vs: VectorStore, path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    faiss.write_index(vs.index, path + ".faiss")
-    with open(path + ".txts", "w", encoding="utf-8") as f:
-        for t in vs.texts:
-            f.write(t.replace("
-", " ") + "
-")
+def is_sharded(path: str) -> bool:
+    return os.path.exists(published(path)[0] + ".shards")
 
 
-def load_vector_store(path: str) -> VectorStore:
-    index = faiss.read_index(path + ".faiss")
-    with open(path + ".txts", "r", encoding="utf-8") as f:
-        texts = [line.strip() for line in f]
+def save_vector_store(vs: VectorStore, path: str, version: Optional[str] = None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if isinstance(vs.index, ShardedIndex):
+        for i, shard in enumerate(vs.index.shards):
+            replace_file(shard_path(path, i), lambda p, shard=shard: faiss.write_index(shard, p))
+        replace_file(path + ".shards", lambda p: _write_json({"shards": len(vs.index.shards)}, p))
+    else:
+        replace_file(path + ".faiss", lambda p: faiss.write_index(vs.index, p))
+        if os.path.exists(path + ".shards"):
+            # an unsharded rebuild replaces an earlier sharded store
+            os.remove(path + ".shards")
+    vs.docs.save(path)
+    # the version marker is written last: watchers only reload a complete store
+    vs.version = version or str(time.time_ns())
+    replace_file(path + ".version", lambda p: _write_version(vs.version, p))
+
+
+def version_path(path: str, version: str) -> str:
+    return os.path.join(path + ".versions", version, os.path.basename(path))
+
+
+def published(path: str) -> Tuple[str, Optional[str]]:
+    """``(files, version)`` of the store readers should use at ``path``.
+
+    Published stores live in ``<path>.versions/<version>/`` behind the
+    ``<path>.current`` pointer; stores saved in place keep their files at ``path``.
+    """
+    try:
+        with open(path + ".current", "r") as f:
+            version = f.read().strip()
+        return version_path(path, version), version
+    except FileNotFoundError:
+        return path, _read_flat_version(path)
+
+
+def publish_vector_store(vs: VectorStore, path: str, before_publish: Optional[Callable[[str], None]] = None) -> str:
+    """Write ``vs`` as a new version of the store at ``path`` and switch readers to it.
+
+    The version is written to its own directory, ``before_publish(files)`` may
+    add files to it (e.g. the ingest manifest), and only then is the
+    ``.current`` pointer replaced, so readers see the old or the new store,
+    never a mix of both. Versions older than the last ``INGEST_KEEP_VERSIONS``
+    are deleted.
+    """
+    version = str(time.time_ns())
+    files = version_path(path, version)
+    save_vector_store(vs, files, version)
+    if before_publish is not None:
+        before_publish(files)
+    replace_file(path + ".current", lambda p: _write_version(version, p))
+    prune_versions(path, config.INGEST_KEEP_VERSIONS)
+    return version
+
+
+def prune_versions(path: str, keep: int):
+    root = path + ".versions"
+    try:
+        versions = sorted((v for v in os.listdir(root) if v.isdigit()), key=int)
+    except FileNotFoundError:
+        return
+    current = published(path)[1]
+    for v in versions[:-max(keep, 1)]:
+        if v != current:
+            # readers holding a memory-mapped old version keep their open files
+            shutil.rmtree(os.path.join(root, v), ignore_errors=True)
+
+
+def read_version(path: str) -> Optional[str]:
+    return published(path)[1]
+
+
+def _read_flat_version(path: str) -> Optional[str]:
+    try:
+        with open(path + ".version", "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    # indexes written before version markers existed: fall back to mtime
+    for suffix in (".shards", ".faiss"):
+        try:
+            return str(os.stat(path + suffix).st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return None
+
+
+def load_vector_store(path: str, mmap: bool = False) -> VectorStore:
+    with span("load"):
+        return _load_vector_store(path, mmap)
+
+
+def _load_vector_store(path: str, mmap: bool) -> VectorStore:
+    path, version = published(path)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    if os.path.exists(path + ".shards"):
+        with open(path + ".shards", "r") as f:
+            n = json.load(f)["shards"]
+        # memory-mapped shards are shared by every worker through the page cache
+        index = ShardedIndex([faiss.read_index(shard_path(path, i), flags) for i in range(n)])
+    else:
+        index = faiss.read_index(path + ".faiss", flags)
+    # search-time knobs are not persisted with the index
+    set_search_params(index)
+    if DocStore.exists(path):
+        docs = DocStore(path)
+    else:
+        # stores written before the docstore kept one text per line in .txts
+        docs = DocStore()
+        with open(path + ".txts", "r", encoding="utf-8") as f:
+            docs.extend([line.strip() for line in f])
     # embeddings are not required at runtime for queries
-    return VectorStore(index=index, embeddings=None, texts=texts)
+    return VectorStore(index=index, embeddings=None, docs=docs, version=version)
+
+
+class VectorStoreManager:
+    """Process-wide resident vector store.
 
+    The index is loaded once and re-checked at most every ``check_interval``
+    seconds. When a new version is published, one caller loads it while the
+    others keep serving the current store, and the swap is a single reference
+    assignment, so in-flight queries finish on the store they started with.
+    Sharded stores are always memory-mapped, whatever ``mmap`` says.
+    """
 
-def query(vs: VectorStore, query_vec: List[float], k: int = 4) -> List[Tuple[float, str]]:
-    import numpy as np
-    q = np.array([query_vec]).astype('float32')
+    def __init__(self, path: str, mmap: bool = False, check_interval: float = 1.0):
+        self.path = path
+        self.mmap = mmap
+        self.check_interval = check_interval
+        self._vs: Optional[VectorStore] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> VectorStore:
+        vs = self._vs
+        if vs is not None and time.monotonic() < self._next_check:
+            return vs
+        if vs is None:
+            with self._lock:
+                if self._vs is None:
+                    self._refresh()
+        elif self._lock.acquire(blocking=False):
+            # only one caller reloads; the rest keep serving the current store
+            try:
+                self._refresh()
+            finally:
+                self._lock.release()
+        return self._vs
+
+    def reload(self) -> VectorStore:
+        with self._lock:
+            self._next_check = 0.0
+            self._refresh()
+        return self._vs
+
+    def _refresh(self):
+        self._next_check = time.monotonic() + self.check_interval
+        version = read_version(self.path)
+        if version is None:
+            if self._vs is None:
+                raise FileNotFoundError(f"Vector store not found: {self.path}")
+            return
+        if self._vs is None or version != self._vs.version:
+            self._vs = load_vector_store(self.path, mmap=self.mmap or is_sharded(self.path))
+
+
+def query(vs: VectorStore, query_vec: List[float], k: int = 4) -> List[Hit]:
+    return query_batch(vs, [query_vec], k)[0]
+
+
+def query_batch(vs: VectorStore, query_vecs: List[List[float]], k: int = 4) -> List[List[Hit]]:
+    """Top-``k`` hits for each query vector from a single index search."""
+    q = np.array(query_vecs).astype('float32')
     faiss.normalize_L2(q)
-    D, I = vs.index.search(q, k)
-    out = []
-    for score, idx in zip(D[0], I[0]):
-        if idx == -1:
-            continue
-        out.append((float(score), vs.texts[idx]))
-    return out
+    with span("search", queries=len(q)):
+        D, I = vs.index.search(q, k)
+        results = []
+        for scores, ids in zip(D, I):
+            out = []
+            for score, idx in zip(scores, ids):
+                if idx == -1:
+                    continue
+                # only the top-k chunks are read from the memory-mapped docstore
+                doc = vs.docs.get(int(idx))
+                if doc is None:
+                    continue
+                out.append(Hit(id=doc.id, score=float(score), text=doc.text, metadata=doc.metadata))
+            results.append(out)
+    return results
 
 
-def compose_rag_answer(question: str, contexts: List[str], client: LLMClient) -> str:
+def rag_messages(question: str, contexts: List[str]) -> List[dict]:
     system = (
-        "You are a retrieval-augmented assistant. Answer ONLY using the provided context.
-"
-        "If the answer is not present in the context, say 'I don't know based on the documents.'
-"
+        "You are a retrieval-augmented assistant. Answer ONLY using the provided context.\n"
+        "If the answer is not present in the context, say 'I don't know based on the documents.'\n"
         "Be concise."
     )
-    context_block = "
-
-".join([f"- {c}" for c in contexts])
-    messages = [
+    context_block = "\n\n".join([f"- {c}" for c in contexts])
+    return [
         {"role": "system", "content": system},
-        {"role": "user", "content": f"Context:
-{context_block}
-
-Question: {question}"},
+        {"role": "user", "content": f"Context:\n{context_block}\n\nQuestion: {question}"},
     ]
+
+
+def pack_rag_prompt(question: str, hits: List[Hit], model: str) -> Tuple["PackedContext", List[dict]]:
+    """Pack ``hits`` into ``model``'s context token budget and build the RAG prompt from what fits."""
+    # context_pack imports Hit from this module
+    from .context_pack import pack_contexts
+    with span("pack"):
+        packed = pack_contexts(hits, model)
+    with span("prompt"):
+        return packed, rag_messages(question, packed.texts)
+
+
+def _as_hits(contexts: List[Union[Hit, str]]) -> List[Hit]:
+    # plain strings (the original contexts argument) are packed in the order given
+    return [c if isinstance(c, Hit) else Hit(id=-1, score=0.0, text=c, metadata={}) for c in contexts]
+
+
+def compose_rag_answer(question: str, hits: List[Union[Hit, str]], client: LLMClient):
+    """Pack ``hits`` (best first) into the token budget and answer: ``(answer, usage, model)``."""
+    _, messages = pack_rag_prompt(question, _as_hits(hits), client.chat_model)
     out = client.chat(messages)
     return out["content"], out.get("usage", {}), out.get("model")
+
+
+async def compose_rag_answer_async(question: str, hits: List[Union[Hit, str]], client: AsyncLLMClient):
+    """``compose_rag_answer`` with the async client."""
+    _, messages = pack_rag_prompt(question, _as_hits(hits), client.chat_model)
+    return await answer_rag_prompt(messages, client)
+
+
+async def answer_rag_prompt(messages: List[dict], client: AsyncLLMClient):
+    """Answer a prompt built by ``pack_rag_prompt``: ``(answer, usage, model)``."""
+    out = await client.chat(messages)
+    return out["content"], out.get("usage", {}), out.get("model")
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WS.sub(" ", text).strip().casefold()
+
+
+def cache_key(**parts: Any) -> str:
+    """Stable hash of the request fields that determine the answer."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    return [(m["role"], normalize_text(m.get("content") or "")) for m in messages]
+
+
+@dataclass
+class _Entry:
+    value: Dict[str, Any]
+    expires: float
+    scope: str
+    vec: Optional[np.ndarray] = None
+
+
+class ResponseCache:
+    """Exact + semantic cache for chat completions.
+
+    Exact entries are looked up by ``cache_key``. When ``semantic_threshold``
+    is set, entries stored with an embedding can also be returned for a new
+    request in the same ``scope`` whose embedding has cosine similarity of at
+    least the threshold. Entries expire after ``ttl`` seconds and the least
+    recently used are evicted beyond ``max_items``. ``sync_generation`` drops a
+    namespace when whatever its answers depend on (prompt registry, vector
+    index) changes.
+    """
+
+    def __init__(self, max_items: int = 2048, ttl: float = 3600, semantic_threshold: float = 0.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._scopes: Dict[str, Dict[str, np.ndarray]] = {}
+        self._generations: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold > 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.vec is not None:
+            self._scopes.get(entry.scope, {}).pop(key, None)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_similar(self, scope: str, vec: List[float]) -> Optional[Dict[str, Any]]:
+        if not self.semantic:
+            return None
+        with self._lock:
+            candidates = self._scopes.get(scope)
+            if not candidates:
+                return None
+            # evict expired entries first, or one could hide a live runner-up
+            now = time.monotonic()
+            for key in [k for k in candidates if self._entries[k].expires < now]:
+                self._drop(key)
+            if not candidates:
+                return None
+            keys = list(candidates)
+            sims = np.stack([candidates[k] for k in keys]) @ _unit(vec)
+            best = int(np.argmax(sims))
+            if sims[best] < self.semantic_threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            return self._entries[keys[best]].value
+
+    def put(self, key: str, value: Dict[str, Any], scope: str = "", vec: Optional[List[float]] = None):
+        with self._lock:
+            self._drop(key)
+            entry = _Entry(value=value, expires=time.monotonic() + self.ttl, scope=scope)
+            if vec is not None and self.semantic:
+                entry.vec = _unit(vec)
+                self._scopes.setdefault(scope, {})[key] = entry.vec
+            self._entries[key] = entry
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+
+    def sync_generation(self, namespace: str, generation: Optional[str]):
+        """Clear every entry of ``namespace`` when its generation changes."""
+        with self._lock:
+            if self._generations.get(namespace) == generation:
+                return
+            self._generations[namespace] = generation
+            prefix = namespace + ":"
+            for key in [k for k, e in self._entries.items() if e.scope.startswith(prefix)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n else v
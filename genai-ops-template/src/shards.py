@@ -0,0 +1,96 @@
+from __future__ import annotations
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from . import config
+
+_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def shard_pool() -> ThreadPoolExecutor:
+    # one pool per process; FAISS releases the GIL, so shards search in parallel
+    global _POOL
+    if _POOL is None:
+        workers = config.VECTOR_STORE_SHARD_THREADS or max(config.VECTOR_STORE_SHARDS, 1)
+        _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faiss-shard")
+    return _POOL
+
+
+def merge_topk(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-shard ``(D, I)`` inner-product results into the global top-k."""
+    nq = results[0][0].shape[0]
+    D = np.full((nq, k), -np.inf, dtype=np.float32)
+    I = np.full((nq, k), -1, dtype=np.int64)
+    for q in range(nq):
+        candidates = (
+            (float(d), int(i))
+            for Ds, Is in results
+            for d, i in zip(Ds[q], Is[q])
+            if i != -1
+        )
+        for j, (d, i) in enumerate(heapq.nlargest(k, candidates)):
+            D[q, j], I[q, j] = d, i
+    return D, I
+
+
+class ShardedIndex:
+    """N FAISS indexes searched scatter-gather as one.
+
+    Vectors are placed by ``id % N``, so adds and removes touch one shard per
+    id. ``search`` runs every shard in the shard pool and merges the per-shard
+    top-k with a heap. Only the subset of the ``faiss.Index`` API used by
+    ``rag`` and ``ingest`` is provided.
+
+    This is single-process sharding: every shard lives in the process that
+    searches it. The API memory-maps sharded stores (see
+    ``rag.VectorStoreManager``), so the uvicorn workers of a host share one
+    copy of the shard files through the OS page cache instead of each
+    holding all of them in RAM.
+    """
+
+    def __init__(self, shards: List[faiss.Index]):
+        if not shards:
+            raise ValueError("ShardedIndex needs at least one shard")
+        self.shards = shards
+        self.d = shards[0].d
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.shards)
+
+    @property
+    def is_trained(self) -> bool:
+        return all(s.is_trained for s in self.shards)
+
+    def train(self, x: np.ndarray):
+        if self.ntotal:
+            raise RuntimeError("cannot train a sharded index that already holds vectors")
+        # every shard shares the same trained quantizer
+        self.shards[0].train(x)
+        self.shards[1:] = [faiss.clone_index(self.shards[0]) for _ in self.shards[1:]]
+
+    def _route(self, ids: np.ndarray) -> List[np.ndarray]:
+        owner = ids % len(self.shards)
+        return [np.flatnonzero(owner == s) for s in range(len(self.shards))]
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        for shard, rows in zip(self.shards, self._route(ids)):
+            if len(rows):
+                shard.add_with_ids(x[rows], ids[rows])
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        removed = 0
+        for shard, rows in zip(self.shards, self._route(ids)):
+            if len(rows):
+                removed += shard.remove_ids(ids[rows])
+        return removed
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self.shards) == 1:
+            return self.shards[0].search(x, k)
+        results = list(shard_pool().map(lambda s: s.search(x, k), self.shards))
+        return merge_topk(results, k)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import config
+from .metrics import STAGE_LATENCY
+
+# scrape and probe endpoints are not traced
+UNTRACED = {"/metrics", "/healthz"}
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    route: str
+    # only collected when an exporter is configured
+    spans: Optional[List[Dict[str, Any]]] = field(default=None)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("genai_trace", default=None)
+
+
+class JsonlExporter:
+    """Appends one JSON object per span to a file, written when the trace ends."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(s, separators=(",", ":")) + "\n" for s in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+exporter: Optional[JsonlExporter] = JsonlExporter(config.TRACE_EXPORT_PATH) if config.TRACE_EXPORT_PATH else None
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def trace_id_from(traceparent: Optional[str]) -> str:
+    """Reuse the caller's W3C trace id when one is sent, else start a new one."""
+    m = _TRACEPARENT.match(traceparent or "")
+    return m.group(1) if m else uuid.uuid4().hex
+
+
+@contextmanager
+def start_trace(route: str, trace_id: Optional[str] = None) -> Iterator[Trace]:
+    trace = Trace(trace_id=trace_id or uuid.uuid4().hex, route=route, spans=[] if exporter else None)
+    token = _current.set(trace)
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        if trace.spans is not None:
+            trace.spans.append(_record(trace, "request", start_ns, time.perf_counter() - start))
+            exporter.export(trace.spans)
+
+
+def _record(trace: Trace, stage: str, start_ns: int, seconds: float, **attrs) -> Dict[str, Any]:
+    return {
+        "trace_id": trace.trace_id, "route": trace.route, "stage": stage,
+        "start_ns": start_ns, "duration_ms": seconds * 1e3, **attrs,
+    }
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[None]:
+    """Time a stage of the current request.
+
+    Observes ``genai_stage_seconds{route, stage}`` with the trace id as an
+    exemplar and, when exporting, records the span. Outside a request (CLI
+    ingestion, evals) the route label is ``none``.
+    """
+    trace = _current.get()
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if trace is None:
+            STAGE_LATENCY.labels(route="none", stage=stage).observe(seconds)
+        else:
+            STAGE_LATENCY.labels(route=trace.route, stage=stage).observe(seconds, exemplar={"trace_id": trace.trace_id})
+            if trace.spans is not None:
+                trace.spans.append(_record(trace, stage, start_ns, seconds, **attrs))
+
+
+class TraceMiddleware:
+    """ASGI middleware that opens a trace per HTTP request.
+
+    Being plain ASGI (not ``BaseHTTPMiddleware``), the trace stays current
+    until a streamed body has been fully sent. The trace id is returned in
+    the ``x-trace-id`` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNTRACED:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace_id = trace_id_from(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode("ascii"))]
+            await send(message)
+
+        with start_trace(scope["path"], trace_id):
+            await self.app(scope, receive, send_with_id)
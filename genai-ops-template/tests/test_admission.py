@@ -0,0 +1,86 @@
+import math
+
+import pytest
+
+from src.admission import AdmissionController, AdmissionRejected, TokenBucket, fit_messages, message_tokens
+
+MODEL = "gpt-4o-mini"
+
+
+def test_token_bucket_delay_refill_and_overdraw():
+    bucket = TokenBucket(rate=10, capacity=20)
+    now = bucket.updated
+    assert bucket.delay(20, now) == 0
+    assert math.isinf(bucket.delay(21, now))
+    bucket.put(-25)
+    assert bucket.delay(5, now) == pytest.approx(1.0, abs=0.05)
+    assert bucket.delay(5, now + 1.0) == pytest.approx(0.0, abs=0.05)
+    bucket.put(100)
+    assert bucket.tokens == 20
+
+
+def test_admit_charges_nothing_when_rejected():
+    ctl = AdmissionController(client_tpm=600, global_tpm=60000)
+    ctl.admit("r", "a", 500)
+    with pytest.raises(AdmissionRejected) as e:
+        ctl.admit("r", "a", 200)
+    assert e.value.reason == "client_tpm" and e.value.retry_after > 0
+    # the rejected call did not touch the global bucket
+    assert ctl._global.tpm.tokens == pytest.approx(60000 - 500, abs=5)
+    with pytest.raises(AdmissionRejected) as e:
+        ctl.admit("r", "b", 601)
+    assert e.value.retry_after is None
+
+
+def test_settle_refunds_or_charges_the_difference():
+    ctl = AdmissionController(client_tpm=600)
+    ticket = ctl.admit("r", "a", 500)
+    ctl.settle(ticket, 100)
+    assert ticket.tokens == 100
+    ctl.admit("r", "a", 400)
+    ctl.settle(ticket, 300)
+    with pytest.raises(AdmissionRejected):
+        ctl.admit("r", "a", 100)
+    ctl.settle(None, 10)
+
+
+def test_settle_on_error_refunds_the_whole_reservation():
+    ctl = AdmissionController(client_tpm=600)
+    ticket = ctl.admit("r", "a", 600)
+    with pytest.raises(RuntimeError):
+        with ctl.settle_on_error(ticket):
+            raise RuntimeError("provider down")
+    assert ticket.tokens == 0
+    ticket = ctl.admit("r", "a", 600)
+    with ctl.settle_on_error(ticket):
+        pass
+    assert ticket.tokens == 600
+
+
+def _conversation(turns: int):
+    messages = [{"role": "system", "content": "be brief"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "word " * 50})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "word " * 50})
+    return messages
+
+
+def test_fit_messages_drops_the_oldest_turns_first():
+    messages = _conversation(5)
+    _, total = fit_messages("r", messages, 0, MODEL)
+    fitted, used = fit_messages("r", messages, total - 1, MODEL)
+    assert used <= total - 1
+    assert fitted[0] == messages[0]
+    assert fitted[1:] == messages[2:]
+    kept, _ = fit_messages("r", messages, total, MODEL)
+    assert kept == messages
+
+
+def test_fit_messages_rejects_when_the_last_message_does_not_fit():
+    messages = _conversation(2)
+    budget = message_tokens(messages[0]["content"], MODEL) + message_tokens(messages[-1]["content"], MODEL)
+    fitted, _ = fit_messages("r", messages, budget + 3, MODEL)
+    assert fitted == [messages[0], messages[-1]]
+    with pytest.raises(AdmissionRejected) as e:
+        fit_messages("r", messages, budget, MODEL)
+    assert e.value.reason == "too_large" and e.value.retry_after is None
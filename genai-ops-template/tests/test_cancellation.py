@@ -0,0 +1,130 @@
+import asyncio
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src import config  # noqa: E402
+from src.batching import EmbeddingBatcher  # noqa: E402
+from src.llm_client import AsyncLLMClient, LLMOverloadedError, provider_limiter  # noqa: E402
+
+SLOTS = 2
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    # a fresh provider name gets its own limiter: SLOTS slots and no wait queue
+    monkeypatch.setattr(config, "LLM_MAX_CONCURRENCY", SLOTS)
+    monkeypatch.setattr(config, "LLM_MAX_QUEUE", 0)
+    monkeypatch.setattr(config, "LLM_QUEUE_TIMEOUT", 1.0)
+    return f"test-{uuid.uuid4().hex}"
+
+
+def make_client(provider, create):
+    client = AsyncLLMClient()
+    client.provider = provider
+    client.client.chat.completions.create = create
+    return client
+
+
+async def free_slots(provider):
+    """Slots that can be taken right now; with no queue a leaked slot fails fast."""
+    limiter = provider_limiter(provider)
+    taken = 0
+    try:
+        for _ in range(SLOTS + 1):
+            await limiter.acquire()
+            taken += 1
+    except LLMOverloadedError:
+        pass
+    for _ in range(taken):
+        limiter.release()
+    return taken
+
+
+class SlowStream:
+    def __init__(self):
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0.001)
+        choice = SimpleNamespace(delta=SimpleNamespace(content="tok"), finish_reason=None)
+        return SimpleNamespace(usage=None, choices=[choice])
+
+    async def close(self):
+        self.closed = True
+
+
+def test_cancelled_calls_release_provider_slots(provider):
+    async def slow(**kwargs):
+        await asyncio.sleep(10)
+
+    async def main():
+        client = make_client(provider, slow)
+        try:
+            for _ in range(SLOTS + 1):
+                task = asyncio.ensure_future(client.chat([{"role": "user", "content": "hi"}]))
+                await asyncio.sleep(0.01)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            return await free_slots(provider)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == SLOTS
+
+
+def test_abandoned_and_cancelled_streams_release_provider_slots(provider):
+    streams = []
+
+    async def open_stream(**kwargs):
+        streams.append(SlowStream())
+        return streams[-1]
+
+    async def main():
+        client = make_client(provider, open_stream)
+        messages = [{"role": "user", "content": "hi"}]
+        try:
+            # the consumer stops iterating early
+            for _ in range(SLOTS + 1):
+                gen = client.chat_stream(messages)
+                assert (await gen.__anext__()) == {"content": "tok"}
+                await gen.aclose()
+
+            # the consuming task is cancelled mid-stream
+            async def consume():
+                async for _ in client.chat_stream(messages):
+                    pass
+            for _ in range(SLOTS + 1):
+                task = asyncio.ensure_future(consume())
+                await asyncio.sleep(0.01)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            return await free_slots(provider)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(main()) == SLOTS
+    assert len(streams) == 2 * (SLOTS + 1) and all(s.closed for s in streams)
+
+
+def test_cancelled_flush_does_not_strand_callers():
+    async def main():
+        async def slow(texts):
+            await asyncio.sleep(10)
+
+        batcher = EmbeddingBatcher(slow, max_batch_size=2, max_wait_ms=0)
+        caller = asyncio.ensure_future(batcher.embed(["a", "b"]))
+        await asyncio.sleep(0.01)
+        for task in list(batcher._tasks):
+            task.cancel()
+        done, _ = await asyncio.wait([caller], timeout=1)
+        return caller in done and caller.cancelled()
+
+    assert asyncio.run(main())
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.dedup import MinHasher, NearDuplicates, lsh_bands, minhasher, shingle_hashes
+
+BASE = " ".join(f"token{i}" for i in range(200))
+
+
+def test_signatures_are_stable_across_instances():
+    # CRC32 shingles and a seeded hash family: ingest workers must agree
+    assert np.array_equal(MinHasher(64, 5).signature(BASE), MinHasher(64, 5).signature(BASE))
+    assert minhasher(64, 5) is minhasher(64, 5)
+
+
+def test_shingles_ignore_case_and_punctuation():
+    a, b = shingle_hashes("Hello, World again", 2), shingle_hashes("hello world AGAIN", 2)
+    assert np.array_equal(a, b)
+    # text shorter than a shingle still hashes
+    assert len(shingle_hashes("one two", 5)) == 1
+
+
+def test_signature_agreement_estimates_jaccard():
+    hasher = MinHasher(256, 1)
+    a = " ".join(f"w{i}" for i in range(100))
+    b = " ".join(f"w{i}" for i in range(50, 150))  # Jaccard 50/150
+    estimate = np.mean(hasher.signature(a) == hasher.signature(b))
+    assert abs(estimate - 1 / 3) < 0.1
+
+
+def test_lsh_bands_midpoint_is_at_or_below_the_threshold():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = lsh_bands(threshold, 128)
+        assert bands * rows == 128
+        assert (1 / bands) ** (1 / rows) <= threshold
+
+
+def test_near_duplicates_finds_edits_but_not_unrelated_text():
+    hasher = MinHasher(128, 5)
+    near = NearDuplicates(0.8, 128)
+    slot = near.add(hasher.signature(BASE), id=7)
+    edited = BASE.replace("token100", "changed")
+    assert near.find(hasher.signature(edited)) == slot
+    assert near.find(hasher.signature(" ".join(f"other{i}" for i in range(200)))) is None
+
+
+def test_save_and_load_keep_only_live_ids(tmp_path):
+    hasher = MinHasher(128, 5)
+    near = NearDuplicates(0.8, 128)
+    texts = [BASE, " ".join(f"other{i}" for i in range(200))]
+    for i, text in enumerate(texts):
+        near.add(hasher.signature(text), id=i)
+    near.add(hasher.signature("never stored"))  # no docstore id yet: not saved
+    path = str(tmp_path / "sigs.npz")
+    near.save(path)
+
+    loaded = NearDuplicates(0.8, 128)
+    loaded.load(path, keep={1})
+    assert loaded.ids == [1]
+    assert loaded.find(hasher.signature(texts[0])) is None
+    assert loaded.ids[loaded.find(hasher.signature(texts[1]))] == 1
+    NearDuplicates(0.8, 128).load(str(tmp_path / "missing.npz"), keep={0})
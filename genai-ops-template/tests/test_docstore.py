@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from src.docstore import DocStore
+
+
+def test_round_trip_with_tombstones_and_append_after_delete(tmp_path):
+    path = str(tmp_path / "store")
+    docs = DocStore()
+    assert docs.extend(["alpha", "béta ✓", ""], [{"source": "a.txt"}, None, {"empty": True}]) == [0, 1, 2]
+    docs.save(path)
+
+    docs = DocStore(path)
+    assert len(docs) == 3
+    assert docs.get(0).text == "alpha" and docs.get(0).metadata == {"source": "a.txt"}
+    assert docs.get(1).text == "béta ✓" and docs.get(1).metadata == {}
+    assert docs.get(2).text == "" and docs.get(2).metadata == {"empty": True}
+    assert docs.get(3) is None and docs.get(-1) is None
+
+    docs.remove([0])
+    # ids are never reused: new chunks go after the tombstone
+    assert docs.add("gamma", {"n": 3}) == 3
+    assert docs.get(0) is None
+    docs.save(path)
+
+    docs = DocStore(path)
+    assert len(docs) == 4
+    assert docs.get(0) is None and docs.text(0) == ""
+    assert [docs.text(i) for i in (1, 3)] == ["béta ✓", "gamma"]
+    assert docs.get(3).metadata == {"n": 3}
+
+
+def test_save_to_a_new_path_shares_the_payload(tmp_path):
+    old, new = str(tmp_path / "v1" / "store"), str(tmp_path / "v2" / "store")
+    os.makedirs(os.path.dirname(old))
+    os.makedirs(os.path.dirname(new))
+    docs = DocStore()
+    docs.extend(["one", "two"])
+    docs.save(old)
+
+    docs = DocStore(old)
+    docs.remove([1])
+    docs.add("three")
+    docs.save(new)
+    assert os.path.samefile(old + ".docs", new + ".docs")
+
+    # the previous version still reads its own rows, tombstone-free
+    previous = DocStore(old)
+    assert len(previous) == 2 and previous.text(1) == "two"
+    current = DocStore(new)
+    assert [current.text(i) for i in range(3)] == ["one", "", "three"]
+
+
+def test_save_refuses_a_payload_changed_by_another_writer(tmp_path):
+    path = str(tmp_path / "store")
+    docs = DocStore()
+    docs.add("one")
+    docs.save(path)
+    a, b = DocStore(path), DocStore(path)
+    a.add("from a")
+    a.save(path)
+    b.add("from b")
+    with pytest.raises(RuntimeError):
+        b.save(path)
+    with pytest.raises(RuntimeError):
+        b.save(str(tmp_path / "other"))
+    assert not os.path.exists(str(tmp_path / "other.docs"))
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+
+from evals.run_evals import AnswerCache, EvalRunner, TokenBucket, finished_cases, run, summarize
+
+
+class FakeClient:
+    chat_model = "test-model"
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def chat(self, messages, temperature=0.2):
+        self.calls.append(messages)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        usage = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        if messages[0]["content"].startswith("You are an evaluator"):
+            content = json.dumps({"relevance": 4, "faithfulness": 5, "comments": "ok"})
+        else:
+            question = messages[-1]["content"]
+            if question in self.fail:
+                raise RuntimeError(f"boom: {question}")
+            content = f"answer to {question}"
+        return {"content": content, "usage": usage}
+
+
+ROWS = [{"input": f"q{i}"} for i in range(6)]
+
+
+def test_interrupted_run_resumes_only_unfinished_cases(tmp_path):
+    output = tmp_path / "chat.jsonl"
+    first = FakeClient(fail={"q2"})
+    counts = asyncio.run(run("chat", ROWS, EvalRunner(first), output, concurrency=4))
+    assert counts == {"ok": 5, "error": 1}
+    assert len(finished_cases(output)) == 5
+    # a line cut short by a crash is ignored
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"case_id": "trunc')
+
+    second = FakeClient()
+    counts = asyncio.run(run("chat", ROWS, EvalRunner(second), output, concurrency=4))
+    assert counts == {"ok": 1, "error": 0}
+    assert [m[-1]["content"] for m in second.calls if m[0]["role"] == "user"] == ["q2"]
+    summary = summarize(output, "chat")
+    assert summary["cases"] == 6
+    assert summary["avg_relevance"] == 4 and summary["avg_faithfulness"] == 5
+
+
+def test_cases_run_concurrently(tmp_path):
+    client = FakeClient()
+    asyncio.run(run("chat", ROWS, EvalRunner(client), tmp_path / "out.jsonl", concurrency=4))
+    assert client.max_in_flight > 1
+
+
+def test_answer_cache_skips_generation_but_not_judging(tmp_path):
+    answers = AnswerCache(str(tmp_path / "answers.sqlite"))
+    runner = EvalRunner(FakeClient(), answers=answers)
+    asyncio.run(run("chat", ROWS, runner, tmp_path / "a.jsonl", concurrency=2))
+
+    # a fresh output file (e.g. a new judge prompt) re-scores from cached answers
+    reopened = AnswerCache(str(tmp_path / "answers.sqlite"))
+    client = FakeClient()
+    runner = EvalRunner(client, answers=reopened)
+    asyncio.run(run("chat", ROWS, runner, tmp_path / "b.jsonl", concurrency=2))
+    assert all(m[0]["content"].startswith("You are an evaluator") for m in client.calls)
+    assert len(client.calls) == len(ROWS)
+    assert all(r["answer_cached"] for r in summarize(tmp_path / "b.jsonl", "chat")["rows"])
+
+
+def test_token_bucket_waits_for_refill_after_overspend():
+    async def main():
+        bucket = TokenBucket(60_000)  # 1000 tokens/s
+        await bucket.acquire(60_000)
+        # the call used more than reserved: the balance goes negative
+        bucket.adjust(100)
+        start = time.monotonic()
+        await bucket.acquire(100)
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.15
+
+
+def test_token_bucket_caps_oversized_requests_at_capacity():
+    async def main():
+        bucket = TokenBucket(600)
+        await asyncio.wait_for(bucket.acquire(10_000), timeout=1)
+        return bucket.tokens
+
+    assert asyncio.run(main()) < 1
@@ -0,0 +1,28 @@
+import os
+
+from src.guards import GuardEngine, basic_input_guard
+
+RULES = os.path.join(os.path.dirname(__file__), "..", "src", "guard_rules.yaml")
+
+
+def engine(**kwargs) -> GuardEngine:
+    return GuardEngine.from_yaml(RULES, **kwargs)
+
+
+def test_block_keyword_inside_email_or_url_still_blocks():
+    for text in ("mypassword@corp.com", "reset_password@corp.com", "see https://corp.com/reset_password?u=1"):
+        result = engine(redact=True).scan([text])
+        assert result.blocked, text
+        assert "password" in {m.rule for m in result.matches if m.action == "block"}
+
+
+def test_redaction_still_applies_next_to_block_matches():
+    result = engine(redact=True).scan(["mail a@b.com", "my password"])
+    assert result.issues == ["contains_sensitive_marker"]
+    assert result.redacted[0] == "mail [REDACTED:email]"
+
+
+def test_matches_baseline_guard_on_markers():
+    # substrings the baseline BANNED list flagged are still flagged
+    for text in ("xssn", "classnames", "SSN: 1", "Credit Card", "PASSWORD", "hello there"):
+        assert engine().scan([text]).blocked == bool(basic_input_guard(text)), text
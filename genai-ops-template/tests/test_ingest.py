@@ -0,0 +1,121 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src import ingest, rag
+
+
+class FakeEmbedder:
+    embed_model = "text-embedding-3-small"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest()[:16], dtype=np.uint8).astype(float).tolist()
+                for t in texts]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # a thread pool stands in for the spawned process pool; counts the jobs using it
+    executor = ThreadPoolExecutor(max_workers=2)
+    used = []
+    monkeypatch.setattr(ingest, "ingest_pool", lambda: used.append(1) or executor)
+    yield used
+    executor.shutdown()
+
+
+def write_docs(root, n=6, words=300):
+    root.mkdir(exist_ok=True)
+    for i in range(n):
+        (root / f"doc{i}.txt").write_text(" ".join(f"d{i}w{j}" for j in range(words)), encoding="utf-8")
+
+
+def run(tmp_path, client=None, **kwargs):
+    kwargs.setdefault("dedup_threshold", 0)
+    return ingest.ingest_documents(
+        str(tmp_path / "docs"), str(tmp_path / "index" / "faiss"), client or FakeEmbedder(),
+        chunk_size=500, chunk_overlap=0, **kwargs,
+    )
+
+
+def test_unchanged_reingest_skips_the_process_pool(tmp_path, pool):
+    write_docs(tmp_path / "docs")
+    run(tmp_path)
+    assert len(pool) == 1
+    client = FakeEmbedder()
+    report = run(tmp_path, client)
+    assert report["docs_embedded"] == 0 and client.calls == 0
+    assert len(pool) == 1
+
+
+def test_chunk_text_windows_cover_the_text_on_word_boundaries():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = list(ingest.chunk_text(text, 100, overlap=20))
+    assert all(len(c) <= 100 for _, c in chunks)
+    assert all(text[offset:offset + len(c)] == c for offset, c in chunks)
+    # every chunk starts and ends on whole words
+    words = set(text.split())
+    assert all(set(c.split()) <= words for _, c in chunks)
+    assert chunks[-1][1].endswith("word199")
+
+
+def test_incremental_ingest_handles_unchanged_changed_and_removed_files(tmp_path, pool):
+    docs = tmp_path / "docs"
+    write_docs(docs, n=4)
+    first = run(tmp_path)
+    assert first["docs_embedded"] == 4 and first["chunks_removed"] == 0
+    manifest = ingest.load_manifest(rag.published(str(tmp_path / "index" / "faiss"))[0])
+    old_ids = {rel: f["ids"] for rel, f in manifest["files"].items()}
+
+    (docs / "doc1.txt").write_text("rewritten " * 30, encoding="utf-8")
+    (docs / "doc3.txt").unlink()
+    client = FakeEmbedder()
+    report = run(tmp_path, client)
+    assert report["docs_embedded"] == 1
+    assert report["docs_unchanged"] == 2
+    assert report["docs_removed"] == 1
+    assert report["chunks_removed"] == len(old_ids["doc1.txt"]) + len(old_ids["doc3.txt"])
+    assert report["chunks_total"] == first["chunks_total"] - report["chunks_removed"] + report["chunks_added"]
+
+    files_path = rag.published(str(tmp_path / "index" / "faiss"))[0]
+    files = ingest.load_manifest(files_path)["files"]
+    assert sorted(files) == ["doc0.txt", "doc1.txt", "doc2.txt"]
+    # unchanged files keep their chunk ids; removed chunks are gone from the store
+    assert files["doc0.txt"]["ids"] == old_ids["doc0.txt"]
+    vs = rag.load_vector_store(str(tmp_path / "index" / "faiss"))
+    assert all(vs.docs.get(i) is None for i in old_ids["doc3.txt"])
+    assert vs.docs.get(files["doc1.txt"]["ids"][0]).text.startswith("rewritten")
+
+
+def test_full_rebuild_ignores_the_manifest(tmp_path, pool):
+    write_docs(tmp_path / "docs", n=2)
+    first = run(tmp_path)
+    report = run(tmp_path, full=True)
+    assert report["docs_embedded"] == 2
+    assert report["chunks_total"] == first["chunks_total"]
+
+
+def test_near_duplicates_are_skipped_and_redone_when_their_original_goes(tmp_path, pool):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    text = " ".join(f"w{j}" for j in range(80))
+    (docs / "a.txt").write_text(text, encoding="utf-8")
+    (docs / "b.txt").write_text(text.replace("w40", "edited"), encoding="utf-8")
+    first = run(tmp_path, dedup_threshold=0.7)
+    assert first["chunks_duplicate"] == 1 and first["chunks_total"] == 1
+    files_path = rag.published(str(tmp_path / "index" / "faiss"))[0]
+    files = ingest.load_manifest(files_path)["files"]
+    assert files["b.txt"]["ids"] == [] and files["b.txt"]["duplicates"] == files["a.txt"]["ids"]
+
+    # the chunk serving b.txt is removed with a.txt, so b.txt is re-chunked and embedded
+    (docs / "a.txt").unlink()
+    report = run(tmp_path, dedup_threshold=0.7)
+    assert report["docs_embedded"] == 1 and report["chunks_total"] == 1
+    vs = rag.load_vector_store(str(tmp_path / "index" / "faiss"))
+    files = ingest.load_manifest(rag.published(str(tmp_path / "index" / "faiss"))[0])["files"]
+    assert "edited" in vs.docs.get(files["b.txt"]["ids"][0]).text
@@ -0,0 +1,47 @@
+import pytest
+
+from src import jobs
+from src.jobs import IngestJobManager
+
+
+@pytest.fixture
+def fake_ingest(monkeypatch):
+    monkeypatch.setattr(jobs, "ingest_documents", lambda *args, **kwargs: {"chunks_added": 3})
+
+
+def test_failing_callback_does_not_fail_a_published_job(fake_ingest):
+    def reload(job):
+        raise RuntimeError("reload failed")
+
+    manager = IngestJobManager(client=None, on_success=reload)
+    job = manager.submit("docs", "index")
+    job.future.result(timeout=5)
+    assert job.state == "succeeded"
+    assert job.report == {"chunks_added": 3}
+    assert job.error is None
+    assert job.to_dict()["reload_error"] == "RuntimeError: reload failed"
+    manager.shutdown()
+
+
+def test_callback_sees_the_job_succeeded(fake_ingest):
+    seen = []
+    manager = IngestJobManager(client=None, on_success=lambda job: seen.append(job.state))
+    job = manager.submit("docs", "index")
+    job.future.result(timeout=5)
+    assert seen == ["succeeded"]
+    assert job.reload_error is None
+    manager.shutdown()
+
+
+def test_failed_ingest_skips_the_callback(monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("No .txt files found")
+
+    monkeypatch.setattr(jobs, "ingest_documents", broken)
+    seen = []
+    manager = IngestJobManager(client=None, on_success=seen.append)
+    job = manager.submit("docs", "index")
+    job.future.result(timeout=5)
+    assert job.state == "failed" and job.error == "ValueError: No .txt files found"
+    assert seen == []
+    manager.shutdown()
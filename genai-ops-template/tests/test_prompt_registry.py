@@ -0,0 +1,101 @@
+import os
+import textwrap
+
+import pytest
+
+from src.prompt_registry import PromptRegistry, version_key
+
+
+def write_registry(path, body):
+    path.write_text(textwrap.dedent(body), encoding="utf-8")
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_version_key_orders_versions_naturally():
+    versions = ["v10", "v2", "v1", "1.10", "1.2"]
+    assert sorted(versions, key=version_key) == ["1.2", "1.10", "v1", "v2", "v10"]
+
+
+def test_latest_is_the_highest_version_unless_pinned(tmp_path):
+    path = tmp_path / "registry.yaml"
+    write_registry(path, """
+        unpinned:
+          v2: {system: two}
+          v10: {system: ten}
+        pinned:
+          latest: v2
+          v2: {system: two}
+          v10: {system: ten}
+    """)
+    registry = PromptRegistry(str(path), check_interval=-1)
+    assert registry.resolve("unpinned").version == "v10"
+    assert registry.resolve("pinned").version == "v2"
+    # an explicit version still wins over the pin
+    assert registry.system("pinned", "v10") == "ten"
+
+
+def test_pin_to_an_unknown_version_is_rejected(tmp_path):
+    path = tmp_path / "registry.yaml"
+    write_registry(path, """
+        p:
+          latest: v3
+          v1: {system: one}
+    """)
+    with pytest.raises(ValueError, match="unknown version v3"):
+        PromptRegistry(str(path), check_interval=-1)
+
+
+def test_unknown_prompt_and_version_raise_key_error(tmp_path):
+    path = tmp_path / "registry.yaml"
+    write_registry(path, """
+        p:
+          v1: {system: one}
+    """)
+    registry = PromptRegistry(str(path), check_interval=-1)
+    with pytest.raises(KeyError, match="Prompt not found"):
+        registry.resolve("missing")
+    with pytest.raises(KeyError, match="p@v9"):
+        registry.resolve("p", "v9")
+
+
+def test_variables_override_defaults(tmp_path):
+    path = tmp_path / "registry.yaml"
+    write_registry(path, """
+        p:
+          v1:
+            system: "Answer in $lang about $topic."
+            variables: {lang: English}
+    """)
+    registry = PromptRegistry(str(path), check_interval=-1)
+    assert registry.system("p") == "Answer in English about $topic."
+    assert registry.system("p", variables={"topic": "faiss"}) == "Answer in English about faiss."
+    french = registry.system("p", variables={"lang": "French", "topic": "x"})
+    assert french == "Answer in French about x."
+
+
+def test_changed_file_is_reloaded_and_a_broken_one_keeps_the_snapshot(tmp_path):
+    path = tmp_path / "registry.yaml"
+    write_registry(path, """
+        p:
+          v1: {system: one}
+    """)
+    registry = PromptRegistry(str(path), check_interval=0)
+    version = registry.version
+
+    write_registry(path, """
+        p:
+          v1: {system: one}
+          v2: {system: two}
+    """)
+    bump_mtime(path)
+    assert registry.resolve("p").version == "v2"
+    assert registry.version != version
+
+    path.write_text("p: [unclosed", encoding="utf-8")
+    bump_mtime(path)
+    assert registry.system("p") == "two"
+    assert registry.last_error is not None
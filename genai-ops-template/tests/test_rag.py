@@ -0,0 +1,68 @@
+from src import config
+from src.context_pack import pack_contexts
+from src.llm_client import count_tokens
+from src.rag import Hit, compose_rag_answer, index_factory_string
+
+
+def test_ivf_pq_needs_enough_points_per_pq_centroid():
+    needed = 39 * 2 ** config.PQ_NBITS
+    assert index_factory_string(384, "ivf_pq", needed - 1).endswith(",Flat")
+    assert ",PQ" in index_factory_string(384, "ivf_pq", needed)
+
+
+class _Client:
+    chat_model = "test-model"
+
+    def __init__(self):
+        self.messages = None
+
+    def chat(self, messages):
+        self.messages = messages
+        return {"content": "ok", "usage": {"prompt_tokens": 1}, "model": self.chat_model}
+
+
+def _hit(i: int, text: str) -> Hit:
+    return Hit(id=i, score=1.0 - i / 10, text=text, metadata={})
+
+
+def _words(prefix: str, n: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_compose_rag_answer_packs_hits_into_the_token_budget(monkeypatch):
+    first, second, third = _words("alpha", 100), _words("beta", 100), _words("gamma", 100)
+    budget = count_tokens(first, "test-model") + count_tokens(second, "test-model") + 40
+    monkeypatch.setattr(config, "CONTEXT_TOKEN_BUDGETS", {"test-model": budget})
+    monkeypatch.setattr(config, "CONTEXT_MIN_PASSAGE_TOKENS", 20)
+    hits = [_hit(0, first), _hit(1, first + " extra"), _hit(2, second), _hit(3, third)]
+    hits.append(_hit(4, _words("delta", 50)))
+    packed = pack_contexts(hits, "test-model")
+    assert packed.dropped_duplicates == 1
+    assert [h.id for h in packed.hits] == [0, 2, 3]
+    assert packed.tokens <= budget
+    # the first passage that overflows is truncated to what is left, the rest dropped
+    assert packed.hits[2].text != third and third.startswith(packed.hits[2].text)
+    assert packed.dropped_budget == 1
+
+    client = _Client()
+    answer, usage, model = compose_rag_answer("what?", hits, client)
+    assert (answer, model) == ("ok", "test-model")
+    prompt = client.messages[-1]["content"]
+    assert prompt.count(first) == 1 and second in prompt and "delta" not in prompt
+    assert prompt.endswith("Question: what?")
+
+
+def test_compose_rag_answer_accepts_plain_context_strings(monkeypatch):
+    monkeypatch.setattr(config, "CONTEXT_TOKEN_BUDGETS", {"test-model": 1000})
+    client = _Client()
+    compose_rag_answer("q", ["one fact", "another fact"], client)
+    assert "- one fact\n\n- another fact" in client.messages[-1]["content"]
+
+
+def test_pq_subquantizers_keep_at_least_four_dims_each(monkeypatch):
+    monkeypatch.setattr(config, "PQ_M", 64)
+    enough = 39 * 2 ** config.PQ_NBITS
+    for dim, m in ((64, 16), (384, 64), (1536, 64), (100, 25), (90, 18), (6, 1)):
+        spec = index_factory_string(dim, "ivf_pq", enough)
+        assert spec.split(",")[1] == f"PQ{m}x{config.PQ_NBITS}", dim
+        assert dim % m == 0 and (dim // m >= 4 or m == 1)
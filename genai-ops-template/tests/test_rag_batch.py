@@ -0,0 +1,59 @@
+import os
+
+import httpx
+import numpy as np
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src import app as api, rag  # noqa: E402
+from src.admission import AdmissionController  # noqa: E402
+from src.docstore import DocStore  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    vs = rag.VectorStore(index=rag.new_index(8, "flat", shards=1), embeddings=None, docs=DocStore())
+    texts = [f"passage {i} " + "text " * 40 for i in range(12)]
+    rag.add_embeddings(vs, rng.random((12, 8)).tolist(), texts)
+    path = str(tmp_path / "index")
+    rag.publish_vector_store(vs, path)
+
+    async def embed(texts):
+        return rng.random((len(texts), 8)).tolist()
+
+    async def chat(messages, temperature=0.2):
+        if "Question: bad?" in messages[-1]["content"]:
+            raise httpx.ReadError("connection reset")
+        usage = {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+        return {"content": "ok", "usage": usage, "model": "m"}
+
+    monkeypatch.setattr(api, "store", rag.VectorStoreManager(path))
+    monkeypatch.setattr(api, "response_cache", None)
+    monkeypatch.setattr(api.aclient, "embed", embed)
+    monkeypatch.setattr(api.aclient, "chat", chat)
+    controller = AdmissionController(client_tpm=100000)
+    admit = controller.admit
+    controller.tickets = []
+
+    def record(*args):
+        controller.tickets.append(admit(*args))
+        return controller.tickets[-1]
+
+    monkeypatch.setattr(controller, "admit", record)
+    monkeypatch.setattr(api, "admission", controller)
+    return TestClient(api.app)
+
+
+def test_batch_isolates_any_per_question_error(client):
+    r = client.post("/rag/query/batch", json={"questions": ["a?", "bad?", "c?"]})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [item["answer"] for item in results] == ["ok", None, "ok"]
+    assert results[1]["error"] == "ReadError: connection reset"
+    assert r.json()["usage"]["errors"] == 1
+    # only the two answered questions stay charged
+    assert [t.tokens for t in api.admission.tickets] == [220]
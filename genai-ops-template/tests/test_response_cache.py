@@ -0,0 +1,77 @@
+import pytest
+
+from src import response_cache
+from src.response_cache import ResponseCache, cache_key, normalize_messages, normalize_text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", c)
+    return c
+
+
+def test_expired_best_match_does_not_hide_a_live_runner_up(clock):
+    cache = ResponseCache(ttl=10, semantic_threshold=0.8)
+    cache.put("old", {"answer": "old"}, "rag:x", [1.0, 0.0])
+    clock.now += 5
+    cache.put("new", {"answer": "new"}, "rag:x", [0.9, 0.3])
+    clock.now += 6
+    assert cache.get_similar("rag:x", [1.0, 0.0]) == {"answer": "new"}
+    assert cache.get("old") is None
+
+
+def test_exact_hits_expire_after_ttl(clock):
+    cache = ResponseCache(ttl=10)
+    cache.put("k", {"answer": 1})
+    assert cache.get("k") == {"answer": 1}
+    clock.now += 11
+    assert cache.get("k") is None
+
+
+def test_cache_keys_ignore_whitespace_and_case_but_not_content():
+    def key(text):
+        return cache_key(scope="chat", messages=normalize_messages([{"role": "user", "content": text}]))
+
+    assert key("Hello   World ") == key("hello world") != key("hello there")
+    assert normalize_text("  A\n\tB ") == "a b"
+
+
+def test_semantic_hits_need_the_threshold_and_the_same_scope(clock):
+    cache = ResponseCache(semantic_threshold=0.95)
+    cache.put("k", {"answer": "x"}, "rag:a", [1.0, 0.0])
+    assert cache.get_similar("rag:a", [0.99, 0.05]) == {"answer": "x"}
+    assert cache.get_similar("rag:a", [0.5, 0.5]) is None
+    assert cache.get_similar("rag:b", [1.0, 0.0]) is None
+    assert ResponseCache().get_similar("rag:a", [1.0, 0.0]) is None
+
+
+def test_lru_eviction_drops_semantic_entries_too(clock):
+    cache = ResponseCache(max_items=2, semantic_threshold=0.9)
+    cache.put("a", {"n": "a"}, "s", [1.0, 0.0])
+    cache.put("b", {"n": "b"}, "s", [0.0, 1.0])
+    cache.get("a")
+    cache.put("c", {"n": "c"}, "s", [0.7, 0.7])
+    assert cache.get("b") is None
+    assert cache.get_similar("s", [0.0, 1.0]) is None
+    assert cache.get("a") == {"n": "a"}
+
+
+def test_a_new_generation_drops_only_its_namespace(clock):
+    cache = ResponseCache()
+    cache.sync_generation("rag", "v1")
+    cache.put("r", {"n": 1}, "rag:x")
+    cache.put("c", {"n": 2}, "chat:x")
+    cache.sync_generation("rag", "v1")
+    assert cache.get("r") == {"n": 1}
+    cache.sync_generation("rag", "v2")
+    assert cache.get("r") is None
+    assert cache.get("c") == {"n": 2}
@@ -0,0 +1,64 @@
+import numpy as np
+
+from src import rag
+from src.shards import ShardedIndex, merge_topk
+
+
+def test_merge_topk_keeps_global_best_and_skips_missing():
+    a = (np.array([[0.9, 0.5, 0.1]], dtype=np.float32), np.array([[3, 6, 9]]))
+    b = (np.array([[0.7, 0.6, -1.0]], dtype=np.float32), np.array([[4, 1, -1]]))
+    D, I = merge_topk([a, b], 4)
+    assert I.tolist() == [[3, 4, 1, 6]]
+    assert np.allclose(D, [[0.9, 0.7, 0.6, 0.5]])
+
+
+def test_merge_topk_pads_when_shards_hold_fewer_than_k():
+    D, I = merge_topk([(np.array([[0.3]], dtype=np.float32), np.array([[2]]))], 3)
+    assert I.tolist() == [[2, -1, -1]]
+    assert D[0, 1] == -np.inf
+
+
+def _vectors(n: int, d: int = 8) -> np.ndarray:
+    x = np.random.default_rng(0).random((n, d), dtype=np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_ids_are_routed_by_modulo_and_removed_from_their_shard():
+    index = rag.new_index(8, "flat", shards=3)
+    assert isinstance(index, ShardedIndex)
+    x = _vectors(30)
+    ids = np.arange(100, 130)
+    index.add_with_ids(x, ids)
+    for s, shard in enumerate(index.shards):
+        held = {int(shard.id_map.at(j)) for j in range(shard.ntotal)}
+        assert held == {int(i) for i in ids if i % 3 == s}
+
+    assert index.remove_ids(np.array([101, 104, 999])) == 2
+    assert index.ntotal == 28
+    assert index.shards[2].ntotal == 8
+    _, I = index.search(x, 1)
+    assert 101 not in I and 104 not in I
+    assert I[0, 0] == 100
+
+
+def test_sharded_search_matches_a_single_index():
+    x = _vectors(50)
+    ids = np.arange(50)
+    single, sharded = rag.new_index(8, "flat", shards=1), rag.new_index(8, "flat", shards=4)
+    single.add_with_ids(x, ids)
+    sharded.add_with_ids(x, ids)
+    assert sharded.search(x[:5], 5)[1].tolist() == single.search(x[:5], 5)[1].tolist()
+
+
+def test_served_sharded_stores_are_memory_mapped(tmp_path, monkeypatch):
+    vs = rag.VectorStore(index=rag.new_index(8, "flat", shards=2), embeddings=None, docs=rag.DocStore())
+    rag.add_embeddings(vs, _vectors(10).tolist(), [f"doc {i}" for i in range(10)])
+    path = str(tmp_path / "index")
+    rag.publish_vector_store(vs, path)
+
+    calls = []
+    load = rag.load_vector_store
+    monkeypatch.setattr(rag, "load_vector_store", lambda p, mmap=False: calls.append(mmap) or load(p, mmap))
+    served = rag.VectorStoreManager(path, mmap=False).get()
+    assert calls == [True]
+    assert served.index.ntotal == 10
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src import tracing
+from src.tracing import JsonlExporter, TraceMiddleware, span, start_trace, trace_id_from
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def stage_count(route, stage):
+    labels = {"route": route, "stage": stage}
+    return REGISTRY.get_sample_value("genai_stage_seconds_count", labels) or 0
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    path = tmp_path / "traces" / "spans.jsonl"
+    monkeypatch.setattr(tracing, "exporter", JsonlExporter(str(path)))
+
+    def read():
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    return read
+
+
+def test_trace_id_reuses_a_valid_traceparent():
+    assert trace_id_from(f"00-{TRACE_ID}-00f067aa0ba902b7-01") == TRACE_ID
+    for bad in (None, "", "garbage", f"00-{TRACE_ID.upper()}-00f067aa0ba902b7-01"):
+        new = trace_id_from(bad)
+        assert len(new) == 32 and new != TRACE_ID
+
+
+def test_span_observes_the_stage_histogram_per_route():
+    before = stage_count("/t", "retrieve"), stage_count("none", "retrieve")
+    with start_trace("/t"):
+        with span("retrieve"):
+            pass
+    with span("retrieve"):
+        pass
+    assert stage_count("/t", "retrieve") == before[0] + 1
+    assert stage_count("none", "retrieve") == before[1] + 1
+
+
+def test_spans_are_exported_when_the_trace_ends(exported):
+    with start_trace("/t", TRACE_ID) as trace:
+        with span("retrieve", k=4):
+            pass
+        with span("generate"):
+            pass
+        assert tracing.current_trace() is trace
+    assert tracing.current_trace() is None
+    spans = exported()
+    assert [s["stage"] for s in spans] == ["retrieve", "generate", "request"]
+    assert all(s["trace_id"] == TRACE_ID and s["route"] == "/t" for s in spans)
+    assert spans[0]["k"] == 4
+    assert spans[-1]["duration_ms"] >= spans[0]["duration_ms"]
+
+
+def test_no_spans_are_collected_without_an_exporter(monkeypatch):
+    monkeypatch.setattr(tracing, "exporter", None)
+    with start_trace("/t") as trace:
+        with span("retrieve"):
+            pass
+    assert trace.spans is None
+
+
+def test_middleware_returns_the_trace_id_and_skips_probes(exported):
+    async def handler(request):
+        with span("work"):
+            return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/work", handler), Route("/healthz", handler)])
+    client = TestClient(TraceMiddleware(app))
+
+    r = client.get("/work", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+    assert r.headers["x-trace-id"] == TRACE_ID
+    assert "x-trace-id" not in client.get("/healthz").headers
+    spans = exported()
+    assert [(s["route"], s["stage"]) for s in spans] == [("/work", "work"), ("/work", "request")]
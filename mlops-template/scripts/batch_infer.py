@@ -1,21 +1,310 @@
+"""Chunked, parallel batch scoring.
+
+Streams the input (CSV, Parquet or Arrow IPC/Feather) in chunks of
+``--chunk-rows`` rows. The chunks are scored in a process pool; each worker
+loads the model once, through the model manager, at the version the run
+pinned at start. Each worker writes the scored chunk to its own part file,
+which is the checkpoint: an interrupted run resumes by skipping the parts
+that already exist. A single-file output is assembled from the parts in
+input order at the end; ``--partitioned`` keeps the parts as the output. Run
+from the project root:
+
+    python -m scripts.batch_infer data/input.csv data/output_scored.parquet \\
+        --chunk-rows 100000 --workers 4
+"""
+import argparse
+import json
 import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set
+
+import numpy as np
 import pandas as pd
-import mlflow
 
-MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://127.0.0.1:5000")
-MODEL_NAME = os.getenv("MODEL_NAME", "iris-classifier")
-MODEL_STAGE = os.getenv("MODEL_STAGE", "Staging")
+from src.model_manager import LoadedModel, ModelManager
+from src.utils import predict_array
+
+_MODEL: Optional[LoadedModel] = None
+
+
+def input_format(path: str) -> str:
+    name = path.lower()
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".arrow", ".feather", ".ipc")):
+        return "arrow"
+    return "csv"
+
+
+def _rechunk(batches, chunk_rows: int, skip: int) -> Iterator[pd.DataFrame]:
+    # Arrow record batches -> DataFrames of exactly chunk_rows rows, after skipping `skip` rows
+    import pyarrow as pa
+
+    buf, rows = [], 0
+    for batch in batches:
+        if skip:
+            if batch.num_rows <= skip:
+                skip -= batch.num_rows
+                continue
+            batch, skip = batch.slice(skip), 0
+        buf.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_rows:
+            table = pa.Table.from_batches(buf)
+            yield table.slice(0, chunk_rows).to_pandas()
+            rest = table.slice(chunk_rows)
+            buf, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(buf).to_pandas()
+
+
+def read_chunks(path: str, chunk_rows: int, skip: int = 0) -> Iterator[pd.DataFrame]:
+    """Chunks of ``chunk_rows`` rows, starting at row ``skip`` (a multiple of ``chunk_rows``)."""
+    fmt = input_format(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_rows, skiprows=range(1, skip + 1))
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        pf = pq.ParquetFile(path)
+        # start reading at the row group that holds row `skip`
+        first, start = 0, 0
+        while first < pf.num_row_groups and start + pf.metadata.row_group(first).num_rows <= skip:
+            start += pf.metadata.row_group(first).num_rows
+            first += 1
+        batches = pf.iter_batches(batch_size=chunk_rows, row_groups=range(first, pf.num_row_groups))
+        yield from _rechunk(batches, chunk_rows, skip - start)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        yield from _rechunk(batches, chunk_rows, skip)
+
+
+def _init_worker(version: str, digest: str):
+    global _MODEL
+    # one model per process, and one BLAS thread each: the pool is the parallelism
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    manager = ModelManager.from_env()
+    if not manager.refresh(version):
+        raise RuntimeError(f"cannot load model {version}: {manager.last_error}")
+    # a local model file is read as it is now, whatever version was pinned
+    if manager.current.digest != digest:
+        raise RuntimeError(
+            f"model {version} changed since the run started "
+            f"(digest {manager.current.digest}, expected {digest})"
+        )
+    _MODEL = manager.current
+
+
+def _feature_columns(loaded: LoadedModel, columns) -> Optional[List[str]]:
+    # columns named as in training ("sepal length (cm)") or as in the API schema (sepal_length)
+    if loaded.fast is None:
+        return None
+    est, fields = loaded.fast
+    names = getattr(est, "feature_names_in_", None)
+    for cols in (list(names) if names is not None else None, fields):
+        if cols and set(cols) <= set(columns):
+            return cols
+    return None
+
+
+def _write(df: pd.DataFrame, path: str, fmt: str):
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def score_chunk(df: pd.DataFrame, path: str, fmt: str) -> int:
+    loaded = _MODEL
+    cols = _feature_columns(loaded, df.columns)
+    if cols is not None:
+        labels, _ = predict_array(loaded.fast[0], df[cols].to_numpy(dtype=np.float32))
+    else:
+        labels = loaded.model.predict(df)
+    df["prediction"] = labels
+    _write(df, path, fmt)
+    return len(df)
+
+
+def part_path(parts_dir: str, index: int, fmt: str) -> str:
+    return os.path.join(parts_dir, f"part-{index:06d}.{fmt}")
+
+
+def done_parts(parts_dir: str, fmt: str) -> Set[int]:
+    suffix = f".{fmt}"
+    return {
+        int(n[5:-len(suffix)]) for n in os.listdir(parts_dir)
+        if n.startswith("part-") and n.endswith(suffix)
+    }
+
+
+def _checkpoint(parts_dir: str, run: Dict, restart: bool):
+    # parts are only reused by a run over the same input, chunking and model version
+    path = os.path.join(parts_dir, "_checkpoint.json")
+    if restart and os.path.isdir(parts_dir):
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir, exist_ok=True)
+    try:
+        with open(path) as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = None
+    if previous is not None and previous != run:
+        raise SystemExit(
+            f"{parts_dir} holds parts of a different run ({previous}); "
+            "pass --restart to discard them"
+        )
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+
+
+def merge_parts(parts_dir: str, indices: List[int], output: str, fmt: str):
+    """Concatenate the parts in order into ``output`` (written to a temp file, then renamed)."""
+    tmp = output + ".tmp"
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for i in indices:
+                table = pq.read_table(part_path(parts_dir, i, fmt))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, table.schema)
+                # per-chunk type inference (e.g. int vs float) must not break the file schema
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(tmp, "wb") as out:
+            for n, i in enumerate(indices):
+                with open(part_path(parts_dir, i, fmt), "rb") as f:
+                    if n:
+                        f.readline()
+                    shutil.copyfileobj(f, out)
+    os.replace(tmp, output)
+
+
+def run(
+    input_path: str,
+    output_path: str,
+    chunk_rows: int = 100000,
+    workers: int = 0,
+    partitioned: bool = False,
+    output_format: Optional[str] = None,
+    restart: bool = False,
+    report_every: float = 10.0,
+) -> Dict:
+    fmt = output_format or ("csv" if partitioned else input_format(output_path))
+    if fmt not in ("csv", "parquet"):
+        raise SystemExit(f"unsupported output format {fmt!r}: use csv or parquet")
+    workers = workers or os.cpu_count() or 1
+
+    manager = ModelManager.from_env()
+    loaded = manager.get()
+    parts_dir = output_path if partitioned else output_path + ".parts"
+    st = os.stat(input_path)
+    _checkpoint(parts_dir, {
+        "input": os.path.abspath(input_path), "input_size": st.st_size, "input_mtime": st.st_mtime,
+        "chunk_rows": chunk_rows, "format": fmt,
+        "model_version": loaded.version, "model_digest": loaded.digest,
+    }, restart)
+    done = done_parts(parts_dir, fmt)
+    # the contiguous prefix of finished chunks is skipped without parsing it
+    first = 0
+    while first in done:
+        first += 1
+    if done:
+        print(f"resuming: {len(done)} chunks already scored")
+
+    start = last_report = time.perf_counter()
+    scored = 0
+    total = len(done)
+
+    def report(final: bool = False):
+        elapsed = time.perf_counter() - start
+        rate = scored / elapsed if elapsed > 0 else 0.0
+        print(f"{'done' if final else 'progress'}: {scored} rows scored in {elapsed:.1f}s "
+              f"({rate:,.0f} rows/s), {total} chunks")
+
+    chunks = enumerate(read_chunks(input_path, chunk_rows, first * chunk_rows), start=first)
+    if workers <= 1:
+        global _MODEL
+        _MODEL = loaded
+        for i, df in chunks:
+            if i not in done:
+                scored += score_chunk(df, part_path(parts_dir, i, fmt), fmt)
+                total += 1
+                if time.perf_counter() - last_report >= report_every:
+                    report()
+                    last_report = time.perf_counter()
+    else:
+        pool = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(loaded.version, loaded.digest),
+        )
+        with pool:
+            pending = set()
+
+            def collect(futures):
+                nonlocal scored, total, last_report
+                for fut in futures:
+                    scored += fut.result()
+                    total += 1
+                if time.perf_counter() - last_report >= report_every:
+                    report()
+                    last_report = time.perf_counter()
+
+            for i, df in chunks:
+                if i in done:
+                    continue
+                pending.add(pool.submit(score_chunk, df, part_path(parts_dir, i, fmt), fmt))
+                # bounded read-ahead: at most two chunks per worker in memory
+                if len(pending) >= 2 * workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            collect(wait(pending).done)
+
+    if not partitioned:
+        merge_parts(parts_dir, sorted(done_parts(parts_dir, fmt)), output_path, fmt)
+        shutil.rmtree(parts_dir)
+    report(final=True)
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_scored": scored, "chunks": total, "seconds": elapsed,
+        "rows_per_sec": scored / elapsed if elapsed > 0 else 0.0, "model_version": loaded.version,
+    }
 
 
-def run(input_csv: str, output_csv: str):
-    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-    model_uri = f"models:/{MODEL_NAME}/{MODEL_STAGE}"
-    model = mlflow.pyfunc.load_model(model_uri)
-    df = pd.read_csv(input_csv)
-    preds = model.predict(df)
-    df["prediction"] = preds
-    df.to_csv(output_csv, index=False)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("input", nargs="?", default="data/input.csv",
+                        help=".csv, .parquet or .arrow/.feather")
+    parser.add_argument("output", nargs="?", default="data/output_scored.csv",
+                        help="file (.csv/.parquet) or, with --partitioned, a directory")
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="scoring processes (0 = CPU count, 1 = in process)")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="keep one part file per chunk instead of one output file")
+    parser.add_argument("--format", choices=["csv", "parquet"],
+                        help="output format (default: from the output extension; "
+                             "csv when partitioned)")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard the parts of an earlier run")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="seconds between progress lines")
+    args = parser.parse_args()
+    run(args.input, args.output, args.chunk_rows, args.workers, args.partitioned, args.format,
+        args.restart, args.report_every)
 
 
 if __name__ == "__main__":
-    run("data/input.csv", "data/output_scored.csv")
+    main()
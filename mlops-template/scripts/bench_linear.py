@@ -0,0 +1,71 @@
+"""Model-call latency: sklearn pipeline vs the folded linear predictor.
+
+Trains the scaler + logistic-regression pipeline of ``src/train.py``, folds it
+with ``src.linear`` and times ``predict_proba`` + labels for batches of 1 to
+10k rows: the pipeline on a named DataFrame (as pyfunc calls it), the
+pipeline on a float32 array (the /predict fast path) and the folded
+predictor on the same array. Also reports the largest probability difference.
+Run from the project root:
+
+    python -m scripts.bench_linear --sizes 1 10 100 1000 10000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn import datasets
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.linear import LinearPredictor, fold_pipeline
+from src.utils import predict_array
+
+
+def timeit(fn, X, iters: int):
+    for _ in range(3):
+        fn(X)
+    lat = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn(X)
+        lat.append(time.perf_counter() - t0)
+    return np.array(lat) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--rows', type=int, default=200000, help='rows predicted per size (sets the call count)')
+    args = parser.parse_args()
+
+    iris = datasets.load_iris()
+    df = pd.DataFrame(iris.data, columns=iris.feature_names)
+    pipeline = Pipeline([("scaler", StandardScaler()), ("clf", LogisticRegression(max_iter=1000))]).fit(df, iris.target)
+    linear = LinearPredictor(*fold_pipeline(pipeline))
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>6} | {'path':>18} | {'p50 us':>9} | {'p99 us':>9} | {'speedup':>7} | {'max |dp|':>8}")
+    for size in args.sizes:
+        rows = iris.data[rng.integers(0, len(iris.data), size)] + rng.normal(0, 0.1, (size, 4))
+        X = rows.astype(np.float32)
+        frame = pd.DataFrame(rows, columns=iris.feature_names)
+        iters = max(20, min(2000, args.rows // size))
+        paths = {
+            "pipeline/DataFrame": (lambda _: (pipeline.predict(frame), pipeline.predict_proba(frame)), frame),
+            "pipeline/array": (lambda a: predict_array(pipeline, a), X),
+            "linear/array": (lambda a: predict_array(linear, a), X),
+        }
+        reference = pipeline.predict_proba(frame)
+        base = None
+        for name, (fn, data) in paths.items():
+            lat = timeit(fn, data, iters)
+            p50 = np.percentile(lat, 50)
+            base = base or p50
+            diff = np.abs(fn(data)[1] - reference).max()
+            print(f"{size:>6} | {name:>18} | {p50:>9.1f} | {np.percentile(lat, 99):>9.1f} | {base / p50:>6.2f}x | {diff:>8.1e}")
+
+
+if __name__ == '__main__':
+    main()
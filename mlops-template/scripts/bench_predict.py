@@ -0,0 +1,129 @@
+"""Requests/sec and latency of /predict: array fast path vs the DataFrame path.
+
+Trains the same scaler + logistic-regression pipeline as ``src/train.py``
+(fitted on the ``IrisRecord`` field names so the DataFrame path accepts the
+records), then posts batches of 1 to 10k records to both handlers in process
+and checks they agree. A second table sends single-record requests from
+several concurrent clients with micro-batching on and off. Run from the
+project root:
+
+    python -m scripts.bench_predict --sizes 1 10 100 1000 10000 --concurrency 1 16 64
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import httpx
+from sklearn import datasets
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src import utils
+from src.schemas import IrisRecord, PredictRequest, PredictResponse
+from src import serve
+from src.batching import PredictBatcher
+from src.model_manager import manager
+from src.serve import app
+
+FIELDS = list(IrisRecord.model_fields)
+
+
+def dataframe_app() -> FastAPI:
+    # the /predict handler before the array fast path
+    legacy = FastAPI()
+
+    @legacy.post("/predict", response_model=PredictResponse)
+    def predict(payload: PredictRequest):
+        model = utils.load_model()
+        df = pd.DataFrame([r.model_dump() for r in payload.records])
+        y_pred, proba = utils.predict_df(model, df)
+        return PredictResponse(predictions=y_pred, probabilities=proba)
+
+    return legacy
+
+
+def run(client: TestClient, payload: dict, iters: int):
+    for _ in range(3):
+        client.post("/predict", json=payload)
+    lat = []
+    start = time.perf_counter()
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        r = client.post("/predict", json=payload)
+        lat.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    r.raise_for_status()
+    return np.array(lat) * 1e3, iters / elapsed, r.json()
+
+
+async def concurrent_rps(record: dict, clients: int, total: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(None)
+
+        async def client():
+            while not queue.empty():
+                queue.get_nowait()
+                (await http.post("/predict", json={"records": [record]})).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--rows', type=int, default=20000,
+                        help='records sent per size (sets the request count)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64],
+                        help='clients sending single records')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per concurrency level')
+    args = parser.parse_args()
+
+    iris = datasets.load_iris()
+    X = pd.DataFrame(iris.data, columns=FIELDS)
+    model = Pipeline([("scaler", StandardScaler()), ("clf", LogisticRegression(max_iter=1000))])
+    model.fit(X, iris.target)
+    manager.install(model, "bench")
+
+    rng = np.random.default_rng(0)
+    clients = {"dataframe": TestClient(dataframe_app()), "array": TestClient(app)}
+    print(f"{'batch':>6} | {'path':>9} | {'p50 ms':>8} | {'p99 ms':>8} | {'req/s':>8} | "
+          f"{'rows/s':>9} | {'speedup':>7}")
+    for size in args.sizes:
+        rows = iris.data[rng.integers(0, len(iris.data), size)] + rng.normal(0, 0.1, (size, 4))
+        payload = {"records": [dict(zip(FIELDS, map(float, r))) for r in rows]}
+        iters = max(5, min(500, args.rows // size))
+        results = {name: run(c, payload, iters) for name, c in clients.items()}
+        base_rps = results["dataframe"][1]
+        for name, (lat, rps, _) in results.items():
+            p50, p99 = np.percentile(lat, 50), np.percentile(lat, 99)
+            print(f"{size:>6} | {name:>9} | {p50:>8.2f} | {p99:>8.2f} | "
+                  f"{rps:>8.1f} | {rps * size:>9.0f} | {rps / base_rps:>6.2f}x")
+        old, new = results["dataframe"][2], results["array"][2]
+        assert old["predictions"] == new["predictions"], "label mismatch"
+        assert np.allclose(old["probabilities"], new["probabilities"], atol=1e-5), \
+            "probability mismatch"
+
+    record = dict(zip(FIELDS, map(float, iris.data[0])))
+    print(f"\n{'clients':>7} | {'unbatched req/s':>15} | {'batched req/s':>13} | {'speedup':>7}")
+    for clients in args.concurrency:
+        rps = {}
+        for name, max_size in (("unbatched", 1), ("batched", serve.BATCH_MAX_SIZE)):
+            serve.batcher = PredictBatcher(utils.predict_array, max_size, serve.BATCH_MAX_WAIT_MS)
+            rps[name] = asyncio.run(concurrent_rps(record, clients, args.requests))
+        speedup = rps['batched'] / rps['unbatched']
+        print(f"{clients:>7} | {rps['unbatched']:>15.0f} | {rps['batched']:>13.0f} | "
+              f"{speedup:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
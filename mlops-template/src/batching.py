@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Optional, Tuple
+
+import numpy as np
+
+from src.utils import BATCH_QUEUE_WAIT, BATCH_SIZE
+
+PredictFn = Callable[[object, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+class PredictBatcher:
+    """Coalesce concurrent /predict calls into shared model calls.
+
+    Requests queue their feature rows; the queue is flushed to one
+    ``predict_fn(model, X)`` call when it holds ``max_batch_size`` rows or
+    ``max_wait_ms`` after the first queued request (0 flushes right away
+    when the model is idle). Model calls run one at a time in a dedicated
+    thread, and while one is running new requests keep queueing and go out
+    together as soon as it returns, so batches grow with load. Each caller
+    gets back its own slice of labels and probabilities (or the exception of
+    the call it was part of).
+    """
+
+    def __init__(self, predict_fn: PredictFn, max_batch_size: int = 256, max_wait_ms: float = 0.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Deque[Tuple[object, np.ndarray, asyncio.Future, float]] = deque()
+        self._rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self._tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict-batch")
+
+    async def predict(self, model, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.append((model, X, fut, time.perf_counter()))
+        self._rows += len(X)
+        if not self._running:
+            if self._rows >= self.max_batch_size or self.max_wait <= 0:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _take(self):
+        # whole requests only, up to max_batch_size rows (at least one request)
+        batch, rows = [], 0
+        while self._queue and (not batch or rows + len(self._queue[0][1]) <= self.max_batch_size):
+            item = self._queue.popleft()
+            if batch and item[0] is not batch[0][0]:
+                # never mix models across a hot swap
+                self._queue.appendleft(item)
+                break
+            batch.append(item)
+            rows += len(item[1])
+        self._rows -= rows
+        return batch
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._running or not self._queue:
+            return
+        self._running = True
+        task = asyncio.ensure_future(self._run(self._take()))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        sent = time.perf_counter()
+        for _, _, _, queued in batch:
+            BATCH_QUEUE_WAIT.observe(sent - queued)
+        X = batch[0][1] if len(batch) == 1 else np.concatenate([x for _, x, _, _ in batch])
+        BATCH_SIZE.observe(len(X))
+        try:
+            labels, proba = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.predict_fn, batch[0][0], X,
+            )
+        except Exception as e:
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            start = 0
+            for _, x, fut, _ in batch:
+                end = start + len(x)
+                if not fut.done():
+                    fut.set_result((labels[start:end], proba[start:end]))
+                start = end
+        finally:
+            self._running = False
+            # whatever queued during the call goes out now
+            if self._queue:
+                self._flush()
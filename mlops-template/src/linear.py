@@ -0,0 +1,96 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+FILES = ("coef.npy", "intercept.npy", "classes.npy", "feature_names.npy")
+
+
+def fold_pipeline(pipeline):
+    """``(coef, intercept, classes, feature_names)`` of a [scaler +] logistic-regression pipeline.
+
+    The scaler is folded into the weights: ``((x - mean) / scale) @ W + b``
+    equals ``x @ (W / scale) + (b - (mean / scale) @ W)``. ``coef`` is
+    ``(n_features, n_classes)``; a binary model gets a zero first column, so
+    a softmax over the two logits gives sklearn's ``[1 - p, p]``.
+    """
+    steps = [step for _, step in pipeline.steps] if hasattr(pipeline, "steps") else [pipeline]
+    *pre, clf = [s for s in steps if s is not None and s != "passthrough"]
+    if type(clf).__name__ != "LogisticRegression":
+        raise ValueError(f"expected a LogisticRegression, got {type(clf).__name__}")
+    if len(clf.classes_) > 2 and (
+        getattr(clf, "multi_class", "auto") == "ovr"
+        or (getattr(clf, "multi_class", "auto") == "auto" and clf.solver == "liblinear")
+    ):
+        raise ValueError("one-vs-rest probabilities are not a softmax; only multinomial models can be folded")
+    W = clf.coef_.T.astype(np.float64)
+    b = clf.intercept_.astype(np.float64)
+    for step in reversed(pre):
+        if type(step).__name__ != "StandardScaler":
+            raise ValueError(f"cannot fold {type(step).__name__} into the weights")
+        if step.scale_ is not None:
+            W = W / step.scale_[:, None]
+        if step.mean_ is not None and step.with_mean:
+            b = b - step.mean_ @ W
+    if W.shape[1] == 1:
+        W = np.hstack([np.zeros_like(W), W])
+        b = np.concatenate([[0.0], b])
+    names = getattr(steps[0], "feature_names_in_", None)
+    if names is None:
+        names = getattr(clf, "feature_names_in_", None)
+    names = np.asarray(names if names is not None else [], dtype=str)
+    return W, b, np.asarray(clf.classes_), names
+
+
+def export_linear(pipeline, out_dir: str) -> str:
+    """Write the folded weights of ``pipeline`` to ``out_dir`` as ``.npy`` files."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, arr in zip(FILES, fold_pipeline(pipeline)):
+        np.save(os.path.join(out_dir, name), arr, allow_pickle=False)
+    return out_dir
+
+
+class LinearPredictor:
+    """A folded linear classifier: one ``X @ coef + intercept`` and a softmax.
+
+    Exposes ``predict``, ``predict_proba``, ``classes_`` and
+    ``feature_names_in_`` like the sklearn pipeline it came from, so the
+    array fast path serves it unchanged. Inputs are used in column order
+    (DataFrames are reordered by name when they carry the fitted columns).
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray, feature_names: Optional[np.ndarray] = None):
+        self.coef_ = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept_ = np.asarray(intercept, dtype=np.float64)
+        self.classes_ = classes
+        self.n_features_in_ = self.coef_.shape[0]
+        if feature_names is not None and len(feature_names):
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearPredictor":
+        return cls(*(np.load(os.path.join(path, name), allow_pickle=False) for name in FILES))
+
+    def _array(self, X) -> np.ndarray:
+        names = getattr(self, "feature_names_in_", None)
+        if names is not None and hasattr(X, "columns") and set(names) <= set(X.columns):
+            X = X[list(names)]
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected {self.n_features_in_} features, got shape {X.shape}")
+        return X
+
+    def decision_function(self, X) -> np.ndarray:
+        logits = self._array(X) @ self.coef_
+        logits += self.intercept_
+        return logits
+
+    def predict_proba(self, X) -> np.ndarray:
+        z = self.decision_function(X)
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.decision_function(X).argmax(axis=1)]
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import load
+import mlflow
+from mlflow.tracking import MlflowClient
+
+from src.linear import LinearPredictor
+from src.utils import (
+    MODEL_COLD_START, MODEL_LOAD_SECONDS, MODEL_POLL_ERRORS, MODEL_SWAPS, MODEL_VERSION,
+    fast_model, predict_array, predict_df,
+)
+
+# a plausible iris flower; warm-up only checks that the model answers
+WARMUP_RECORD = {"sepal_length": 5.8, "sepal_width": 3.0, "petal_length": 3.8, "petal_width": 1.2}
+WARMUP_SIZES = (1, 64)
+
+
+class ModelNotReady(Exception):
+    pass
+
+
+@dataclass
+class LoadedModel:
+    model: object
+    fast: Optional[Tuple[object, List[str]]]
+    version: str
+    digest: str
+    source: str
+    loaded_at: float
+
+
+def tree_digest(path: str) -> str:
+    """SHA-256 over the relative paths and contents of the files under ``path``."""
+    h = hashlib.sha256()
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, n) for n in names)
+    for f in sorted(files):
+        h.update(os.path.relpath(f, path).replace(os.sep, "/").encode("utf-8") + b"\0")
+        with open(f, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def warm_up(model, fast):
+    """Run synthetic batches through the path ``/predict`` will use."""
+    for n in WARMUP_SIZES:
+        if fast is not None:
+            est, fields = fast
+            X = np.tile(np.array([WARMUP_RECORD[f] for f in fields], dtype=np.float32), (n, 1))
+            labels, _ = predict_array(est, X)
+        else:
+            labels, _ = predict_df(model, pd.DataFrame([WARMUP_RECORD] * n))
+        if len(labels) != n:
+            raise ValueError(f"warm-up returned {len(labels)} predictions for {n} rows")
+
+
+class ModelManager:
+    """Loads the served model and keeps it current.
+
+    ``refresh`` asks the source (the registry stage, or the local model file)
+    for its current version. When that changed, the version is loaded from
+    the local artifact cache (downloaded into it first if missing), warmed up
+    with a synthetic batch and swapped in. The swap is a single reference
+    assignment, so requests already holding the old model finish with it. A
+    version that fails to load or warm up is never swapped in; the previous
+    one keeps serving. ``start`` runs ``refresh`` every ``poll_interval``
+    seconds in a daemon thread.
+
+    Registry artifacts live in ``cache_dir/<sha256 of the files>/`` and
+    ``cache_dir/index.json`` maps registry versions to digests, so a restart
+    loads a known version from disk, or the last served one when the
+    registry is unreachable.
+
+    With ``model_format="linear"`` the ``linear/`` directory of the version
+    (folded weights, see ``src.linear``) is served instead of the pyfunc
+    model; locally it is the ``linear/`` directory next to ``local_path``.
+    """
+
+    def __init__(
+        self,
+        use_mlflow: bool = True,
+        tracking_uri: str = "http://127.0.0.1:5000",
+        model_name: str = "iris-classifier",
+        model_stage: str = "Staging",
+        local_path: str = "models/latest/model.pkl",
+        model_format: str = "pyfunc",
+        cache_dir: str = "models/cache",
+        cache_keep: int = 3,
+        poll_interval: float = 30.0,
+        retry_interval: float = 5.0,
+    ):
+        self.use_mlflow = use_mlflow
+        self.tracking_uri = tracking_uri
+        self.model_name = model_name
+        self.model_stage = model_stage
+        self.local_path = local_path
+        self.model_format = model_format
+        self.cache_dir = cache_dir
+        self.cache_keep = cache_keep
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._current: Optional[LoadedModel] = None
+        self._client: Optional[MlflowClient] = None
+        self._created = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "ModelManager":
+        return cls(
+            use_mlflow=os.getenv("USE_MLFLOW", "true").lower() == "true",
+            tracking_uri=os.getenv("MLFLOW_TRACKING_URI", "http://127.0.0.1:5000"),
+            model_name=os.getenv("MODEL_NAME", "iris-classifier"),
+            model_stage=os.getenv("MODEL_STAGE", "Staging"),
+            local_path=os.getenv("LOCAL_MODEL_PATH", "models/latest/model.pkl"),
+            model_format=os.getenv("MODEL_FORMAT", "pyfunc").lower(),
+            cache_dir=os.getenv("MODEL_CACHE_DIR", "models/cache"),
+            cache_keep=int(os.getenv("MODEL_CACHE_KEEP", 3)),
+            poll_interval=float(os.getenv("MODEL_POLL_INTERVAL", 30)),
+        )
+
+    @property
+    def current(self) -> Optional[LoadedModel]:
+        return self._current
+
+    def get(self) -> LoadedModel:
+        current = self._current
+        if current is None and self._thread is None:
+            # scripts and tests never start the poller: load on first use
+            self.refresh()
+            current = self._current
+        if current is None:
+            raise ModelNotReady(self.last_error or "model is loading")
+        return current
+
+    def health(self) -> Dict:
+        current = self._current
+        return {
+            "status": "ok" if current else ("error" if self.last_error else "loading"),
+            "model_version": current.version if current else None,
+            "digest": current.digest if current else None,
+            "source": current.source if current else None,
+            "format": self.model_format,
+            "loaded_at": current.loaded_at if current else None,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name="model-manager", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self):
+        while True:
+            self.refresh()
+            if self.poll_interval > 0:
+                wait = self.poll_interval
+                if self._current is None:
+                    wait = min(wait, self.retry_interval)
+            elif self._current is None:
+                wait = self.retry_interval
+            else:
+                return
+            if self._stop.wait(wait):
+                return
+
+    def refresh(self, version: Optional[str] = None) -> bool:
+        """Swap in the source's current version (or ``version``) if it changed.
+
+        Returns True if a swap happened.
+        """
+        with self._lock:
+            self.last_check = time.time()
+            try:
+                version = version or self._resolve()
+                self.last_error = None
+            except Exception as e:
+                MODEL_POLL_ERRORS.inc()
+                self.last_error = f"{type(e).__name__}: {e}"
+                version = self._last_served() if self._current is None else None
+                if version is None:
+                    return False
+            if self._current is not None and self._current.version == version:
+                return False
+            start = time.perf_counter()
+            try:
+                model, digest, source = self._fetch(version)
+                fast = fast_model(model)
+                warm_up(model, fast)
+            except Exception as e:
+                MODEL_SWAPS.labels(result="failed").inc()
+                self.last_error = f"{version}: {type(e).__name__}: {e}"
+                return False
+            MODEL_LOAD_SECONDS.labels(source=source).observe(time.perf_counter() - start)
+            self._swap(LoadedModel(model, fast, version, digest, source, time.time()))
+            if self.use_mlflow:
+                self._remember(version)
+            return True
+
+    def install(self, model, version: str, digest: str = "") -> LoadedModel:
+        """Warm up and serve an in-memory model (benchmarks and tests)."""
+        fast = fast_model(model)
+        warm_up(model, fast)
+        with self._lock:
+            self._swap(LoadedModel(model, fast, version, digest, "memory", time.time()))
+        return self._current
+
+    def _swap(self, loaded: LoadedModel):
+        if self._current is None:
+            MODEL_COLD_START.set(time.perf_counter() - self._created)
+        self._current = loaded
+        MODEL_SWAPS.labels(result="swapped").inc()
+        MODEL_VERSION.clear()
+        MODEL_VERSION.labels(version=loaded.version, digest=loaded.digest).set(1)
+
+    def _resolve(self) -> str:
+        if not self.use_mlflow:
+            if self.model_format == "linear":
+                # the version is what is served: the weight files, not model.pkl
+                path = self._linear_path()
+                return f"{path}@{tree_digest(path)[:16]}"
+            st = os.stat(self.local_path)
+            return f"{self.local_path}@{st.st_mtime_ns}:{st.st_size}"
+        if self._client is None:
+            mlflow.set_tracking_uri(self.tracking_uri)
+            self._client = MlflowClient(self.tracking_uri)
+        versions = self._client.get_latest_versions(self.model_name, stages=[self.model_stage])
+        if not versions:
+            raise ModelNotReady(f"no version of {self.model_name} in stage {self.model_stage}")
+        return f"{self.model_name}/{versions[0].version}"
+
+    def _fetch(self, version: str) -> Tuple[object, str, str]:
+        if not self.use_mlflow:
+            if self.model_format == "linear":
+                path = self._linear_path()
+                return LinearPredictor.load(path), tree_digest(path), "local"
+            model = load(self.local_path)
+            with open(self.local_path, "rb") as f:
+                return model, hashlib.sha256(f.read()).hexdigest(), "local"
+        index = self._read_index()
+        digest = index["versions"].get(version)
+        path = os.path.join(self.cache_dir, digest) if digest else None
+        source = "cache"
+        if path is None or not os.path.isdir(path):
+            digest, path = self._download(version)
+            source = "registry"
+            index["versions"][version] = digest
+            self._write_index(index)
+        os.utime(path)
+        if self.model_format == "linear":
+            return LinearPredictor.load(os.path.join(path, "linear")), digest, source
+        return mlflow.pyfunc.load_model(path), digest, source
+
+    def _linear_path(self) -> str:
+        return os.path.join(os.path.dirname(self.local_path), "linear")
+
+    def _download(self, version: str) -> Tuple[str, str]:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".download-", dir=self.cache_dir)
+        try:
+            local = mlflow.artifacts.download_artifacts(
+                artifact_uri=f"models:/{version}", dst_path=tmp, tracking_uri=self.tracking_uri,
+            )
+            digest = tree_digest(local)
+            path = os.path.join(self.cache_dir, digest)
+            try:
+                os.replace(local, path)
+            except OSError:
+                # already cached, possibly by another process in the meantime
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return digest, path
+
+    def _last_served(self) -> Optional[str]:
+        if not self.use_mlflow:
+            return None
+        return self._read_index()["served"].get(f"{self.model_name}/{self.model_stage}")
+
+    def _remember(self, version: str):
+        index = self._read_index()
+        index["served"][f"{self.model_name}/{self.model_stage}"] = version
+        self._prune(index)
+        self._write_index(index)
+
+    def _prune(self, index: Dict):
+        # keep the most recently used digests, always including the served one
+        dirs = [
+            d for d in os.listdir(self.cache_dir)
+            if not d.startswith(".") and os.path.isdir(os.path.join(self.cache_dir, d))
+        ]
+        dirs.sort(key=lambda d: os.path.getmtime(os.path.join(self.cache_dir, d)), reverse=True)
+        keep = set(dirs[:max(self.cache_keep, 1)]) | {self._current.digest}
+        for d in dirs:
+            if d not in keep:
+                shutil.rmtree(os.path.join(self.cache_dir, d), ignore_errors=True)
+        index["versions"] = {v: d for v, d in index["versions"].items() if d in keep}
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(os.path.join(self.cache_dir, "index.json")) as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        index.setdefault("versions", {})
+        index.setdefault("served", {})
+        return index
+
+    def _write_index(self, index: Dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, "index.json")
+        # batch workers share the cache: one temp file per process
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, path)
+
+
+manager = ModelManager.from_env()
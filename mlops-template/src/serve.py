@@ -1,25 +1,44 @@
+import os
+from contextlib import asynccontextmanager
+
 import pandas as pd
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
+from src.batching import PredictBatcher
+from src.model_manager import ModelNotReady, manager
 from src.schemas import PredictRequest, PredictResponse
-from src.utils import load_model, predict_df, measure_latency
+from src.utils import predict_df, predict_array, records_to_array, measure_latency
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # loads the model in the background and polls the registry for new versions
+    manager.start()
+    yield
+    manager.stop()
+
 
 app = FastAPI(
     title="Iris Classifier API",
     version="1.0.0",
     description="Real-time inference API with optional MLflow registry.",
+    lifespan=lifespan,
 )
 
+# concurrent small requests share one model call (BATCH_MAX_SIZE=1 disables batching)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 256))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 0))
+batcher = PredictBatcher(predict_array, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
 
 @app.get("/healthz")
 def health():
-    try:
-        _ = load_model()
-        return {"status": "ok"}
-    except Exception as e:
-        return {"status": "error", "details": str(e)}
+    # reads the manager's state only; 503 until a model is serving
+    state = manager.health()
+    return ORJSONResponse(state, status_code=200 if state["status"] == "ok" else 503)
 
 
 @app.get("/metrics")
@@ -27,10 +46,26 @@ def metrics():
     return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
-@app.post("/predict", response_model=PredictResponse)
+@app.post("/predict", response_model=PredictResponse, response_class=ORJSONResponse)
 @measure_latency
-def predict(payload: PredictRequest):
-    model = load_model()
-    df = pd.DataFrame([r.model_dump() for r in payload.records])
-    y_pred, proba = predict_df(model, df)
-    return PredictResponse(predictions=y_pred, probabilities=proba)
+async def predict(payload: PredictRequest):
+    # one read of the served model: a concurrent swap does not affect this request
+    try:
+        loaded = manager.current or await run_in_threadpool(manager.get)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if loaded.fast is None:
+        df = pd.DataFrame([r.model_dump() for r in payload.records])
+        y_pred, proba = await run_in_threadpool(predict_df, loaded.model, df)
+        return PredictResponse(predictions=y_pred, probabilities=proba)
+    if not payload.records:
+        return ORJSONResponse({"predictions": [], "probabilities": []})
+    model, fields = loaded.fast
+    X = records_to_array(payload.records, fields)
+    if len(X) >= batcher.max_batch_size:
+        # a large request is a batch on its own
+        labels, proba = await run_in_threadpool(predict_array, model, X)
+    else:
+        labels, proba = await batcher.predict(model, X)
+    # orjson writes the NumPy arrays directly, skipping tolist() and response validation
+    return ORJSONResponse({"predictions": labels, "probabilities": proba})
@@ -14,6 +14,8 @@ import mlflow.sklearn
 from mlflow.models.signature import infer_signature
 from joblib import dump
 
+from src.linear import export_linear
+
 MODEL_NAME = os.getenv("MODEL_NAME", "iris-classifier")
 MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://127.0.0.1:5000")
 
@@ -61,6 +63,10 @@ def main():
             registered_model_name=MODEL_NAME,
         )
 
+        # folded scaler + classifier weights, served with MODEL_FORMAT=linear
+        export_linear(pipeline, "models/latest/linear")
+        mlflow.log_artifacts("models/latest/linear", artifact_path="model/linear")
+
         report = classification_report(y_test, y_pred)
         with open("classification_report.txt", "w") as f:
             f.write(report)
@@ -82,7 +88,7 @@ def main():
     # Local fallback artifact
     os.makedirs("models/latest", exist_ok=True)
     dump(pipeline, "models/latest/model.pkl")
-    print("Saved local fallback model to models/latest/model.pkl")
+    print("Saved local fallback model to models/latest/model.pkl (folded weights in models/latest/linear/)")
 
 
 if __name__ == "__main__":
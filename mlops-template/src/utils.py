@@ -1,36 +1,45 @@
-import os
+import asyncio
+import re
+import threading
 import time
+import warnings
+from functools import wraps
+from itertools import chain
+from operator import attrgetter
 import numpy as np
 import pandas as pd
-from joblib import load
-from prometheus_client import Counter, Histogram
-import mlflow
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.schemas import IrisRecord
 
 REQUEST_COUNTER = Counter("inference_requests_total", "Total inference requests")
 REQUEST_LATENCY = Histogram("inference_request_latency_seconds", "Latency of inference requests")
+BATCH_SIZE = Histogram(
+    "inference_batch_size", "Rows per batched model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+BATCH_QUEUE_WAIT = Histogram(
+    "inference_batch_queue_wait_seconds", "Time a request waits in the batching queue before its model call",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "model_load_seconds", "Time to fetch, load and warm up a model version", ["source"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+MODEL_COLD_START = Gauge("model_cold_start_seconds", "Time from process start until the first model was serving")
+MODEL_SWAPS = Counter("model_swaps_total", "Model version swaps", ["result"])
+MODEL_POLL_ERRORS = Counter("model_poll_errors_total", "Failed checks of the model source")
+MODEL_VERSION = Gauge("model_version_info", "Model version being served", ["version", "digest"])
 
-MODEL_CACHE = {"model": None}
+# the filters changed by warnings.catch_warnings are process-wide
+_WARNINGS_LOCK = threading.Lock()
 
 
 def load_model():
-    if MODEL_CACHE["model"] is not None:
-        return MODEL_CACHE["model"]
-
-    use_mlflow = os.getenv("USE_MLFLOW", "true").lower() == "true"
-    if use_mlflow:
-        tracking_uri = os.getenv("MLFLOW_TRACKING_URI", "http://127.0.0.1:5000")
-        model_name = os.getenv("MODEL_NAME", "iris-classifier")
-        model_stage = os.getenv("MODEL_STAGE", "Staging")
-        mlflow.set_tracking_uri(tracking_uri)
-        model_uri = f"models:/{model_name}/{model_stage}"
-        model = mlflow.pyfunc.load_model(model_uri)
-        MODEL_CACHE["model"] = model
-        return model
-    else:
-        path = os.getenv("LOCAL_MODEL_PATH", "models/latest/model.pkl")
-        model = load(path)
-        MODEL_CACHE["model"] = model
-        return model
+    """The model currently served by the model manager (loaded on first use outside the API)."""
+    from src.model_manager import manager
+    return manager.get().model
 
 
 def predict_df(model, df: pd.DataFrame):
@@ -52,7 +61,78 @@ def predict_df(model, df: pd.DataFrame):
     return y_pred, proba
 
 
+def raw_model(model):
+    """The estimator inside an MLflow pyfunc model, or the model itself."""
+    get_raw_model = getattr(model, "get_raw_model", None)
+    if get_raw_model is None:
+        return model
+    try:
+        return get_raw_model()
+    except Exception:
+        return model
+
+
+def feature_fields(model):
+    """``IrisRecord`` field names in the order the model was fitted on.
+
+    Training uses the sklearn column names (``"sepal length (cm)"``), which map
+    to ``sepal_length``; models fitted without names use the schema order.
+    """
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        return list(IrisRecord.model_fields)
+    fields = [re.sub(r"\s*\(.*?\)", "", str(n)).strip().replace(" ", "_") for n in names]
+    if not set(fields) <= set(IrisRecord.model_fields):
+        return None
+    return fields
+
+
+def fast_model(model):
+    """``(estimator, fields)`` for the array path, or None if the model needs ``predict_df``."""
+    est = raw_model(model)
+    fields = feature_fields(est)
+    if fields and hasattr(est, "predict_proba") and hasattr(est, "classes_"):
+        return est, fields
+    return None
+
+
+def load_fast_model():
+    """``fast_model`` of the served model."""
+    from src.model_manager import manager
+    return manager.get().fast
+
+
+def records_to_array(records, fields) -> np.ndarray:
+    # one preallocated float32 buffer filled straight from the records
+    get = attrgetter(*fields)
+    values = chain.from_iterable(map(get, records)) if len(fields) > 1 else map(get, records)
+    n, d = len(records), len(fields)
+    return np.fromiter(values, dtype=np.float32, count=n * d).reshape(n, d)
+
+
+def predict_array(model, X: np.ndarray):
+    # a single predict_proba pass: labels are its argmax over classes_. The
+    # columns are unnamed on purpose (in the fitted order): silence sklearn's
+    # feature-name warning for this call only, not for training code
+    with _WARNINGS_LOCK, warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        proba = model.predict_proba(X)
+    return model.classes_[proba.argmax(axis=1)], proba
+
+
 def measure_latency(func):
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            REQUEST_COUNTER.inc()
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                REQUEST_LATENCY.observe(time.perf_counter() - start)
+        return async_wrapper
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
         REQUEST_COUNTER.inc()
         start = time.perf_counter()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import datasets
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from src.linear import LinearPredictor, export_linear, fold_pipeline
+from src.utils import feature_fields, predict_array, records_to_array
+from src.schemas import IrisRecord
+
+iris = datasets.load_iris()
+X = pd.DataFrame(iris.data, columns=iris.feature_names)
+
+
+def pipeline(y=iris.target, **scaler):
+    # the same model src/train.py registers
+    return Pipeline([("scaler", StandardScaler(**scaler)), ("clf", LogisticRegression(max_iter=1000))]).fit(X, y)
+
+
+def test_matches_pipeline_after_export(tmp_path):
+    p = pipeline()
+    lp = LinearPredictor.load(export_linear(p, str(tmp_path)))
+    np.testing.assert_allclose(lp.predict_proba(X), p.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(lp.predict(X), p.predict(X))
+    np.testing.assert_array_equal(lp.classes_, p.classes_)
+
+
+def test_binary_and_scaler_options():
+    y = (iris.target == 2).astype(int)
+    for scaler in ({}, {"with_mean": False}, {"with_std": False}):
+        p = pipeline(y, **scaler)
+        lp = LinearPredictor(*fold_pipeline(p))
+        np.testing.assert_allclose(lp.predict_proba(X), p.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_array_fast_path():
+    # float32 records in the fitted column order, as /predict sends them
+    p = pipeline()
+    lp = LinearPredictor(*fold_pipeline(p))
+    fields = feature_fields(lp)
+    records = [IrisRecord(**dict(zip(fields, row))) for row in iris.data]
+    Xa = records_to_array(records, fields)
+    labels, proba = predict_array(lp, Xa)
+    np.testing.assert_allclose(proba, p.predict_proba(X), rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(labels, p.predict(X))
+
+
+def test_rejects_unfoldable_pipelines():
+    p = Pipeline([("scaler", MinMaxScaler()), ("clf", LogisticRegression(max_iter=1000))]).fit(X, iris.target)
+    with pytest.raises(ValueError):
+        fold_pipeline(p)
+    with pytest.raises(ValueError):
+        LinearPredictor(*fold_pipeline(pipeline())).predict_proba(X.values[:, :3])
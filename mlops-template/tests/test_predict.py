@@ -0,0 +1,21 @@
+import warnings
+
+import pandas as pd
+import pytest
+from sklearn import datasets
+from sklearn.linear_model import LogisticRegression
+
+from src.utils import predict_array
+
+iris = datasets.load_iris()
+X = pd.DataFrame(iris.data, columns=iris.feature_names)
+
+
+def test_array_path_is_quiet_but_the_warning_is_not_silenced_globally():
+    model = LogisticRegression(max_iter=1000).fit(X, iris.target)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        labels, proba = predict_array(model, X.to_numpy())
+    assert len(labels) == len(X) and proba.shape == (len(X), 3)
+    with pytest.warns(UserWarning, match="X does not have valid feature names"):
+        model.predict(X.to_numpy())